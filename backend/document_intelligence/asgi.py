@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'document_intelligence.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from documents.streaming import DisconnectMiddleware  # noqa: E402
+
+# Lets streaming views notice when the client goes away
+application = DisconnectMiddleware(django_application)
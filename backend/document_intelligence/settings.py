@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -35,6 +36,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'documents.middleware.ServerTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -90,14 +92,256 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]
 CORS_ALLOW_CREDENTIALS = True
+# Resumable uploads send the offset of each part in this header
+CORS_ALLOW_HEADERS = (*default_headers, 'upload-offset')
 
 # Static & Media Files
 STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads (documents/uploads.py): per-file and total size quotas (0 = no total
+# limit; the total counts stored documents plus live resumable uploads).
+# Resumable uploads collect their parts in UPLOAD_TEMP_DIR, which must be on
+# the same filesystem as MEDIA_ROOT, and expire after
+# UPLOAD_SESSION_TTL_SECONDS without a new part.
+UPLOAD_MAX_FILE_BYTES = int(os.getenv('UPLOAD_MAX_FILE_BYTES', str(512 * 1024 * 1024)))
+UPLOAD_MAX_TOTAL_BYTES = int(os.getenv('UPLOAD_MAX_TOTAL_BYTES', '0'))
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv('UPLOAD_SESSION_TTL_SECONDS', '86400'))
+UPLOAD_TEMP_DIR = os.getenv('UPLOAD_TEMP_DIR', os.path.join(MEDIA_ROOT, 'uploads'))
+
 # API Keys & External Services
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')  # Optional external LLM
 
 # LM Studio (Local LLM)
 LM_STUDIO_BASE_URL = 'http://localhost:1234/v1'
+
+# RAG Pipeline
+# 'fake' selects a deterministic hashing embedder for offline benchmarks
+RAG_EMBEDDING_MODEL = os.getenv('RAG_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+CHROMA_DB_PATH = os.getenv('CHROMA_DB_PATH', './chroma_db')
+# A collection holds vectors of one dimension: use a new one after switching
+# to an embedding model of another dimension, then run manage.py reembed
+CHROMA_COLLECTION = os.getenv('CHROMA_COLLECTION', 'documents')
+# Load and warm up the embedding model when Django starts instead of on the
+# first request (gunicorn.conf.py does this before forking workers)
+RAG_WARMUP_ON_STARTUP = os.getenv('RAG_WARMUP_ON_STARTUP', 'False') == 'True'
+# Number of chunks embedded per forward pass of the embedding model
+RAG_EMBEDDING_BATCH_SIZE = int(os.getenv('RAG_EMBEDDING_BATCH_SIZE', '64'))
+# L2-normalize embeddings before they are stored
+RAG_NORMALIZE_EMBEDDINGS = os.getenv('RAG_NORMALIZE_EMBEDDINGS', 'False') == 'True'
+# Embedding runtime (documents/embedding_backends.py): 'sentence-transformers'
+# (PyTorch), 'onnx' (ONNX Runtime, exported once into RAG_ONNX_MODEL_DIR) or
+# 'fake'. RAG_ONNX_QUANTIZE runs an int8 dynamically quantized copy instead.
+RAG_EMBEDDING_BACKEND = os.getenv('RAG_EMBEDDING_BACKEND', 'sentence-transformers')
+RAG_ONNX_MODEL_DIR = os.getenv('RAG_ONNX_MODEL_DIR', os.path.join(BASE_DIR, 'onnx_models'))
+RAG_ONNX_QUANTIZE = os.getenv('RAG_ONNX_QUANTIZE', 'False') == 'True'
+# Intra-op threads of the embedding runtime; 0 keeps the library default
+RAG_EMBEDDING_THREADS = int(os.getenv('RAG_EMBEDDING_THREADS', '0'))
+# Number of chunks embedded, written to the vector store and inserted per round
+RAG_INGEST_BATCH_SIZE = int(os.getenv('RAG_INGEST_BATCH_SIZE', '512'))
+
+# Background ingestion
+# 'thread' runs a worker pool inside the web process, 'external' expects
+# `python manage.py ingest_worker` to be running alongside it
+INGEST_WORKER_MODE = os.getenv('INGEST_WORKER_MODE', 'thread')
+# Jobs a single worker process runs at once
+INGEST_WORKER_CONCURRENCY = int(os.getenv('INGEST_WORKER_CONCURRENCY', '2'))
+# Jobs allowed to run at once across all workers
+INGEST_MAX_CONCURRENT_JOBS = int(os.getenv('INGEST_MAX_CONCURRENT_JOBS', '4'))
+INGEST_MAX_ATTEMPTS = int(os.getenv('INGEST_MAX_ATTEMPTS', '3'))
+INGEST_RETRY_BACKOFF_SECONDS = float(os.getenv('INGEST_RETRY_BACKOFF_SECONDS', '5'))
+INGEST_RETRY_BACKOFF_MAX_SECONDS = float(os.getenv('INGEST_RETRY_BACKOFF_MAX_SECONDS', '300'))
+INGEST_POLL_INTERVAL_SECONDS = float(os.getenv('INGEST_POLL_INTERVAL_SECONDS', '2'))
+INGEST_PROGRESS_INTERVAL_SECONDS = float(os.getenv('INGEST_PROGRESS_INTERVAL_SECONDS', '1'))
+# Running jobs without a heartbeat for this long are put back on the queue;
+# workers heartbeat every INGEST_HEARTBEAT_SECONDS while a job runs
+INGEST_STALE_JOB_SECONDS = int(os.getenv('INGEST_STALE_JOB_SECONDS', '600'))
+INGEST_HEARTBEAT_SECONDS = float(os.getenv('INGEST_HEARTBEAT_SECONDS', '30'))
+
+# Shared embedding server (`python manage.py embedding_server`)
+# e.g. 'unix:/tmp/docintel-embed.sock' or 'tcp:127.0.0.1:8765'; empty to
+# encode in-process
+EMBEDDING_SERVER_ADDRESS = os.getenv('EMBEDDING_SERVER_ADDRESS', '')
+EMBEDDING_SERVER_MAX_BATCH_SIZE = int(os.getenv('EMBEDDING_SERVER_MAX_BATCH_SIZE', '64'))
+EMBEDDING_SERVER_MAX_WAIT_MS = float(os.getenv('EMBEDDING_SERVER_MAX_WAIT_MS', '5'))
+EMBEDDING_SERVER_TIMEOUT_SECONDS = float(os.getenv('EMBEDDING_SERVER_TIMEOUT_SECONDS', '30'))
+# How long to keep encoding in-process after the server was unreachable
+EMBEDDING_SERVER_RETRY_SECONDS = float(os.getenv('EMBEDDING_SERVER_RETRY_SECONDS', '30'))
+
+# Query caches
+# Each layer is a separate cache alias. The default backend is an in-memory
+# LRU bounded by entry count and bytes; set RAG_CACHE_BACKEND to
+# 'django.core.cache.backends.filebased.FileBasedCache' and RAG_CACHE_DIR to
+# share the caches between processes through the filesystem.
+RAG_CACHE_ENABLED = os.getenv('RAG_CACHE_ENABLED', 'True') == 'True'
+RAG_CACHE_BACKEND = os.getenv('RAG_CACHE_BACKEND', 'documents.cache_backends.BoundedLocMemCache')
+RAG_CACHE_DIR = os.getenv('RAG_CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+
+
+def _rag_cache(layer, timeout, max_entries, max_bytes):
+    if RAG_CACHE_BACKEND.endswith('FileBasedCache'):
+        location = os.path.join(RAG_CACHE_DIR, layer)
+    else:
+        location = f'rag-{layer}'
+    prefix = f'RAG_{layer.upper()}_CACHE'
+    return {
+        'BACKEND': RAG_CACHE_BACKEND,
+        'LOCATION': location,
+        'TIMEOUT': int(os.getenv(f'{prefix}_TIMEOUT', timeout)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv(f'{prefix}_MAX_ENTRIES', max_entries)),
+            'MAX_BYTES': int(os.getenv(f'{prefix}_MAX_BYTES', max_bytes)),
+        },
+    }
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'rag_embeddings': _rag_cache('embeddings', 24 * 3600, 10000, 32 * 1024 * 1024),
+    'rag_retrieval': _rag_cache('retrieval', 3600, 10000, 8 * 1024 * 1024),
+    'rag_answers': _rag_cache('answers', 3600, 5000, 32 * 1024 * 1024),
+}
+
+# Semantic answer cache: reuse answers for paraphrased questions that
+# retrieve the same chunks of the same document
+RAG_SEMANTIC_CACHE_ENABLED = os.getenv('RAG_SEMANTIC_CACHE_ENABLED', 'False') == 'True'
+# Minimum cosine similarity between questions for an answer to be reused
+RAG_SEMANTIC_CACHE_THRESHOLD = float(os.getenv('RAG_SEMANTIC_CACHE_THRESHOLD', '0.92'))
+# Questions kept per document, and across all documents of a worker (the
+# least recently queried documents are dropped first)
+RAG_SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('RAG_SEMANTIC_CACHE_MAX_ENTRIES', '1024'))
+RAG_SEMANTIC_CACHE_MAX_TOTAL_ENTRIES = int(os.getenv('RAG_SEMANTIC_CACHE_MAX_TOTAL_ENTRIES', '20000'))
+
+# Reuse embeddings of chunk texts that were already encoded for any document
+RAG_CHUNK_EMBEDDING_STORE_ENABLED = os.getenv('RAG_CHUNK_EMBEDDING_STORE_ENABLED', 'True') == 'True'
+
+# Plain text files have no pages; they are split into pseudo-pages of about
+# this many characters so extraction and chunking stay incremental
+RAG_TEXT_PAGE_CHARS = int(os.getenv('RAG_TEXT_PAGE_CHARS', '20000'))
+
+# Parallel PDF extraction: PDFs with at least PDF_PARALLEL_MIN_PAGES pages are
+# split into slices of PDF_PARALLEL_PAGES_PER_TASK pages extracted by a pool
+# of PDF_PARALLEL_WORKERS processes (1 disables it, 0 uses every CPU core)
+PDF_PARALLEL_WORKERS = int(os.getenv('PDF_PARALLEL_WORKERS', '0')) or (os.cpu_count() or 1)
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '50'))
+PDF_PARALLEL_PAGES_PER_TASK = int(os.getenv('PDF_PARALLEL_PAGES_PER_TASK', '16'))
+
+# Chunking: 'token' packs chunks by embedding-model tokens with overlap,
+# 'legacy' is the original character-based section/paragraph chunker
+RAG_CHUNKER = os.getenv('RAG_CHUNKER', 'token')
+# Upper bound on chunk length in model tokens (capped by the model's own limit)
+RAG_CHUNK_MAX_TOKENS = int(os.getenv('RAG_CHUNK_MAX_TOKENS', '256'))
+RAG_CHUNK_OVERLAP_TOKENS = int(os.getenv('RAG_CHUNK_OVERLAP_TOKENS', '32'))
+# Section-header profile from documents.chunking.SECTION_PROFILES
+RAG_SECTION_PROFILE = os.getenv('RAG_SECTION_PROFILE', 'resume')
+# Tokenizer used for chunking when the model itself is not loaded
+RAG_TOKENIZER_NAME = os.getenv('RAG_TOKENIZER_NAME', '')
+
+# Vector store: 'chroma' (the global "documents" collection) or 'numpy'
+# (per-document memory-mapped .npy matrices with exact top-k search)
+RAG_VECTOR_STORE = os.getenv('RAG_VECTOR_STORE', 'chroma')
+RAG_VECTOR_INDEX_DIR = os.getenv('RAG_VECTOR_INDEX_DIR', os.path.join(BASE_DIR, 'vector_index'))
+# Storage dtype of the numpy backend: 'float32', 'float16' (half the size)
+# or 'int8' (a quarter, with one float32 scale per row)
+RAG_VECTOR_DTYPE = os.getenv('RAG_VECTOR_DTYPE', 'float32')
+
+# Batch questions (documents/ask/batch/): at most this many questions per
+# request, answered with at most RAG_LLM_MAX_CONCURRENCY LLM calls in flight
+RAG_BATCH_MAX_QUESTIONS = int(os.getenv('RAG_BATCH_MAX_QUESTIONS', '50'))
+RAG_LLM_MAX_CONCURRENCY = int(os.getenv('RAG_LLM_MAX_CONCURRENCY', '4'))
+
+# LLM client (documents/llm_service.py). OpenAI when OPENAI_API_KEY is set,
+# otherwise LM Studio; both speak the same chat completion API.
+LLM_API_BASE = os.getenv('LLM_API_BASE', 'https://api.openai.com/v1' if OPENAI_API_KEY else LM_STUDIO_BASE_URL)
+LLM_API_KEY = os.getenv('LLM_API_KEY', OPENAI_API_KEY or 'lm-studio')
+LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-3.5-turbo')
+LLM_MAX_TOKENS = int(os.getenv('LLM_MAX_TOKENS', '500'))
+LLM_TEMPERATURE = float(os.getenv('LLM_TEMPERATURE', '0.3'))
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '60'))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv('LLM_CONNECT_TIMEOUT_SECONDS', '5'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+# Admission control, per process: requests beyond LLM_MAX_CONCURRENT_REQUESTS
+# wait in a queue of LLM_MAX_QUEUED_REQUESTS for up to
+# LLM_QUEUE_TIMEOUT_SECONDS; anything more is answered with 503 immediately
+LLM_MAX_CONCURRENT_REQUESTS = int(os.getenv('LLM_MAX_CONCURRENT_REQUESTS', '8'))
+LLM_MAX_QUEUED_REQUESTS = int(os.getenv('LLM_MAX_QUEUED_REQUESTS', '32'))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv('LLM_QUEUE_TIMEOUT_SECONDS', '10'))
+# Keep-alive connections kept open to the LLM server
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', '16'))
+
+# Context assembly (documents/context.py): retrieve RAG_CONTEXT_OVERFETCH
+# times num_chunks candidates, drop those with cosine similarity of at least
+# RAG_CONTEXT_DEDUP_THRESHOLD to a better one (1 disables), optionally
+# re-rank with MMR (lambda 0..1, unset disables) and keep at most
+# RAG_CONTEXT_MAX_TOKENS tokens of context in the prompt
+RAG_CONTEXT_MAX_TOKENS = int(os.getenv('RAG_CONTEXT_MAX_TOKENS', '1500'))
+RAG_CONTEXT_DEDUP_THRESHOLD = float(os.getenv('RAG_CONTEXT_DEDUP_THRESHOLD', '0.95'))
+RAG_CONTEXT_MMR_LAMBDA = float(os.getenv('RAG_CONTEXT_MMR_LAMBDA')) if os.getenv('RAG_CONTEXT_MMR_LAMBDA') else None
+RAG_CONTEXT_OVERFETCH = int(os.getenv('RAG_CONTEXT_OVERFETCH', '2'))
+
+# Hybrid retrieval (documents/lexical.py): a BM25 index per document, stored
+# next to the vectors, merged with vector results by reciprocal rank fusion.
+# Questions of at most RAG_LEXICAL_FAST_PATH_MAX_TERMS words that name an
+# identifier (email, phone number, token with digits or symbols) and whose
+# terms all occur in the document are answered from BM25 alone, without
+# embedding.
+RAG_LEXICAL_INDEX_DIR = os.getenv('RAG_LEXICAL_INDEX_DIR', RAG_VECTOR_INDEX_DIR)
+RAG_BM25_K1 = float(os.getenv('RAG_BM25_K1', '1.2'))
+RAG_BM25_B = float(os.getenv('RAG_BM25_B', '0.75'))
+RAG_HYBRID_ENABLED = os.getenv('RAG_HYBRID_ENABLED', 'True') == 'True'
+RAG_RRF_K = int(os.getenv('RAG_RRF_K', '60'))
+RAG_LEXICAL_FAST_PATH = os.getenv('RAG_LEXICAL_FAST_PATH', 'True') == 'True'
+RAG_LEXICAL_FAST_PATH_MAX_TERMS = int(os.getenv('RAG_LEXICAL_FAST_PATH_MAX_TERMS', '4'))
+
+# Questions across documents (document_ids list or "all") are routed to the
+# RAG_ROUTING_TOP_DOCUMENTS documents whose centroid embeddings are closest
+# to the question before chunks are searched
+RAG_ROUTING_TOP_DOCUMENTS = int(os.getenv('RAG_ROUTING_TOP_DOCUMENTS', '5'))
+
+# Extracted-text cache (documents/text_cache.py): raw page text per file,
+# keyed by content hash and extractor version, so rechunk/reembed never parse
+# the original files again. Codec 'auto' uses zstd when zstandard is
+# installed, gzip otherwise.
+RAG_TEXT_CACHE_ENABLED = os.getenv('RAG_TEXT_CACHE_ENABLED', 'True') == 'True'
+RAG_TEXT_CACHE_DIR = os.getenv('RAG_TEXT_CACHE_DIR', os.path.join(BASE_DIR, 'text_cache'))
+RAG_TEXT_CACHE_CODEC = os.getenv('RAG_TEXT_CACHE_CODEC', 'auto')
+
+# Chunk text (documents/chunk_text.py): 'inline' stores every chunk's text in
+# DocumentChunk and in the vector store; 'pages' stores each cleaned page once,
+# compressed, in DocumentPage and chunks as (page, char_start, char_length)
+# spans of it, hydrated in one query at retrieval. Codec 'auto' uses zstd when
+# zstandard is installed, zlib otherwise.
+RAG_CHUNK_TEXT_STORAGE = os.getenv('RAG_CHUNK_TEXT_STORAGE', 'inline')
+RAG_CHUNK_TEXT_CODEC = os.getenv('RAG_CHUNK_TEXT_CODEC', 'auto')
+
+# Instrumentation (documents/metrics.py): per-stage spans exported at /metrics
+# in the Prometheus text format and as Server-Timing response headers. A
+# RAG_PROFILE_SAMPLE_RATE fraction of requests runs under cProfile; profiles
+# of those taking at least RAG_PROFILE_SLOW_MS are written to RAG_PROFILE_DIR.
+RAG_METRICS_ENABLED = os.getenv('RAG_METRICS_ENABLED', 'True') == 'True'
+RAG_SERVER_TIMING_ENABLED = os.getenv('RAG_SERVER_TIMING_ENABLED', 'True') == 'True'
+RAG_PROFILE_SAMPLE_RATE = float(os.getenv('RAG_PROFILE_SAMPLE_RATE', '0'))
+RAG_PROFILE_SLOW_MS = float(os.getenv('RAG_PROFILE_SLOW_MS', '2000'))
+RAG_PROFILE_DIR = os.getenv('RAG_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+
+# Messages of the documents app (ingest progress, LLM and query errors) go to
+# the console at RAG_LOG_LEVEL
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'documents': {
+            'handlers': ['console'],
+            'level': os.getenv('RAG_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
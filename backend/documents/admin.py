@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Document
+from .models import Document, IngestionJob
 
 admin.site.register(Document)
+admin.site.register(IngestionJob)
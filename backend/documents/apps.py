@@ -1,6 +1,38 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def serves_requests():
+    """Whether this process is about to serve requests.
+
+    False for management commands other than ``runserver`` (and for the
+    runserver autoreloader's parent process), and for the gunicorn master,
+    whose workers start their own threads after the fork (see
+    gunicorn.conf.py).
+    """
+    program = os.path.basename(sys.argv[0])
+    if program in ('manage.py', 'django-admin'):
+        if sys.argv[1:2] != ['runserver']:
+            return False
+        return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+    return program != 'gunicorn'
 
 
 class DocumentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'documents'
+
+    def ready(self):
+        if settings.RAG_WARMUP_ON_STARTUP:
+            from .rag_engine import warmup
+
+            warmup()
+        if settings.INGEST_WORKER_MODE == 'thread' and serves_requests():
+            # Picks up jobs queued before a restart and retries due later
+            from .jobs import start_local_worker
+            from .rag_engine import get_rag_engine
+
+            start_local_worker(get_rag_engine())
@@ -0,0 +1,11 @@
+"""Offline benchmark suite (``manage.py bench_suite``).
+
+* ``corpus`` writes seeded synthetic TXT, DOCX and PDF corpora in several sizes;
+* ``harness`` ingests them through ``process_document`` and asks questions
+  through the API from N concurrent clients, against a throwaway index, the
+  stub LLM server (``documents/stub_llm.py``) and optionally the
+  deterministic fake embedder (``RAG_EMBEDDING_MODEL=fake``);
+* ``results`` saves runs as JSON and compares them with a baseline;
+* ``embedding_recall`` compares embedding backends and vector dtypes on
+  chunks of processed documents (``manage.py bench_embeddings``).
+"""
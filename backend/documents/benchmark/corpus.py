@@ -0,0 +1,105 @@
+"""Synthetic, seeded corpora in every supported file format"""
+import os
+import random
+import textwrap
+
+WORDS = (
+    'python django react api database model training pipeline latency cache '
+    'deployed designed implemented improved reduced users service team data '
+    'analysis system performance query index vector search document scaling'
+).split()
+HEADERS = ['Education', 'Experience', 'Skills', 'Projects', 'Certifications', 'Awards']
+
+# name: (documents per format, pages per document)
+SIZES = {
+    'small': (4, 5),
+    'medium': (4, 50),
+    'large': (2, 400),
+}
+FORMATS = ('txt', 'docx', 'pdf')
+
+
+def synthetic_pages(num_pages, seed=0):
+    """Resume/report-like pages: headers, bullet lines and wrapped prose"""
+    rng = random.Random(seed)
+    pages = []
+    for page_number in range(1, num_pages + 1):
+        lines = []
+        for _ in range(rng.randint(3, 6)):
+            lines.append(rng.choice(HEADERS))
+            for _ in range(rng.randint(4, 12)):
+                words = rng.choices(WORDS, k=rng.randint(6, 18))
+                lines.append('• ' + ' '.join(words).capitalize() + '.')
+            lines.append('')
+            prose = ' '.join(rng.choices(WORDS, k=rng.randint(80, 400)))
+            lines.append(prose.capitalize() + '.')
+            lines.append('')
+        pages.append((page_number, '\n'.join(lines)))
+    return pages
+
+
+def write_txt(path, pages):
+    # The text extractor starts a new page at every form feed
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('\f'.join(text for _, text in pages))
+
+
+def write_docx(path, pages):
+    from docx import Document as DocxDocument
+
+    document = DocxDocument()
+    for index, (_, text) in enumerate(pages):
+        for paragraph in text.split('\n'):
+            if paragraph:
+                document.add_paragraph(paragraph)
+        if index < len(pages) - 1:
+            document.add_page_break()
+    document.save(path)
+
+
+def write_pdf(path, pages, font_size=7):
+    import fitz
+
+    pdf = fitz.open()
+    for _, text in pages:
+        page = pdf.new_page()
+        lines = [wrapped for line in text.split('\n') for wrapped in textwrap.wrap(line, 150) or ['']]
+        # Lines that do not fit on the page are dropped, like a real layout would
+        fitting = int((page.rect.height - 72) // (font_size * 1.2))
+        page.insert_text((36, 36 + font_size), lines[:fitting], fontsize=font_size)
+    pdf.save(path)
+    pdf.close()
+
+
+WRITERS = {'txt': write_txt, 'docx': write_docx, 'pdf': write_pdf}
+
+
+def build_corpus(root, size, formats=FORMATS, seed=0):
+    """Write the corpus of one size under ``root``.
+
+    Returns ``{file_type: [path, ...]}``. Every document gets its own seed so
+    no two files share content (which would be deduplicated).
+    """
+    documents, pages_per_document = SIZES[size]
+    corpus = {}
+    for format_index, file_type in enumerate(formats):
+        paths = []
+        for index in range(documents):
+            document_seed = seed * 1000003 + format_index * 1009 + index
+            path = os.path.join(root, f"{size}-{index}.{file_type}")
+            WRITERS[file_type](path, synthetic_pages(pages_per_document, document_seed))
+            paths.append(path)
+        corpus[file_type] = paths
+    return corpus
+
+
+def synthetic_questions(count, seed=0):
+    """Questions over the corpus vocabulary: keyword lookups and longer ones"""
+    rng = random.Random(seed)
+    questions = []
+    for i in range(count):
+        if i % 3 == 0:
+            questions.append(' '.join(rng.sample(WORDS, 2)))
+        else:
+            questions.append(f"What does the document say about {' and '.join(rng.sample(WORDS, 3))}?")
+    return questions
@@ -0,0 +1,133 @@
+"""Recall vs speed of embedding backends and vector dtypes on stored chunks.
+
+Every configuration is a backend (``sentence-transformers``, ``onnx``,
+``onnx-int8`` or ``fake``) and a vector storage dtype. Each one encodes the
+same sample of chunks from processed documents, indexes them in a throwaway
+``NumpyVectorStore`` and answers the same queries. Queries are spans cut
+out of sampled chunks, so there is a known source chunk without labelling
+anything. Recall is measured against the first (reference) configuration's
+top-k, normally full-precision sentence-transformers with float32 vectors.
+"""
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+
+from ..chunk_text import iter_chunk_texts
+from ..embedding_backends import load_embedding_model
+from ..models import DocumentChunk
+from ..vector_stores import NumpyVectorStore, document_id_from_chunk_id
+from .harness import percentiles_ms
+
+_WORD = re.compile(r'\S+')
+
+
+def parse_config(config):
+    """``'onnx-int8:int8'`` -> ``('onnx', True, 'int8')``; the dtype defaults to float32"""
+    backend, _, dtype = config.partition(':')
+    quantize = backend == 'onnx-int8'
+    return ('onnx' if quantize else backend), quantize, dtype or 'float32'
+
+
+def sample_chunks(limit, seed=0, document_ids=None):
+    """Up to ``limit`` chunks of completed documents as ``[(chunk_id, text)]``"""
+    chunks = DocumentChunk.objects.filter(document__processing_status='completed')
+    if document_ids:
+        chunks = chunks.filter(document_id__in=document_ids)
+    ids = list(chunks.exclude(embedding_id=None).order_by('id').values_list('id', flat=True))
+    if len(ids) > limit:
+        ids = random.Random(seed).sample(ids, limit)
+    return list(iter_chunk_texts(DocumentChunk.objects.filter(id__in=ids).order_by('id')))
+
+
+def sample_queries(chunks, count, seed=0, min_words=6, max_words=14):
+    """``[(query, source_chunk_id)]``: word spans from randomly chosen chunks"""
+    rng = random.Random(seed)
+    candidates = [(chunk_id, _WORD.findall(text)) for chunk_id, text in chunks]
+    candidates = [(chunk_id, words) for chunk_id, words in candidates if len(words) >= min_words]
+    queries = []
+    for _ in range(min(count, len(candidates))):
+        chunk_id, words = rng.choice(candidates)
+        length = rng.randint(min_words, min(max_words, len(words)))
+        start = rng.randint(0, len(words) - length)
+        queries.append((' '.join(words[start:start + length]), chunk_id))
+    return queries
+
+
+def measure(config, chunks, queries, k, model_name, onnx_dir, threads=0, batch_size=64, normalize=False):
+    """Run one configuration; returns its result dict and per-query top-k ids"""
+    backend, quantize, dtype = parse_config(config)
+    started = time.perf_counter()
+    model = load_embedding_model(backend, model_name, threads=threads, onnx_dir=onnx_dir, quantize=quantize)
+    load_seconds = time.perf_counter() - started
+
+    def encode(texts):
+        return model.encode(
+            texts,
+            batch_size=batch_size,
+            normalize_embeddings=normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+
+    encode(['warmup'])
+    started = time.perf_counter()
+    vectors = encode([text for _, text in chunks])
+    encode_seconds = time.perf_counter() - started
+
+    query_ms = []
+    query_vectors = []
+    for query, _ in queries:
+        started = time.perf_counter()
+        query_vectors.append(encode([query])[0])
+        query_ms.append((time.perf_counter() - started) * 1000)
+
+    root = tempfile.mkdtemp(prefix='bench_embeddings_')
+    try:
+        store = NumpyVectorStore(root, dtype=dtype)
+        ids = [chunk_id for chunk_id, _ in chunks]
+        metadatas = [{'document_id': document_id_from_chunk_id(chunk_id)} for chunk_id in ids]
+        store.add(ids, vectors, None, metadatas)
+        document_ids = sorted({metadata['document_id'] for metadata in metadatas})
+        for document_id in document_ids:
+            store.commit(document_id)
+        vector_bytes = sum(
+            os.path.getsize(os.path.join(directory, name))
+            for directory, _, names in os.walk(root)
+            for name in names if name in ('embeddings.npy', 'scales.npy')
+        )
+
+        search_ms = []
+        top_ids = []
+        for vector in query_vectors:
+            started = time.perf_counter()
+            result = store.query([vector], k, document_ids=document_ids)
+            search_ms.append((time.perf_counter() - started) * 1000)
+            top_ids.append(result['ids'][0])
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    hits = sum(1 for (_, source), found in zip(queries, top_ids) if source in found)
+    result = {
+        'backend': backend,
+        'quantized': quantize,
+        'dtype': dtype,
+        'load_seconds': round(load_seconds, 3),
+        'chunks_per_s': round(len(chunks) / encode_seconds, 2) if encode_seconds else None,
+        'query_encode': percentiles_ms(query_ms),
+        'search': percentiles_ms(search_ms),
+        'vector_bytes': vector_bytes,
+        'hit_rate': round(hits / len(queries), 4) if queries else None,
+    }
+    return result, top_ids
+
+
+def recall_at_k(reference, candidate):
+    """Mean overlap of each candidate top-k with the reference top-k"""
+    overlaps = [
+        len(set(expected) & set(found)) / len(expected)
+        for expected, found in zip(reference, candidate) if expected
+    ]
+    return round(sum(overlaps) / len(overlaps), 4) if overlaps else None
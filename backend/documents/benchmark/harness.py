@@ -0,0 +1,169 @@
+"""Ingest and query measurements over an isolated, throwaway index"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.files import File
+from django.db import close_old_connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from ..embeddings import reset_embedding_model
+from ..llm_service import reset_llm_client
+from ..models import Document
+from ..rag_engine import get_rag_engine, reset_rag_engine
+from ..runtime import memory_usage
+
+ASK_PATH = '/api/documents/ask/'
+
+
+def percentiles_ms(samples):
+    if not samples:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {'p50_ms': round(float(p50), 2), 'p95_ms': round(float(p95), 2), 'p99_ms': round(float(p99), 2)}
+
+
+class BenchmarkEnvironment:
+    """Settings for a benchmark run: every index, cache and upload lives
+    under ``root``, the answer caches are off so each question runs the
+    whole pipeline, and the LLM is ``llm_api_base`` (the stub server).
+
+    The shared engine, embedding model and LLM client are rebuilt on entry
+    and exit so they pick the settings up.
+    """
+
+    def __init__(self, root, llm_api_base, embedding_model=None, vector_store='numpy'):
+        overrides = dict(
+            MEDIA_ROOT=os.path.join(root, 'media'),
+            RAG_VECTOR_STORE=vector_store,
+            RAG_VECTOR_INDEX_DIR=os.path.join(root, 'vector_index'),
+            RAG_LEXICAL_INDEX_DIR=os.path.join(root, 'vector_index'),
+            CHROMA_DB_PATH=os.path.join(root, 'chroma_db'),
+            RAG_TEXT_CACHE_ENABLED=False,
+            RAG_CHUNK_EMBEDDING_STORE_ENABLED=False,
+            RAG_CACHE_ENABLED=False,
+            RAG_SEMANTIC_CACHE_ENABLED=False,
+            INGEST_WORKER_MODE='external',
+            LLM_API_BASE=llm_api_base,
+            LLM_API_KEY='stub',
+        )
+        if embedding_model:
+            overrides['RAG_EMBEDDING_MODEL'] = embedding_model
+        self.embedding_model = embedding_model
+        self._overrides = override_settings(**overrides)
+
+    def _reset(self):
+        reset_rag_engine()
+        reset_llm_client()
+        if self.embedding_model:
+            reset_embedding_model()
+
+    def __enter__(self):
+        self._overrides.enable()
+        self._reset()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._reset()
+        self._overrides.disable()
+
+
+def ingest_files(paths, file_type):
+    """Create and process one document per file, one after another.
+
+    Returns the processed documents and a result dict with throughput, the
+    summed per-stage timings and the process's peak RSS so far. If a file
+    fails, the documents created so far are removed again.
+    """
+    engine = get_rag_engine()
+    documents = []
+    stages = {}
+    pages = chunks = 0
+    seconds = 0.0
+    for path in paths:
+        name = os.path.basename(path)
+        document = Document(title=name, file_type=file_type, file_size=os.path.getsize(path))
+        with open(path, 'rb') as handle:
+            document.file_path.save(name, File(handle), save=False)
+        document.save()
+
+        started = time.perf_counter()
+        try:
+            engine.process_document(document)
+        except Exception:
+            remove_documents(documents + [document])
+            raise
+        seconds += time.perf_counter() - started
+
+        pages += document.pages_count
+        chunks += document.chunks.count()
+        for stage, stage_seconds in document.ingest_timings.items():
+            if stage != 'total':
+                stages[stage] = stages.get(stage, 0.0) + stage_seconds
+        documents.append(document)
+
+    return documents, {
+        'documents': len(paths),
+        'pages': pages,
+        'chunks': chunks,
+        'seconds': round(seconds, 3),
+        'pages_per_s': round(pages / seconds, 2) if seconds else None,
+        'chunks_per_s': round(chunks / seconds, 2) if seconds else None,
+        'stage_seconds': {stage: round(value, 3) for stage, value in sorted(stages.items())},
+        'peak_rss_mb': memory_usage()['peak_rss_mb'],
+    }
+
+
+def run_queries(document_ids, questions, clients, requests, warmup=2):
+    """Ask ``requests`` questions through the API with ``clients`` threads.
+
+    Each thread uses its own test client, so requests run through the full
+    Django stack concurrently the way a threaded server runs them. Questions
+    and documents are assigned round robin.
+    """
+    jobs = [
+        {'document_id': document_ids[i % len(document_ids)], 'question': questions[i % len(questions)]}
+        for i in range(requests)
+    ]
+    local = threading.local()
+
+    def ask(payload):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = Client(HTTP_HOST='localhost')
+        started = time.perf_counter()
+        response = client.post(ASK_PATH, payload, content_type='application/json')
+        return (time.perf_counter() - started) * 1000, response.status_code
+
+    def ask_and_release(payload):
+        try:
+            return ask(payload)
+        finally:
+            close_old_connections()
+
+    for payload in jobs[:warmup]:
+        ask_and_release(payload)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        outcomes = list(pool.map(ask_and_release, jobs))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, status in outcomes if status == 200]
+    return dict(
+        percentiles_ms(latencies),
+        clients=clients,
+        requests=requests,
+        errors=sum(1 for _, status in outcomes if status != 200),
+        requests_per_s=round(len(outcomes) / elapsed, 2) if elapsed else None,
+        peak_rss_mb=memory_usage()['peak_rss_mb'],
+    )
+
+
+def remove_documents(documents):
+    engine = get_rag_engine()
+    for document in documents:
+        engine.delete_document(document)
@@ -0,0 +1,80 @@
+"""Benchmark result files and comparison against a baseline"""
+import json
+import os
+import platform
+import subprocess
+import time
+
+# Metrics compared against the baseline, by name suffix
+HIGHER_IS_BETTER = ('pages_per_s', 'chunks_per_s', 'requests_per_s')
+LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb')
+
+
+def environment():
+    """Where a result was measured; results from different machines do not compare"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def save(path, results):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def flatten(results, prefix=''):
+    """``{'ingest': {'pdf-small': {'pages_per_s': 1}}}`` -> ``{'ingest.pdf-small.pages_per_s': 1}``"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def direction(name):
+    """+1 if a larger value is better, -1 if smaller is, 0 if not compared"""
+    if name.endswith(HIGHER_IS_BETTER):
+        return 1
+    if name.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(current, baseline, threshold):
+    """Compare two result dicts metric by metric.
+
+    Returns ``[(name, baseline, current, change, regressed)]`` for every
+    metric present in both, where ``change`` is the relative change
+    (positive means better) and ``regressed`` is True when it is worse than
+    ``-threshold``.
+    """
+    now = flatten(current.get('results', current))
+    before = flatten(baseline.get('results', baseline))
+    rows = []
+    for name in sorted(set(now) & set(before)):
+        sign = direction(name)
+        if not sign or not before[name]:
+            continue
+        change = sign * (now[name] - before[name]) / abs(before[name])
+        rows.append((name, before[name], now[name], change, change < -threshold))
+    return rows
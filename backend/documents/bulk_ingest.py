@@ -0,0 +1,233 @@
+"""Bulk ingestion of a directory tree (``manage.py ingest_dir``).
+
+The per-upload pipeline embeds one document at a time, which leaves the
+model idle while files are parsed and runs it on small batches. Here the
+work is split differently:
+
+* files are parsed and chunked in a process pool (``extract_file``), so
+  PDF and DOCX parsing uses every core;
+* chunks of many files are collected and embedded in one large call on
+  the single in-process model (or the embedding server);
+* vectors, lexical postings and ``DocumentChunk`` rows of the whole batch
+  are written in bulk, in one transaction (``BulkWriter.flush``).
+"""
+import logging
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from . import chunk_text, dedup, metrics
+from .extraction import setup_django_worker
+from .metrics import span
+from .models import Document, DocumentChunk
+from .routing import centroid_bytes, unit_rows_sum
+
+logger = logging.getLogger(__name__)
+
+ExtractedFile = namedtuple(
+    'ExtractedFile',
+    ['path', 'file_type', 'file_size', 'content_hash', 'page_count', 'chars', 'chunks', 'page_hashes',
+     'pages', 'timings', 'duplicate', 'error']
+)
+
+_known_hashes = frozenset()
+
+
+def _init_worker(known_hashes):
+    global _known_hashes
+
+    # Files are already spread over the pool; a PDF must not start a pool of its own
+    settings.PDF_PARALLEL_WORKERS = 1
+    _known_hashes = known_hashes
+
+
+def extract_file(path, file_type):
+    """Hash, extract and chunk one file (runs in a pool process).
+
+    Files whose hash is already ingested are not extracted. Errors are
+    returned rather than raised so one bad file does not stop a run. Stage
+    timings are returned too, as this process's metrics are not exported.
+    """
+    from .rag_engine import get_rag_engine
+
+    file_size = os.path.getsize(path)
+    content_hash = None
+    try:
+        content_hash = dedup.hash_file(path)
+        if content_hash in _known_hashes:
+            return ExtractedFile(path, file_type, file_size, content_hash, 0, 0, [], [], [], {}, True, None)
+
+        engine = get_rag_engine()
+        page_hashes = []
+        # Cleaned page text travels back only when chunks are stored as spans of it
+        page_texts = [] if chunk_text.stores_pages() else None
+        with metrics.collect() as timings:
+            with engine.open_pages(path, file_type, content_hash) as extractor:
+                chunks = list(engine.iter_page_chunks(extractor, page_hashes=page_hashes, page_texts=page_texts))
+        return ExtractedFile(
+            path, file_type, file_size, content_hash, extractor.page_count or 0, extractor.chars_extracted,
+            chunks, page_hashes, page_texts or [], timings.stages, False, None
+        )
+    except Exception as e:
+        return ExtractedFile(path, file_type, file_size, content_hash, 0, 0, [], [], [], {}, False, str(e))
+
+
+def get_ingest_pool(workers, known_hashes=frozenset()):
+    """Process pool for ``extract_file``; started with ``forkserver`` for the
+    same reason as the PDF extraction pool"""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('forkserver'),
+        initializer=setup_django_worker,
+        initargs=('documents.bulk_ingest._init_worker', frozenset(known_hashes))
+    )
+
+
+def ingested_hashes():
+    """Content hashes of documents that are not failed"""
+    return set(
+        Document.objects
+        .exclude(processing_status='failed')
+        .exclude(content_hash='')
+        .values_list('content_hash', flat=True)
+    )
+
+
+class BulkWriter:
+    """Collects extracted files and writes them as completed documents.
+
+    ``add`` buffers a file; once ``batch_size`` chunks are buffered (or on
+    ``flush``) their texts are embedded in one call and everything is
+    written. ``flush`` returns ``[(extracted, document)]`` for the files it
+    committed. If writing fails nothing of the batch is kept: the
+    transaction rolls back and vectors and copied files are removed.
+
+    Each document's ``ingest_timings`` holds its own extraction stages plus
+    its share, by chunk count, of the batch's embed and write time.
+    """
+
+    def __init__(self, engine, batch_size):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.pending = []
+        self.pending_chunks = 0
+
+    def add(self, extracted):
+        self.pending.append(extracted)
+        self.pending_chunks += len(extracted.chunks)
+        if self.pending_chunks >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        batch, self.pending, self.pending_chunks = self.pending, [], 0
+        if not batch:
+            return []
+
+        for extracted in batch:
+            for stage, seconds in extracted.timings.items():
+                metrics.record(stage, seconds)
+
+        with metrics.collect() as timings:
+            committed = self._write(batch)
+
+        batch_chunks = sum(len(extracted.chunks) for extracted in batch)
+        for extracted, document in committed:
+            share = len(extracted.chunks) / batch_chunks
+            document_timings = dict(extracted.timings)
+            for stage, seconds in timings.stages.items():
+                document_timings[stage] = document_timings.get(stage, 0.0) + seconds * share
+            document.ingest_timings = {stage: round(seconds, 4) for stage, seconds in document_timings.items()}
+            document.ingest_timings['total'] = round(sum(document_timings.values()), 4)
+        Document.objects.bulk_update([document for _, document in committed], ['ingest_timings'])
+        metrics.documents_ingested.inc('completed', amount=len(committed))
+        return committed
+
+    def _write(self, batch):
+        texts = [chunk.text for extracted in batch for chunk in extracted.chunks]
+        with span('embed'):
+            embeddings, reused = self.engine.embed_chunks(texts)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        metrics.chunks_stored.inc('reused', amount=reused)
+        metrics.chunks_stored.inc('embedded', amount=len(texts) - reused)
+        if reused:
+            logger.info("Reused stored embeddings for %d/%d chunks", reused, len(texts))
+
+        vector_store = self.engine.vector_store
+        lexical_index = self.engine.lexical_index
+        space = dedup.embedding_space(settings.RAG_NORMALIZE_EMBEDDINGS)
+        documents = []
+        written = []
+        try:
+            with transaction.atomic():
+                rows = []
+                offset = 0
+                for extracted in batch:
+                    name = os.path.basename(extracted.path)
+                    document = Document(
+                        title=name,
+                        file_type=extracted.file_type,
+                        file_size=extracted.file_size,
+                        content_hash=extracted.content_hash,
+                        pages_count=extracted.page_count,
+                        page_hashes=extracted.page_hashes,
+                        processing_status='completed'
+                    )
+                    with span('db_write'):
+                        with open(extracted.path, 'rb') as handle:
+                            document.file_path.save(name, File(handle), save=False)
+                        documents.append(document)
+                        vectors = embeddings[offset:offset + len(extracted.chunks)]
+                        offset += len(extracted.chunks)
+                        document.centroid = centroid_bytes(unit_rows_sum(vectors))
+                        document.save()
+                        page_ids = chunk_text.store_pages(document, extracted.pages)
+
+                    chunk_ids = [f"doc_{document.id}_chunk_{i}" for i in range(len(extracted.chunks))]
+                    chunk_texts = [chunk.text for chunk in extracted.chunks]
+                    metadatas = [
+                        {
+                            "document_id": document.id,
+                            "chunk_index": i,
+                            "page_number": chunk.page_number,
+                            "char_start": chunk.char_start if chunk.char_start is not None else -1,
+                            "document_title": document.title,
+                            "embedding_space": space
+                        }
+                        for i, chunk in enumerate(extracted.chunks)
+                    ]
+                    with span('vector_write'):
+                        vector_store.add(chunk_ids, vectors, None if page_ids else chunk_texts, metadatas)
+                        lexical_index.add(chunk_ids, chunk_texts)
+                    written.append(document.id)
+                    rows.extend(
+                        chunk_text.chunk_row(
+                            document, i, chunk, chunk_id, dedup.chunk_text_hash(chunk.text), page_ids
+                        )
+                        for i, (chunk, chunk_id) in enumerate(zip(extracted.chunks, chunk_ids))
+                    )
+
+                with span('db_write'):
+                    DocumentChunk.objects.bulk_create(rows, batch_size=settings.RAG_INGEST_BATCH_SIZE)
+                with span('vector_write'):
+                    for document_id in written:
+                        vector_store.commit(document_id)
+                        lexical_index.commit(document_id)
+        except Exception:
+            for document_id in written:
+                try:
+                    self.engine.remove_document_index(document_id)
+                except Exception as cleanup_error:
+                    logger.warning("Failed to remove vectors of document %s: %s", document_id, cleanup_error)
+            for document in documents:
+                if document.file_path.name:
+                    document.file_path.storage.delete(document.file_path.name)
+            raise
+
+        return list(zip(batch, documents))
@@ -0,0 +1,75 @@
+"""Cache backends used by the RAG caches"""
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+
+# Bytes held per cache LOCATION, shared by every thread's backend instance
+# the same way LocMemCache shares its storage.
+_used_bytes = {}
+
+
+class BoundedLocMemCache(LocMemCache):
+    """LocMemCache with an LRU memory cap in addition to MAX_ENTRIES.
+
+    ``OPTIONS['MAX_BYTES']`` bounds the total size of the pickled values; the
+    least recently used entries are evicted until a new value fits.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        options = params.get('OPTIONS', {})
+        self._max_bytes = int(options.get('MAX_BYTES', 0)) or None
+        self._used = _used_bytes.setdefault(name, [0])
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        # Take the old value out first: a cull in super()._set could
+        # otherwise evict it and have its size subtracted a second time
+        previous = self._cache.pop(key, None)
+        if previous is not None:
+            self._used[0] -= len(previous)
+        super()._set(key, value, timeout)
+        self._used[0] += len(value)
+
+        if self._max_bytes:
+            while self._used[0] > self._max_bytes and len(self._cache) > 1:
+                self._evict_lru()
+
+    def _evict_lru(self):
+        lru_key, lru_value = self._cache.popitem()
+        self._expire_info.pop(lru_key, None)
+        self._used[0] -= len(lru_value)
+
+    def _cull(self):
+        if self._cull_frequency == 0:
+            self._cache.clear()
+            self._expire_info.clear()
+            self._used[0] = 0
+        else:
+            for i in range(len(self._cache) // self._cull_frequency):
+                self._evict_lru()
+
+    def _delete(self, key):
+        value = self._cache.get(key)
+        deleted = super()._delete(key)
+        if deleted and value is not None:
+            self._used[0] -= len(value)
+        return deleted
+
+    def incr(self, key, delta=1, version=None):
+        cache_key = self.make_and_validate_key(key, version=version)
+        previous = self._cache.get(cache_key)
+        new_value = super().incr(key, delta, version)
+        with self._lock:
+            current = self._cache.get(cache_key)
+            if previous is not None and current is not None:
+                self._used[0] += len(current) - len(previous)
+        return new_value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._expire_info.clear()
+            self._used[0] = 0
+
+    @property
+    def used_bytes(self):
+        return self._used[0]
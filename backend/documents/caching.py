@@ -0,0 +1,143 @@
+"""Layered caches for the query path.
+
+Three independent layers, each a Django cache alias so it can be local
+memory or file-backed and carries its own TTL, entry and memory limits:
+
+* ``rag_embeddings`` - question text -> question embedding
+* ``rag_retrieval``  - (document, embedding, num_chunks, index version) -> chunk ids
+* ``rag_answers``    - (prompt, model, temperature) -> LLM answer
+
+Retrieval keys include ``Document.index_version``, which is bumped whenever a
+document is (re)processed, so stale retrievals are never served. Nothing is
+dropped when a document is deleted: its id is never reused, so its retrieval
+keys can no longer be looked up and expire with the layer's TTL. Answer keys
+hash the whole prompt, retrieved context included, so they are not tied to a
+document at all. (The semantic cache, which is per document, is dropped on
+delete; see ``RAGEngine.remove_document_index``.)
+"""
+import hashlib
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+from .embeddings import embedding_model_name
+
+EMBEDDING_LAYER = 'rag_embeddings'
+RETRIEVAL_LAYER = 'rag_retrieval'
+ANSWER_LAYER = 'rag_answers'
+LAYERS = (EMBEDDING_LAYER, RETRIEVAL_LAYER, ANSWER_LAYER)
+
+_MISSING = object()
+
+
+class CacheStats:
+    """Per-process hit and miss counters for each cache layer"""
+
+    def __init__(self, layers):
+        self._lock = threading.Lock()
+        self._counts = {layer: {'hits': 0, 'misses': 0} for layer in layers}
+
+    def record(self, layer, hit):
+        with self._lock:
+            self._counts.setdefault(layer, {'hits': 0, 'misses': 0})
+            self._counts[layer]['hits' if hit else 'misses'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {}
+            for layer, counts in self._counts.items():
+                total = counts['hits'] + counts['misses']
+                snapshot[layer] = dict(counts, hit_rate=round(counts['hits'] / total, 3) if total else None)
+            return snapshot
+
+    def reset(self):
+        with self._lock:
+            for counts in self._counts.values():
+                counts['hits'] = counts['misses'] = 0
+
+
+stats = CacheStats(LAYERS)
+
+
+def _digest(*parts):
+    sha = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        elif not isinstance(part, bytes):
+            part = str(part).encode('utf-8')
+        sha.update(part)
+        sha.update(b'\x00')
+    return sha.hexdigest()
+
+
+def _get(layer, key):
+    if not settings.RAG_CACHE_ENABLED:
+        return None
+    value = caches[layer].get(key, _MISSING)
+    hit = value is not _MISSING
+    stats.record(layer, hit)
+    return value if hit else None
+
+
+def _set(layer, key, value):
+    if settings.RAG_CACHE_ENABLED:
+        caches[layer].set(key, value)
+
+
+def embedding_key(question, normalize):
+    return 'emb:' + _digest(embedding_model_name(), normalize, question.strip())
+
+
+def get_question_embedding(question, normalize):
+    value = _get(EMBEDDING_LAYER, embedding_key(question, normalize))
+    return np.frombuffer(value, dtype=np.float32) if value is not None else None
+
+
+def set_question_embedding(question, normalize, embedding):
+    _set(EMBEDDING_LAYER, embedding_key(question, normalize), np.asarray(embedding, dtype=np.float32).tobytes())
+
+
+def retrieval_key(document_id, index_version, embedding, num_chunks):
+    embedding_hash = _digest(np.asarray(embedding, dtype=np.float32).tobytes())
+    return f'ret:{document_id}:{index_version}:{num_chunks}:{embedding_hash}'
+
+
+def get_retrieval(document, embedding, num_chunks):
+    return _get(RETRIEVAL_LAYER, retrieval_key(document.id, document.index_version, embedding, num_chunks))
+
+
+def set_retrieval(document, embedding, num_chunks, chunk_ids):
+    _set(RETRIEVAL_LAYER, retrieval_key(document.id, document.index_version, embedding, num_chunks), list(chunk_ids))
+
+
+def answer_key(prompt, model, temperature):
+    return 'ans:' + _digest(prompt, model, temperature)
+
+
+def get_answer(prompt, model, temperature):
+    return _get(ANSWER_LAYER, answer_key(prompt, model, temperature))
+
+
+def set_answer(prompt, model, temperature, answer):
+    _set(ANSWER_LAYER, answer_key(prompt, model, temperature), answer)
+
+
+def invalidate_document(document):
+    """Bump the document's index version so cached retrievals stop matching"""
+    from .models import Document
+
+    Document.objects.filter(pk=document.pk).update(index_version=F('index_version') + 1)
+    document.refresh_from_db(fields=['index_version'])
+
+
+def cache_stats():
+    snapshot = stats.snapshot()
+    for layer in LAYERS:
+        used_bytes = getattr(caches[layer], 'used_bytes', None)
+        if used_bytes is not None:
+            snapshot[layer]['used_bytes'] = used_bytes
+    return snapshot
@@ -0,0 +1,148 @@
+"""Where chunk text lives.
+
+By default (``RAG_CHUNK_TEXT_STORAGE=inline``) every chunk's text is stored
+twice: in ``DocumentChunk.text_content`` and as the document of its vector.
+With ``pages`` the cleaned text of each page is stored once, compressed, in
+``DocumentPage``, and a chunk is only a reference to a span of it::
+
+    (document, page, char_start, char_length)
+
+The vector store then keeps ids and metadata only, overlapping chunks share
+their text, and retrieval hydrates texts by chunk id in one joined query
+(``fetch_texts``). The legacy chunker's chunks are not exact page spans,
+so with it text is always stored inline.
+"""
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from django.conf import settings
+
+from .models import DocumentChunk, DocumentPage
+
+CODECS = ('zst', 'zlib')
+
+
+def stores_pages():
+    # Legacy chunks are not exact page spans, so there is nothing to reference
+    return settings.RAG_CHUNK_TEXT_STORAGE == 'pages' and settings.RAG_CHUNKER != 'legacy'
+
+
+def resolve_codec(codec):
+    if codec == 'auto':
+        return 'zst' if zstandard is not None else 'zlib'
+    if codec not in CODECS:
+        raise ValueError(f"Unknown chunk text codec {codec}")
+    if codec == 'zst' and zstandard is None:
+        raise ValueError("RAG_CHUNK_TEXT_CODEC=zst needs the zstandard package")
+    return codec
+
+
+def compress(text, codec):
+    data = text.encode('utf-8')
+    if codec == 'zst':
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+
+def decompress(data, codec):
+    data = bytes(data)
+    if codec == 'zst':
+        if zstandard is None:
+            raise ValueError("Page text is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    return zlib.decompress(data).decode('utf-8')
+
+
+def store_pages(document, pages):
+    """Write ``(page_number, text)`` pairs as ``DocumentPage`` rows.
+
+    Returns ``{page_number: page_id}``. The ids are read back because
+    ``bulk_create`` does not set primary keys on MySQL.
+    """
+    if not pages:
+        return {}
+    codec = resolve_codec(settings.RAG_CHUNK_TEXT_CODEC)
+    DocumentPage.objects.bulk_create(
+        [
+            DocumentPage(document=document, page_number=page_number, codec=codec, text=compress(text, codec))
+            for page_number, text in pages
+        ],
+        batch_size=settings.RAG_INGEST_BATCH_SIZE
+    )
+    return dict(
+        DocumentPage.objects
+        .filter(document=document, page_number__in=[page_number for page_number, _ in pages])
+        .values_list('page_number', 'id')
+    )
+
+
+def chunk_row(document, chunk_index, chunk, chunk_id, text_hash, page_ids=None):
+    """The ``DocumentChunk`` of a ``Chunk``.
+
+    When ``page_ids`` has the chunk's page and the chunk is an exact span of
+    it, only the span is stored; otherwise the text is stored inline.
+    """
+    span = chunk.char_start is not None
+    page_id = page_ids.get(chunk.page_number) if page_ids and span else None
+    return DocumentChunk(
+        document=document,
+        chunk_index=chunk_index,
+        text_content='' if page_id else chunk.text,
+        page_number=chunk.page_number,
+        page_id=page_id,
+        char_start=chunk.char_start,
+        char_length=len(chunk.text) if span else None,
+        embedding_id=chunk_id,
+        text_hash=text_hash
+    )
+
+
+def fetch_texts(chunk_ids):
+    """``{chunk_id: text}`` for stored chunks, in one query; each page is
+    decompressed once however many of its chunks are asked for"""
+    rows = (
+        DocumentChunk.objects
+        .filter(embedding_id__in=list(chunk_ids))
+        .select_related('page')
+        .only('embedding_id', 'text_content', 'char_start', 'char_length', 'page__codec', 'page__text')
+    )
+    pages = {}
+    texts = {}
+    for row in rows:
+        if row.page_id is None:
+            texts[row.embedding_id] = row.text_content
+            continue
+        page_text = pages.get(row.page_id)
+        if page_text is None:
+            page_text = pages[row.page_id] = decompress(row.page.text, row.page.codec)
+        texts[row.embedding_id] = page_text[row.char_start:row.char_start + row.char_length]
+    return texts
+
+
+def iter_chunk_texts(chunks, batch_size=2000):
+    """Yield ``(chunk_id, text)`` for a ``DocumentChunk`` queryset, in its
+    order, fetching the pages of each batch of chunks in one query"""
+    rows = chunks.values_list('embedding_id', 'page_id', 'char_start', 'char_length', 'text_content')
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield from _batch_texts(batch)
+            batch = []
+    yield from _batch_texts(batch)
+
+
+def _batch_texts(batch):
+    page_ids = {page_id for _, page_id, _, _, _ in batch if page_id is not None}
+    pages = {
+        page_id: decompress(text, codec)
+        for page_id, codec, text in DocumentPage.objects.filter(id__in=page_ids).values_list('id', 'codec', 'text')
+    } if page_ids else {}
+    for chunk_id, page_id, char_start, char_length, text in batch:
+        if page_id is not None:
+            text = pages[page_id][char_start:char_start + char_length]
+        yield chunk_id, text
@@ -0,0 +1,218 @@
+"""Token-aware chunking.
+
+``TokenChunker`` measures chunk size in tokens of the embedding model's own
+tokenizer, so chunks never exceed what the model actually reads (the default
+all-MiniLM-L6-v2 silently truncates at 256 word pieces). It makes a single
+pass over a stream of pages:
+
+* each page is split into units - non-empty lines, with long lines further
+  split at sentence ends - and all units of a page are tokenized in one
+  batched tokenizer call;
+* units are packed greedily up to ``max_tokens``; a new chunk starts with the
+  trailing units of the previous one, up to ``overlap_tokens``;
+* a line matching the section-header pattern always starts a new chunk (and
+  no overlap is carried across sections);
+* units longer than ``max_tokens`` are cut into token windows using the
+  tokenizer's offset mapping.
+
+Every chunk is an exact span ``page_text[char_start:char_end]`` of the
+cleaned page text, so its position can be cited precisely.
+"""
+import re
+from collections import namedtuple
+
+Chunk = namedtuple('Chunk', ['page_number', 'text', 'char_start', 'char_end', 'token_count'])
+
+SECTION_PROFILES = {
+    'generic': [],
+    'resume': [
+        'Education',
+        'Experience',
+        'Work Experience',
+        'Professional Experience',
+        'Skills',
+        'Technical Skills',
+        'Projects',
+        'Certifications',
+        'Awards',
+        'Achievements',
+    ],
+    'report': [
+        'Abstract',
+        'Summary',
+        'Executive Summary',
+        'Introduction',
+        'Background',
+        'Methods',
+        'Methodology',
+        'Results',
+        'Discussion',
+        'Conclusion',
+        'Conclusions',
+        'References',
+        'Appendix',
+    ],
+}
+
+_compiled_profiles = {}
+
+_LINE = re.compile(r'[^\n]+')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+# Lines longer than this are split into sentences before packing
+_LONG_LINE_CHARS = 300
+
+
+def register_section_profile(name, headers):
+    """Add or replace a named list of section-header patterns.
+
+    ``headers`` are regular expressions; plain words work as-is. A line is a
+    section header when it starts with one of them.
+    """
+    SECTION_PROFILES[name] = list(headers)
+    _compiled_profiles.pop(name, None)
+
+
+def section_pattern(profile):
+    """Return the single compiled header regex for a profile (None if empty)"""
+    if profile not in _compiled_profiles:
+        headers = SECTION_PROFILES.get(profile)
+        if headers is None:
+            raise ValueError(f"Unknown section profile {profile}")
+        if headers:
+            alternatives = '|'.join(f'(?:{header})' for header in headers)
+            _compiled_profiles[profile] = re.compile(rf'^[ \t]*(?:{alternatives})\b', re.IGNORECASE)
+        else:
+            _compiled_profiles[profile] = None
+    return _compiled_profiles[profile]
+
+
+def as_chunk(item):
+    """Accept a Chunk, a (page_number, text) pair or a bare string"""
+    if isinstance(item, Chunk):
+        return item
+    if isinstance(item, str):
+        return Chunk(1, item, None, None, None)
+    page_number, text = item
+    return Chunk(page_number, text, None, None, None)
+
+
+class WhitespaceTokenizer:
+    """Tokenizer stand-in that counts whitespace separated words.
+
+    Used when the embedding model's tokenizer is not available; it implements
+    only the part of the Hugging Face call interface the chunker relies on.
+    """
+
+    _WORD = re.compile(r'\S+')
+
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=False):
+        input_ids = []
+        offsets = []
+        for text in texts:
+            spans = [match.span() for match in self._WORD.finditer(text)]
+            input_ids.append(list(range(len(spans))))
+            offsets.append(spans)
+        encoding = {'input_ids': input_ids}
+        if return_offsets_mapping:
+            encoding['offset_mapping'] = offsets
+        return encoding
+
+
+class TokenChunker:
+    def __init__(self, tokenizer, max_tokens=254, overlap_tokens=32, section_profile='generic'):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.section_pattern = section_pattern(section_profile)
+
+    def _units(self, text):
+        """Yield (start, end, is_header) spans of the non-empty lines/sentences"""
+        for line in _LINE.finditer(text):
+            line_text = line.group()
+            stripped = line_text.strip()
+            if not stripped:
+                continue
+            start = line.start() + (len(line_text) - len(line_text.lstrip()))
+            end = line.start() + len(line_text.rstrip())
+            is_header = bool(self.section_pattern and self.section_pattern.match(line_text))
+
+            if end - start <= _LONG_LINE_CHARS:
+                yield start, end, is_header
+                continue
+
+            sentence_start = start
+            for boundary in _SENTENCE_END.finditer(text, start, end):
+                yield sentence_start, boundary.start(), is_header
+                is_header = False
+                sentence_start = boundary.end()
+            if sentence_start < end:
+                yield sentence_start, end, is_header
+
+    def chunk_page(self, page_number, text):
+        """Return the chunks of one cleaned page of text"""
+        units = list(self._units(text))
+        if not units:
+            return []
+
+        encoding = self.tokenizer(
+            [text[start:end] for start, end, _ in units],
+            add_special_tokens=False,
+            return_offsets_mapping=True
+        )
+        token_counts = [len(ids) for ids in encoding['input_ids']]
+
+        chunks = []
+        current = []  # (start, end, tokens)
+        current_tokens = 0
+
+        def emit():
+            chunk_start, chunk_end = current[0][0], current[-1][1]
+            chunks.append(Chunk(page_number, text[chunk_start:chunk_end], chunk_start, chunk_end, current_tokens))
+
+        for (start, end, is_header), tokens, offsets in zip(units, token_counts, encoding['offset_mapping']):
+            if tokens > self.max_tokens:
+                if current:
+                    emit()
+                current, current_tokens = [], 0
+                chunks.extend(self._split_long_unit(page_number, text, start, offsets))
+                continue
+
+            if current and (is_header or current_tokens + tokens > self.max_tokens):
+                emit()
+                carried = []
+                carried_tokens = 0
+                if not is_header:
+                    for unit in reversed(current):
+                        carried_after = carried_tokens + unit[2]
+                        if carried_after > self.overlap_tokens or carried_after + tokens > self.max_tokens:
+                            break
+                        carried.insert(0, unit)
+                        carried_tokens += unit[2]
+                current, current_tokens = carried, carried_tokens
+
+            current.append((start, end, tokens))
+            current_tokens += tokens
+
+        if current:
+            emit()
+        return chunks
+
+    def _split_long_unit(self, page_number, text, unit_start, offsets):
+        """Cut a unit longer than max_tokens into overlapping token windows"""
+        step = self.max_tokens - self.overlap_tokens
+        pieces = []
+        for first in range(0, len(offsets), step):
+            window = offsets[first:first + self.max_tokens]
+            start = unit_start + window[0][0]
+            end = unit_start + window[-1][1]
+            pieces.append(Chunk(page_number, text[start:end], start, end, len(window)))
+            if first + self.max_tokens >= len(offsets):
+                break
+        return pieces
+
+    def chunk_pages(self, pages):
+        """Chunk a stream of (page_number, cleaned_text), yielding Chunks"""
+        for page_number, text in pages:
+            yield from self.chunk_page(page_number, text)
@@ -0,0 +1,158 @@
+"""Context assembly: turn retrieved chunks into the context of the prompt.
+
+Retrieval over-fetches candidates, then ``assemble_context``:
+
+1. drops near-duplicates - a candidate whose embedding has cosine
+   similarity of at least ``dedup_threshold`` with a better-ranked kept
+   candidate (overlapping chunks, repeated boilerplate);
+2. optionally re-ranks with maximal marginal relevance, trading relevance to
+   the question against similarity to what is already selected;
+3. fills a token budget in relevance order, truncating the chunk that
+   crosses it;
+4. orders what is left by page and position, so the LLM reads the excerpts
+   in document order.
+
+Token counts use tiktoken for the configured LLM model when it is installed
+and the embedding model's tokenizer otherwise.
+"""
+import threading
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+
+from .embeddings import get_tokenizer
+
+Candidate = namedtuple('Candidate', ['chunk_id', 'text', 'page_number', 'chunk_index', 'distance', 'embedding'])
+
+ContextAssembly = namedtuple('ContextAssembly', ['chunks', 'text', 'context_tokens', 'dropped_duplicates', 'truncated'])
+
+SEPARATOR = "\n\n"
+# A chunk cut to fewer tokens than this is left out instead
+MIN_TRUNCATED_TOKENS = 32
+
+_prompt_tokenizer = None
+_prompt_tokenizer_lock = threading.Lock()
+
+
+class PromptTokenizer:
+    """Counts and truncates text in tokens of the LLM (or an approximation)"""
+
+    def __init__(self, encoding=None, tokenizer=None):
+        self.encoding = encoding
+        self.tokenizer = tokenizer
+
+    @property
+    def name(self):
+        if self.encoding is not None:
+            return f"tiktoken:{self.encoding.name}"
+        return type(self.tokenizer).__name__
+
+    def count(self, texts):
+        if not texts:
+            return []
+        if self.encoding is not None:
+            return [len(ids) for ids in self.encoding.encode_batch(list(texts), disallowed_special=())]
+        return [len(ids) for ids in self.tokenizer(list(texts), add_special_tokens=False)['input_ids']]
+
+    def truncate(self, text, max_tokens):
+        if self.encoding is not None:
+            ids = self.encoding.encode(text, disallowed_special=())
+            return self.encoding.decode(ids[:max_tokens]) if len(ids) > max_tokens else text
+        offsets = self.tokenizer([text], add_special_tokens=False, return_offsets_mapping=True)['offset_mapping'][0]
+        if len(offsets) <= max_tokens:
+            return text
+        return text[:offsets[max_tokens - 1][1]]
+
+
+def get_prompt_tokenizer():
+    global _prompt_tokenizer
+    if _prompt_tokenizer is None:
+        with _prompt_tokenizer_lock:
+            if _prompt_tokenizer is None:
+                try:
+                    import tiktoken
+                    try:
+                        encoding = tiktoken.encoding_for_model(settings.LLM_MODEL)
+                    except KeyError:
+                        encoding = tiktoken.get_encoding('cl100k_base')
+                    _prompt_tokenizer = PromptTokenizer(encoding=encoding)
+                except ImportError:
+                    _prompt_tokenizer = PromptTokenizer(tokenizer=get_tokenizer())
+    return _prompt_tokenizer
+
+
+def _unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def drop_near_duplicates(embeddings, threshold):
+    """Indexes (in rank order) that survive greedy near-duplicate removal"""
+    similarity = embeddings @ embeddings.T
+    kept = []
+    for i in range(len(embeddings)):
+        if not kept or similarity[i, kept].max() < threshold:
+            kept.append(i)
+    return kept
+
+
+def mmr(query, embeddings, k, lambda_mult):
+    """Indexes of ``k`` rows chosen by maximal marginal relevance"""
+    relevance = embeddings @ query
+    similarity = embeddings @ embeddings.T
+    selected = []
+    max_similarity = np.full(len(embeddings), -np.inf, dtype=np.float32)
+    available = np.ones(len(embeddings), dtype=bool)
+    for _ in range(min(k, len(embeddings))):
+        penalty = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        scores = lambda_mult * relevance - (1 - lambda_mult) * penalty
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[:, best])
+    return selected
+
+
+def assemble_context(question_embedding, candidates, num_chunks, tokenizer,
+                     max_tokens=1500, dedup_threshold=0.95, mmr_lambda=None):
+    """Select, trim and order retrieved candidates (best first) for the prompt"""
+    ranked = list(candidates)
+    dropped = 0
+
+    if ranked and all(candidate.embedding is not None for candidate in ranked):
+        matrix = _unit_rows(np.asarray([candidate.embedding for candidate in ranked], dtype=np.float32))
+        order = list(range(len(ranked)))
+        if dedup_threshold is not None and dedup_threshold < 1:
+            order = drop_near_duplicates(matrix, dedup_threshold)
+            dropped = len(ranked) - len(order)
+        if mmr_lambda is not None:
+            query = _unit_rows(np.asarray(question_embedding, dtype=np.float32)[None, :])[0]
+            order = [order[i] for i in mmr(query, matrix[order], num_chunks, mmr_lambda)]
+        ranked = [ranked[i] for i in order]
+
+    selected = ranked[:num_chunks]
+    chosen = []
+    used = 0
+    truncated = 0
+    for candidate, tokens in zip(selected, tokenizer.count([candidate.text for candidate in selected])):
+        if used + tokens <= max_tokens:
+            chosen.append(candidate)
+            used += tokens
+            continue
+        remaining = max_tokens - used
+        if remaining >= MIN_TRUNCATED_TOKENS:
+            chosen.append(candidate._replace(text=tokenizer.truncate(candidate.text, remaining)))
+            used += remaining
+            truncated += 1
+        break
+
+    chosen.sort(key=lambda candidate: (candidate.page_number, candidate.chunk_index))
+    return ContextAssembly(
+        chunks=chosen,
+        text=SEPARATOR.join(candidate.text for candidate in chosen),
+        context_tokens=used,
+        dropped_duplicates=dropped,
+        truncated=truncated
+    )
@@ -0,0 +1,177 @@
+"""Content-hash deduplication for uploads and chunk embeddings.
+
+Files are identified by the SHA-256 of their bytes; an upload whose hash
+matches a document that is already processed (or being processed) is linked
+to that document instead of being ingested again.
+
+Chunk embeddings are stored once per (embedding space, normalized text hash)
+in ``ChunkEmbedding``, so chunks repeated across documents - boilerplate,
+headers, near-identical revisions - are only encoded the first time.
+``manage.py gc_vectors`` drops stored embeddings of other spaces and of
+texts no chunk contains any more (``stale_chunk_embeddings``).
+"""
+import hashlib
+import threading
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .embeddings import embedding_model_name
+from .models import ChunkEmbedding, DocumentChunk
+
+
+class DedupStats:
+    """Per-process counters for file and chunk level deduplication"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.uploads = 0
+        self.uploads_deduplicated = 0
+        self.chunks = 0
+        self.chunks_reused = 0
+
+    def record_upload(self, deduplicated):
+        with self._lock:
+            self.uploads += 1
+            self.uploads_deduplicated += int(deduplicated)
+
+    def record_chunks(self, total, reused):
+        with self._lock:
+            self.chunks += total
+            self.chunks_reused += reused
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'uploads': self.uploads,
+                'uploads_deduplicated': self.uploads_deduplicated,
+                'upload_hit_rate': round(self.uploads_deduplicated / self.uploads, 3) if self.uploads else None,
+                'chunks': self.chunks,
+                'chunks_reused': self.chunks_reused,
+                'chunk_hit_rate': round(self.chunks_reused / self.chunks, 3) if self.chunks else None,
+            }
+
+
+stats = DedupStats()
+
+
+def hash_uploaded_file(uploaded_file):
+    """SHA-256 of an uploaded file, read in chunks so memory stays flat"""
+    sha = hashlib.sha256()
+    for block in uploaded_file.chunks():
+        sha.update(block)
+    uploaded_file.seek(0)
+    return sha.hexdigest()
+
+
+def hash_file(path):
+    """SHA-256 of a file on disk, read in blocks"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def normalize_chunk_text(text):
+    return ' '.join(text.split())
+
+
+def chunk_text_hash(text):
+    return hashlib.sha256(normalize_chunk_text(text).encode('utf-8')).hexdigest()
+
+
+def embedding_space(normalize):
+    """Identifies which model and post-processing produced a stored vector"""
+    return f"{embedding_model_name()}{':normalized' if normalize else ''}"
+
+
+def embed_with_store(texts, encode, normalize, reuse=True):
+    """Return (embeddings, reused_count) for ``texts``.
+
+    Vectors already in the chunk embedding store are loaded in one query; only
+    the distinct texts that are missing are passed to ``encode`` and the new
+    vectors are added to the store. Without ``reuse`` every distinct text is
+    encoded and its stored vector overwritten.
+    """
+    space = embedding_space(normalize)
+    hashes = [chunk_text_hash(text) for text in texts]
+
+    stored = {}
+    if reuse:
+        stored = {
+            row.text_hash: np.frombuffer(row.vector, dtype=np.float32)
+            for row in ChunkEmbedding.objects.filter(model_name=space, text_hash__in=set(hashes))
+        }
+
+    missing = {}
+    for text, text_hash in zip(texts, hashes):
+        if text_hash not in stored and text_hash not in missing:
+            missing[text_hash] = text
+
+    if missing:
+        encoded = np.asarray(encode(list(missing.values())), dtype=np.float32)
+        new_rows = []
+        for text_hash, vector in zip(missing.keys(), encoded):
+            stored[text_hash] = vector
+            new_rows.append(ChunkEmbedding(
+                model_name=space,
+                text_hash=text_hash,
+                dim=vector.shape[0],
+                vector=vector.tobytes()
+            ))
+        if reuse:
+            ChunkEmbedding.objects.bulk_create(new_rows, ignore_conflicts=True)
+        else:
+            overwrite_chunk_embeddings(space, new_rows)
+
+    reused = len(texts) - len(missing)
+    stats.record_chunks(len(texts), reused)
+    return np.vstack([stored[text_hash] for text_hash in hashes]), reused
+
+
+def overwrite_chunk_embeddings(space, rows):
+    """Store ``rows`` of ``space``, replacing the stored vectors of their
+    texts.
+
+    Where the database cannot name the conflicting columns of an upsert
+    (MySQL) the old rows are deleted and the new ones inserted in one
+    transaction instead.
+    """
+    if connection.features.supports_update_conflicts_with_target:
+        ChunkEmbedding.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['model_name', 'text_hash'],
+            update_fields=['dim', 'vector']
+        )
+        return
+    with transaction.atomic():
+        ChunkEmbedding.objects.filter(model_name=space, text_hash__in=[row.text_hash for row in rows]).delete()
+        # A concurrent ingest may still insert the same text in between
+        ChunkEmbedding.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def stale_chunk_embeddings(min_age_seconds=24 * 3600):
+    """``(other_spaces, unreferenced)`` querysets of stored chunk embeddings.
+
+    ``other_spaces`` were produced by another model or normalization than
+    the current one; ``unreferenced`` are of the current space but no chunk
+    has their text. Embeddings younger than ``min_age_seconds`` are never
+    unreferenced: an ingest stores them before it writes its chunk rows.
+    """
+    space = embedding_space(settings.RAG_NORMALIZE_EMBEDDINGS)
+    other_spaces = ChunkEmbedding.objects.exclude(model_name=space)
+    cutoff = timezone.now() - timedelta(seconds=min_age_seconds)
+    unreferenced = (
+        ChunkEmbedding.objects
+        .filter(model_name=space, created_at__lt=cutoff)
+        .exclude(text_hash__in=DocumentChunk.objects.exclude(text_hash='').values('text_hash'))
+    )
+    return other_spaces, unreferenced
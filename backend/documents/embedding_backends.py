@@ -0,0 +1,212 @@
+"""Embedding backends selected with ``RAG_EMBEDDING_BACKEND``.
+
+* ``sentence-transformers`` - the model in full-precision PyTorch (default);
+* ``onnx`` - the same transformer exported to ONNX and run with ONNX
+  Runtime, optionally with int8 dynamic quantization of the weights
+  (``RAG_ONNX_QUANTIZE``), which is usually 2-3x faster on CPU;
+* ``fake`` - the deterministic hashing embedder used by benchmarks.
+
+Every backend returns an object with the part of the ``SentenceTransformer``
+interface this app uses: ``encode``, ``tokenizer``, ``max_seq_length`` and
+``get_sentence_embedding_dimension``. ``RAG_EMBEDDING_THREADS`` caps the
+intra-op threads of either runtime (0 keeps the library default).
+"""
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('sentence-transformers', 'onnx', 'fake')
+# Tokenizers without a configured limit report a huge model_max_length
+TOKENIZER_LENGTH_UNSET = 100000
+
+
+def hub_name(model_name):
+    """Hugging Face repository of a sentence-transformers model name"""
+    return model_name if '/' in model_name else f"sentence-transformers/{model_name}"
+
+
+def load_sentence_transformer(model_name, threads=0):
+    from sentence_transformers import SentenceTransformer
+
+    if threads:
+        import torch
+
+        torch.set_num_threads(threads)
+    return SentenceTransformer(model_name)
+
+
+def export_onnx(model_name, directory, quantize=False):
+    """Export ``model_name`` to ``directory`` unless already there.
+
+    Writes ``model.onnx`` (and ``model.int8.onnx`` when ``quantize``) next
+    to the tokenizer files and ``pipeline.json``, which records whether the
+    sentence-transformers pipeline ends in a Normalize layer and its
+    ``max_seq_length``, and returns the path of the model to load.
+    Exporting needs torch and transformers; loading the result afterwards
+    only needs onnxruntime and transformers' tokenizer.
+    """
+    path = os.path.join(directory, 'model.onnx')
+    if not os.path.exists(path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        os.makedirs(directory, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(hub_name(model_name))
+        model = AutoModel.from_pretrained(hub_name(model_name)).eval()
+        sample = tokenizer(['export'], return_tensors='pt')
+        names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+        axes = {0: 'batch', 1: 'sequence'}
+
+        tmp_path = path + '.tmp'
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in names),
+                tmp_path,
+                input_names=names,
+                output_names=['last_hidden_state'],
+                dynamic_axes={name: axes for name in names + ['last_hidden_state']},
+                opset_version=14
+            )
+        tokenizer.save_pretrained(directory)
+        with open(os.path.join(directory, 'pipeline.json'), 'w', encoding='utf-8') as file:
+            json.dump(_pipeline_config(model_name), file)
+        os.replace(tmp_path, path)
+        logger.info("Exported %s to %s", model_name, path)
+
+    if not quantize:
+        return path
+
+    quantized_path = os.path.join(directory, 'model.int8.onnx')
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        tmp_path = quantized_path + '.tmp'
+        quantize_dynamic(path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, quantized_path)
+        logger.info("Quantized %s to int8 at %s", model_name, quantized_path)
+    return quantized_path
+
+
+def _pipeline_config(model_name):
+    """What ``pipeline.json`` records of a sentence-transformers model"""
+    config = {'normalize': False, 'max_seq_length': None}
+    try:
+        from huggingface_hub import hf_hub_download
+
+        with open(hf_hub_download(hub_name(model_name), 'modules.json'), encoding='utf-8') as file:
+            modules = json.load(file)
+        config['normalize'] = any(module.get('type', '').endswith('Normalize') for module in modules)
+        with open(hf_hub_download(hub_name(model_name), 'sentence_bert_config.json'), encoding='utf-8') as file:
+            config['max_seq_length'] = json.load(file).get('max_seq_length')
+    except Exception as e:
+        logger.warning("Could not read the pipeline of %s: %s", model_name, e)
+    return config
+
+
+def tokenizer_max_length(tokenizer):
+    """The tokenizer's ``model_max_length``, or 512 where it has none
+    (transformers then reports a huge placeholder)"""
+    length = getattr(tokenizer, 'model_max_length', None)
+    if isinstance(length, int) and 0 < length < TOKENIZER_LENGTH_UNSET:
+        return length
+    return 512
+
+
+class OnnxEmbeddingModel:
+    """Sentence embeddings from an exported transformer on ONNX Runtime.
+
+    Token embeddings are mean-pooled over the attention mask, which is the
+    pooling of the MiniLM/MPNet sentence-transformers models. Texts are
+    truncated at ``max_seq_length`` tokens, by default the model's own
+    limit from ``pipeline.json`` or else the tokenizer's.
+    """
+
+    def __init__(self, model_name, directory, quantize=False, threads=0, max_seq_length=None):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        path = export_onnx(model_name, directory, quantize=quantize)
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        self.quantized = quantize
+        try:
+            with open(os.path.join(directory, 'pipeline.json'), encoding='utf-8') as file:
+                pipeline = json.load(file)
+        except FileNotFoundError:
+            pipeline = {}
+        self.normalize = pipeline.get('normalize', False)
+        self.max_seq_length = max_seq_length or pipeline.get('max_seq_length') or tokenizer_max_length(self.tokenizer)
+        self._dim = self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self):
+        if not isinstance(self._dim, int):
+            # The exported graph leaves the hidden size symbolic
+            self._dim = self.encode(['dimension']).shape[1]
+        return self._dim
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, convert_to_numpy=True,
+               show_progress_bar=False):
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        output = None
+        # Batch texts of similar length together so little time goes to padding
+        order = np.argsort([-len(text) for text in sentences], kind='stable')
+        for start in range(0, len(sentences), batch_size):
+            rows = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [sentences[row] for row in rows],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+            if 'token_type_ids' in self.input_names and 'token_type_ids' not in feeds:
+                feeds['token_type_ids'] = np.zeros_like(feeds['input_ids'])
+            hidden = self.session.run(None, feeds)[0]
+
+            mask = encoded['attention_mask'][:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if output is None:
+                output = np.empty((len(sentences), pooled.shape[1]), dtype=np.float32)
+            output[rows] = pooled
+
+        if output is None:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        if normalize_embeddings or self.normalize:
+            output /= np.maximum(np.linalg.norm(output, axis=1, keepdims=True), 1e-12)
+        return output
+
+
+def load_embedding_model(backend, model_name, threads=0, onnx_dir=None, quantize=False):
+    """Build the embedding model of ``backend`` (see ``BACKENDS``)"""
+    if backend == 'fake':
+        from .fake_embedder import FakeEmbeddingModel
+
+        return FakeEmbeddingModel()
+    if backend == 'sentence-transformers':
+        return load_sentence_transformer(model_name, threads=threads)
+    if backend == 'onnx':
+        directory = os.path.join(onnx_dir, model_name.replace('/', '__'))
+        return OnnxEmbeddingModel(model_name, directory, quantize=quantize, threads=threads)
+    raise ValueError(f"Unknown embedding backend {backend}")
+
+
+def embedding_space_suffix(backend, quantize):
+    """Part of the embedding-space name that tells backends apart.
+
+    Full-precision ONNX reproduces the PyTorch vectors to float rounding, so
+    it shares their space; int8-quantized weights move vectors measurably.
+    """
+    return ':int8' if backend == 'onnx' and quantize else ''
@@ -0,0 +1,293 @@
+"""Local embedding server with dynamic micro-batching.
+
+One server process per host holds the only copy of the embedding model.
+Web and ingestion workers send encode requests over a Unix socket or a
+localhost TCP port; requests that arrive close together are coalesced into a
+single forward pass of up to ``max_batch_size`` texts, waiting at most
+``max_wait_ms`` for a batch to fill.
+
+Wire format: every message is a 4-byte big-endian length followed by the
+payload. A request is one JSON frame, ``{"op": "encode", "texts": [...],
+"normalize": false}`` or ``{"op": "stats"}``. An encode reply is a JSON
+header frame ``{"ok": true, "shape": [n, dim]}`` followed by one frame of raw
+little-endian float32 data; errors and stats are a single JSON frame.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('>I')
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+
+
+class EmbeddingServerUnavailable(Exception):
+    """Raised by the client when the server cannot be reached or fails"""
+
+
+def parse_address(address):
+    """Split 'unix:/path.sock' or 'tcp:host:port' into (family, target)"""
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    if address.startswith('tcp:'):
+        address = address[len('tcp:'):]
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LatencyStats:
+    """Rolling request latency and batch size statistics"""
+
+    def __init__(self, window=10000):
+        self.latencies_ms = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.errors = 0
+
+    def record_request(self, latency_ms, num_texts):
+        self.requests += 1
+        self.texts += num_texts
+        self.latencies_ms.append(latency_ms)
+
+    def record_batch(self, size):
+        self.batches += 1
+        self.batch_sizes.append(size)
+
+    def snapshot(self):
+        latencies = list(self.latencies_ms)
+        batch_sizes = list(self.batch_sizes)
+        return {
+            'requests': self.requests,
+            'texts': self.texts,
+            'batches': self.batches,
+            'errors': self.errors,
+            'p50_ms': _percentile(latencies, 50),
+            'p99_ms': _percentile(latencies, 99),
+            'mean_batch_size': (sum(batch_sizes) / len(batch_sizes)) if batch_sizes else None,
+        }
+
+
+class MicroBatcher:
+    """Coalesces concurrent encode requests into batched forward passes"""
+
+    def __init__(self, encode, max_batch_size=64, max_wait_ms=5.0):
+        self.encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.stats = LatencyStats()
+        # Requests can be queued before ``run`` starts; the queue binds to
+        # the running loop on first use
+        self._queue = asyncio.Queue()
+        # A single thread runs the model so batches never compete for cores
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embed')
+
+    async def submit(self, texts, normalize):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((texts, normalize, future, time.perf_counter()))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            pending = [await self._queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.max_wait
+
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            for normalize in (False, True):
+                group = [item for item in pending if item[1] == normalize]
+                if group:
+                    await self._encode_group(loop, group, normalize)
+
+    async def _encode_group(self, loop, group, normalize):
+        texts = [text for item in group for text in item[0]]
+        self.stats.record_batch(len(texts))
+        try:
+            embeddings = await loop.run_in_executor(
+                self._executor, self.encode, texts, self.max_batch_size, normalize
+            )
+        except Exception as e:
+            self.stats.errors += 1
+            for _, _, future, _ in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        now = time.perf_counter()
+        for item_texts, _, future, enqueued_at in group:
+            count = len(item_texts)
+            if not future.done():
+                future.set_result(embeddings[offset:offset + count])
+            self.stats.record_request((now - enqueued_at) * 1000.0, count)
+            offset += count
+
+
+async def _read_frame(reader):
+    header = await reader.readexactly(_HEADER.size)
+    (length,) = _HEADER.unpack(header)
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes exceeds limit")
+    return await reader.readexactly(length)
+
+
+def _write_frame(writer, payload):
+    writer.write(_HEADER.pack(len(payload)))
+    writer.write(payload)
+
+
+class EmbeddingServer:
+    def __init__(self, address, encode, max_batch_size=64, max_wait_ms=5.0):
+        self.address = address
+        self.batcher = MicroBatcher(encode, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = json.loads(await _read_frame(reader))
+                except asyncio.IncompleteReadError:
+                    break
+
+                op = request.get('op', 'encode')
+                if op == 'stats':
+                    _write_frame(writer, json.dumps({'ok': True, 'stats': self.batcher.stats.snapshot()}).encode())
+                elif op == 'encode':
+                    try:
+                        embeddings = await self.batcher.submit(request['texts'], bool(request.get('normalize')))
+                    except Exception as e:
+                        _write_frame(writer, json.dumps({'ok': False, 'error': str(e)}).encode())
+                    else:
+                        data = np.ascontiguousarray(embeddings, dtype='<f4')
+                        _write_frame(writer, json.dumps({'ok': True, 'shape': list(data.shape)}).encode())
+                        _write_frame(writer, data.tobytes())
+                else:
+                    _write_frame(writer, json.dumps({'ok': False, 'error': f"Unknown op {op}"}).encode())
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            logger.warning("Embedding client connection closed: %s", e)
+        finally:
+            writer.close()
+
+    async def serve_forever(self):
+        batch_task = asyncio.create_task(self.batcher.run())
+        try:
+            family, target = parse_address(self.address)
+            if family == 'unix':
+                if os.path.exists(target):
+                    os.unlink(target)
+                server = await asyncio.start_unix_server(self.handle_connection, path=target)
+            else:
+                server = await asyncio.start_server(self.handle_connection, host=target[0], port=target[1])
+
+            logger.info("Embedding server listening on %s", self.address)
+            async with server:
+                await server.serve_forever()
+        finally:
+            batch_task.cancel()
+
+
+class EmbeddingClient:
+    """Blocking client for the embedding server.
+
+    Each thread keeps its own persistent connection so concurrent callers in a
+    threaded worker do not serialize on one socket.
+    """
+
+    def __init__(self, address, timeout=30.0):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        family, target = parse_address(self.address)
+        if family == 'unix':
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(self.timeout)
+        sock.connect(target)
+        return sock
+
+    def _socket(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = self._connect()
+            self._local.sock = sock
+        return sock
+
+    def close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _recv_exactly(self, sock, length):
+        buffer = bytearray(length)
+        view = memoryview(buffer)
+        received = 0
+        while received < length:
+            count = sock.recv_into(view[received:])
+            if count == 0:
+                raise ConnectionError("Embedding server closed the connection")
+            received += count
+        return bytes(buffer)
+
+    def _recv_frame(self, sock):
+        (length,) = _HEADER.unpack(self._recv_exactly(sock, _HEADER.size))
+        return self._recv_exactly(sock, length)
+
+    def _call(self, request):
+        payload = json.dumps(request).encode()
+        try:
+            sock = self._socket()
+            sock.sendall(_HEADER.pack(len(payload)) + payload)
+            header = json.loads(self._recv_frame(sock))
+            body = self._recv_frame(sock) if header.get('ok') and 'shape' in header else None
+        except (OSError, ValueError) as e:
+            self.close()
+            raise EmbeddingServerUnavailable(str(e)) from e
+
+        if not header.get('ok'):
+            raise EmbeddingServerUnavailable(header.get('error', 'Embedding server error'))
+        return header, body
+
+    def encode(self, texts, normalize=False):
+        header, body = self._call({'op': 'encode', 'texts': list(texts), 'normalize': normalize})
+        return np.frombuffer(body, dtype='<f4').reshape(header['shape'])
+
+    def stats(self):
+        header, _ = self._call({'op': 'stats'})
+        return header['stats']
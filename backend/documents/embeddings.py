@@ -0,0 +1,163 @@
+"""Process-wide embedding model.
+
+The embedding model (of the backend selected by ``RAG_EMBEDDING_BACKEND``,
+see ``embedding_backends``) is loaded at most once per process and only
+when something actually needs to encode text. Under a preforking server the
+model can be loaded in the master (see ``gunicorn.conf.py``) so its weights
+are shared copy-on-write by every worker. When ``EMBEDDING_SERVER_ADDRESS``
+is set, encoding goes through the shared embedding server instead and the
+local model is only loaded as a fallback.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .embedding_backends import embedding_space_suffix, load_embedding_model
+
+logger = logging.getLogger(__name__)
+
+_model = None
+_model_lock = threading.Lock()
+_model_load_seconds = None
+
+
+def get_embedding_model():
+    """Return the shared embedding model, loading it on first use"""
+    global _model, _model_load_seconds
+
+    if _model is not None:
+        return _model
+
+    with _model_lock:
+        if _model is None:
+            started = time.perf_counter()
+            _model = load_embedding_model(
+                'fake' if settings.RAG_EMBEDDING_MODEL == 'fake' else settings.RAG_EMBEDDING_BACKEND,
+                settings.RAG_EMBEDDING_MODEL,
+                threads=settings.RAG_EMBEDDING_THREADS,
+                onnx_dir=settings.RAG_ONNX_MODEL_DIR,
+                quantize=settings.RAG_ONNX_QUANTIZE
+            )
+            _model_load_seconds = time.perf_counter() - started
+    return _model
+
+
+def reset_embedding_model():
+    """Drop the loaded model, tokenizer and embedding server client so the
+    next call sets them up from settings"""
+    global _model, _tokenizer, _model_load_seconds, _client, _server_down_until
+    with _model_lock:
+        _model = _tokenizer = _model_load_seconds = None
+        if _client is not None:
+            _client.close()
+        _client = None
+        _server_down_until = 0.0
+
+
+def embedding_model_name():
+    """The configured model, qualified when its backend changes the vectors"""
+    return settings.RAG_EMBEDDING_MODEL + embedding_space_suffix(
+        settings.RAG_EMBEDDING_BACKEND, settings.RAG_ONNX_QUANTIZE
+    )
+
+
+def embedding_model_loaded():
+    return _model is not None
+
+
+def embedding_model_load_seconds():
+    """Seconds spent loading the model in this process, None if not loaded here"""
+    return _model_load_seconds
+
+
+_client = None
+_server_down_until = 0.0
+
+
+def _embedding_client():
+    global _client
+
+    if _client is None:
+        from .embedding_server import EmbeddingClient
+
+        _client = EmbeddingClient(
+            settings.EMBEDDING_SERVER_ADDRESS,
+            timeout=settings.EMBEDDING_SERVER_TIMEOUT_SECONDS
+        )
+    return _client
+
+
+def encode_texts(texts, batch_size=None, normalize=None):
+    """Encode texts through the embedding server if configured, else in-process.
+
+    If the server cannot be reached it is skipped for
+    ``EMBEDDING_SERVER_RETRY_SECONDS`` and the local model is used instead, so
+    an outage degrades to the old behaviour rather than failing requests.
+    """
+    global _server_down_until
+
+    if batch_size is None:
+        batch_size = settings.RAG_EMBEDDING_BATCH_SIZE
+    if normalize is None:
+        normalize = settings.RAG_NORMALIZE_EMBEDDINGS
+
+    if settings.EMBEDDING_SERVER_ADDRESS and time.monotonic() >= _server_down_until:
+        from .embedding_server import EmbeddingServerUnavailable
+
+        try:
+            return _embedding_client().encode(texts, normalize=normalize)
+        except EmbeddingServerUnavailable as e:
+            _server_down_until = time.monotonic() + settings.EMBEDDING_SERVER_RETRY_SECONDS
+            logger.warning("Embedding server unavailable, encoding in-process: %s", e)
+
+    return get_embedding_model().encode(
+        texts,
+        batch_size=batch_size,
+        normalize_embeddings=normalize,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    )
+
+
+_tokenizer = None
+
+
+def get_tokenizer():
+    """Return the embedding model's tokenizer.
+
+    Uses the loaded model's tokenizer when there is one; otherwise only the
+    tokenizer is loaded, which is cheap compared with the model (this is the
+    case when encoding goes through the embedding server). Falls back to a
+    whitespace tokenizer if neither is available.
+    """
+    global _tokenizer
+
+    if _model is not None and getattr(_model, 'tokenizer', None) is not None:
+        return _model.tokenizer
+    if settings.RAG_EMBEDDING_MODEL == 'fake' or settings.RAG_EMBEDDING_BACKEND == 'fake':
+        return get_embedding_model().tokenizer
+
+    if _tokenizer is None:
+        with _model_lock:
+            if _tokenizer is None:
+                try:
+                    from transformers import AutoTokenizer
+
+                    name = settings.RAG_TOKENIZER_NAME or f"sentence-transformers/{settings.RAG_EMBEDDING_MODEL}"
+                    _tokenizer = AutoTokenizer.from_pretrained(name)
+                except Exception as e:
+                    from .chunking import WhitespaceTokenizer
+
+                    logger.warning("Could not load tokenizer, counting words instead: %s", e)
+                    _tokenizer = WhitespaceTokenizer()
+    return _tokenizer
+
+
+def max_sequence_tokens():
+    """Tokens the model reads per input, excluding [CLS]/[SEP]"""
+    limit = settings.RAG_CHUNK_MAX_TOKENS
+    if _model is not None and getattr(_model, 'max_seq_length', None):
+        limit = min(limit, _model.max_seq_length)
+    return limit - 2
@@ -0,0 +1,304 @@
+"""Page-at-a-time text extraction.
+
+``PageExtractor`` opens a file once and yields ``(page_number, text)`` per
+page, so callers can clean, chunk and embed incrementally and memory stays
+bounded by the size of a page rather than the whole document.
+
+For PDFs PyMuPDF is used first. The fallback to pdfplumber and then PyPDF2 is
+decided per page: a page PyMuPDF returns no text for is retried with the next
+library, which is opened lazily only the first time it is needed.
+
+Large PDFs can be extracted in parallel: the page range is split into slices
+that worker processes extract independently (each with its own PyMuPDF
+handle), and the results are yielded back in page order.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+PDF_BACKENDS = ('pymupdf', 'pdfplumber', 'pypdf2')
+# Bump whenever a change here alters the text extracted from a file, so the
+# extracted-text cache (documents/text_cache.py) stops serving stale pages
+EXTRACTOR_VERSION = 2
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+class PdfPageReader:
+    """Reads single pages of a PDF, falling back between libraries per page"""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._handles = {}
+        self._failed = set()
+        self.page_count = None
+
+        for backend in PDF_BACKENDS:
+            if self._handle(backend) is not None:
+                self.page_count = self._page_count(backend)
+                break
+        if self.page_count is None:
+            raise ValueError(f"Could not open PDF {file_path}")
+
+    def _open(self, backend):
+        if backend == 'pymupdf':
+            import fitz
+            return fitz.open(self.file_path)
+        if backend == 'pdfplumber':
+            import pdfplumber
+            return pdfplumber.open(self.file_path)
+        import PyPDF2
+        stream = open(self.file_path, 'rb')
+        try:
+            return (stream, PyPDF2.PdfReader(stream))
+        except Exception:
+            stream.close()
+            raise
+
+    def _handle(self, backend):
+        if backend in self._failed:
+            return None
+        if backend not in self._handles:
+            try:
+                self._handles[backend] = self._open(backend)
+            except ImportError:
+                logger.warning("%s not installed, skipping it for PDF extraction", backend)
+                self._failed.add(backend)
+                return None
+            except Exception as e:
+                logger.warning("%s could not open %s: %s", backend, self.file_path, e)
+                self._failed.add(backend)
+                return None
+        return self._handles[backend]
+
+    def _page_count(self, backend):
+        handle = self._handles[backend]
+        if backend == 'pymupdf':
+            return handle.page_count
+        if backend == 'pdfplumber':
+            return len(handle.pages)
+        return len(handle[1].pages)
+
+    def _page_text(self, backend, index):
+        handle = self._handle(backend)
+        if handle is None:
+            return ''
+        if backend == 'pymupdf':
+            return handle.load_page(index).get_text()
+        if backend == 'pdfplumber':
+            page = handle.pages[index]
+            try:
+                return page.extract_text() or ''
+            finally:
+                # pdfplumber caches parsed layout objects on the page
+                page.flush_cache()
+        return handle[1].pages[index].extract_text() or ''
+
+    def page_text(self, index):
+        for backend in PDF_BACKENDS:
+            try:
+                text = self._page_text(backend, index)
+            except Exception as e:
+                logger.warning("%s failed on page %s of %s: %s", backend, index + 1, self.file_path, e)
+                continue
+            if text.strip():
+                return text
+        return ''
+
+    def close(self):
+        for backend, handle in self._handles.items():
+            try:
+                if backend == 'pypdf2':
+                    handle[0].close()
+                else:
+                    handle.close()
+            except Exception:
+                pass
+        self._handles.clear()
+
+
+def extract_page_range(file_path, start, stop):
+    """Extract pages ``start``..``stop - 1`` (0-based) in a worker process"""
+    reader = PdfPageReader(file_path)
+    try:
+        return [(index + 1, reader.page_text(index)) for index in range(start, stop)]
+    finally:
+        reader.close()
+
+
+def setup_django_worker(initializer, *args):
+    """Pool initializer for workers that use Django models.
+
+    Tasks that live in a module importing models can only be unpickled once
+    Django is set up, so this runs ``django.setup()`` and then the real
+    ``initializer`` (a dotted path, imported afterwards).
+    """
+    import django
+    from django.utils.module_loading import import_string
+
+    django.setup()
+    import_string(initializer)(*args)
+
+
+def get_extraction_pool(workers, start_method='forkserver'):
+    """Process pool shared by all extractions in this process.
+
+    Workers are started with ``forkserver`` by default: forking a web or
+    ingestion worker that already runs threads (and a loaded model) is not
+    safe, while the fork server is a small clean process.
+    """
+    global _pool, _pool_key
+
+    key = (os.getpid(), workers, start_method)
+    with _pool_lock:
+        if _pool is None or _pool_key != key:
+            context = multiprocessing.get_context(start_method)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool_key = key
+        return _pool
+
+
+class PageExtractor:
+    """Context manager yielding the raw text of a document page by page.
+
+    ``page_count`` is known up front for PDFs and filled in once iteration
+    finishes for other formats. ``pages_done`` and ``chars_extracted`` are
+    updated as pages are produced.
+    """
+
+    def __init__(self, file_path, file_type, text_page_chars=20000,
+                 parallel_workers=1, parallel_min_pages=50, pages_per_task=16,
+                 start_method='forkserver'):
+        self.file_path = file_path
+        self.file_type = file_type.lower()
+        self.text_page_chars = text_page_chars
+        self.parallel_workers = parallel_workers
+        self.parallel_min_pages = parallel_min_pages
+        self.pages_per_task = pages_per_task
+        self.start_method = start_method
+        self.page_count = None
+        self.pages_done = 0
+        self.chars_extracted = 0
+        self._pdf = None
+
+    def __enter__(self):
+        if self.file_type == 'pdf':
+            self._pdf = PdfPageReader(self.file_path)
+            self.page_count = self._pdf.page_count
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+
+    def pages(self):
+        if self.file_type == 'pdf':
+            source = self._pdf_pages()
+        elif self.file_type == 'txt':
+            source = self._text_pages()
+        elif self.file_type in ('docx', 'doc'):
+            source = self._docx_pages()
+        else:
+            raise ValueError(f"Unsupported file type {self.file_type}")
+
+        for page_number, text in source:
+            self.pages_done = page_number
+            self.chars_extracted += len(text.strip())
+            yield page_number, text
+
+        if self.page_count is None:
+            self.page_count = max(self.pages_done, 1)
+
+    def _pdf_pages(self):
+        page_count = self._pdf.page_count
+        if self.parallel_workers > 1 and page_count >= self.parallel_min_pages:
+            yield from self._pdf_pages_parallel(page_count)
+            return
+        for index in range(page_count):
+            yield index + 1, self._pdf.page_text(index)
+
+    def _pdf_pages_parallel(self, page_count):
+        """Extract page slices in worker processes, yielding in page order.
+
+        Only a bounded window of slices is in flight at once, so results are
+        not buffered for the whole document when the consumer (embedding) is
+        slower than extraction.
+        """
+        pool = get_extraction_pool(self.parallel_workers, self.start_method)
+        ranges = iter(
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        )
+        in_flight = deque()
+
+        def submit_next():
+            page_range = next(ranges, None)
+            if page_range is not None:
+                in_flight.append(pool.submit(extract_page_range, self.file_path, *page_range))
+
+        for _ in range(self.parallel_workers * 2):
+            submit_next()
+
+        try:
+            while in_flight:
+                pages = in_flight.popleft().result()
+                submit_next()
+                yield from pages
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def _text_pages(self):
+        """Plain text has no pages; split at form feeds and, for very long
+        stretches, at the first blank line after ``text_page_chars``. Text
+        without blank lines (logs, CSV) is split at the line that would take
+        a page past twice ``text_page_chars``, and a single longer line at
+        that length, so no page grows without bound."""
+        hard_limit = 2 * self.text_page_chars
+        page_number = 1
+        lines = []
+        size = 0
+        with open(self.file_path, 'r', encoding='utf-8') as file:
+            for line in iter(lambda: file.readline(hard_limit), ''):
+                parts = line.split('\f')
+                for index, part in enumerate(parts):
+                    if index > 0 or (size and size + len(part) > hard_limit):
+                        yield page_number, ''.join(lines)
+                        page_number += 1
+                        lines, size = [], 0
+                    lines.append(part)
+                    size += len(part)
+                if size >= self.text_page_chars and not line.strip():
+                    yield page_number, ''.join(lines)
+                    page_number += 1
+                    lines, size = [], 0
+        if lines or page_number == 1:
+            yield page_number, ''.join(lines)
+
+    def _docx_pages(self):
+        from docx import Document as DocxDocument
+
+        page_number = 1
+        paragraphs = []
+        for paragraph in DocxDocument(self.file_path).paragraphs:
+            text = paragraph.text.strip()
+            if text:
+                paragraphs.append(text)
+            if paragraph._p.xpath('.//w:br[@w:type="page"]'):
+                yield page_number, '\n\n'.join(paragraphs)
+                page_number += 1
+                paragraphs = []
+        if paragraphs or page_number == 1:
+            yield page_number, '\n\n'.join(paragraphs)
+
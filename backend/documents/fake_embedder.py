@@ -0,0 +1,48 @@
+"""A deterministic stand-in for the sentence-transformers model.
+
+Selected with ``RAG_EMBEDDING_MODEL=fake`` so benchmarks run offline and
+reproducibly. Every word is hashed to a fixed signed dimension and a text's
+vector is the sum over its words, so texts sharing words are close and
+retrieval still behaves sensibly. It implements the part of the
+``SentenceTransformer`` interface this app uses.
+"""
+import hashlib
+import re
+
+import numpy as np
+
+from .chunking import WhitespaceTokenizer
+
+_WORD = re.compile(r'\w+')
+
+
+class FakeEmbeddingModel:
+    max_seq_length = 256
+
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.tokenizer = WhitespaceTokenizer()
+        self._slots = {}
+
+    def _slot(self, word):
+        slot = self._slots.get(word)
+        if slot is None:
+            digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'little')
+            slot = self._slots[word] = (value % self.dim, 1.0 if value >> 63 else -1.0)
+        return slot
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, convert_to_numpy=True,
+               show_progress_bar=False):
+        matrix = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        for row, text in enumerate(sentences):
+            for word in _WORD.findall(text.lower()):
+                index, sign = self._slot(word)
+                matrix[row, index] += sign
+        if normalize_embeddings:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.maximum(norms, 1e-12)
+        return matrix
@@ -0,0 +1,406 @@
+"""DB-backed ingestion job queue.
+
+Uploads enqueue an ``IngestionJob`` row and return immediately. Jobs are
+picked up either by a worker thread pool running inside the web process
+(``INGEST_WORKER_MODE = 'thread'``) or by ``manage.py ingest_worker``
+(``INGEST_WORKER_MODE = 'external'``). No external broker is needed; the
+jobs table is the queue and ``Document.processing_status`` remains the
+source of truth for whether a document can be queried.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Document, IngestionJob
+
+logger = logging.getLogger(__name__)
+
+# Share of the overall progress bar assigned to the stages before embedding.
+# Pages are chunked as they are extracted, so chunking has no stage of its own.
+STAGE_PERCENT = {
+    'queued': 0.0,
+    'extracting': 5.0,
+    'embedding': 15.0,
+    'completed': 100.0,
+}
+
+# Job claims are serialized on this named lock (MySQL) or advisory lock key
+# (PostgreSQL) so INGEST_MAX_CONCURRENT_JOBS holds across workers
+CLAIM_LOCK_NAME = 'documents.ingest_claim'
+CLAIM_LOCK_KEY = 7301
+CLAIM_LOCK_TIMEOUT_SECONDS = 10
+
+_wakeup = threading.Event()
+_claim_lock = threading.Lock()
+_local_worker = None
+_local_worker_pid = None
+_local_worker_lock = threading.Lock()
+
+
+def enqueue_document(document):
+    """Queue a document for background ingestion and return the job"""
+    document.processing_status = 'pending'
+    document.save(update_fields=['processing_status', 'updated_at'])
+
+    job = IngestionJob.objects.create(
+        document=document,
+        max_attempts=settings.INGEST_MAX_ATTEMPTS
+    )
+    transaction.on_commit(_wakeup.set)
+    return job
+
+
+def latest_job(document):
+    """Return the most recent ingestion job for a document, if any"""
+    return document.jobs.order_by('-created_at', '-id').first()
+
+
+def job_progress(job):
+    """Return (percent, eta_seconds) for a job"""
+    if job.status == 'succeeded':
+        return 100.0, 0.0
+    if job.status != 'running':
+        return STAGE_PERCENT.get(job.stage, 0.0), None
+
+    percent = STAGE_PERCENT.get(job.stage, 0.0)
+    if job.stage == 'embedding' and job.chunks_total:
+        embedded = job.chunks_embedded / job.chunks_total
+        percent += (100.0 - STAGE_PERCENT['embedding']) * embedded
+
+    eta = None
+    if job.stage == 'embedding' and job.stage_started_at and job.chunks_embedded:
+        elapsed = (timezone.now() - job.stage_started_at).total_seconds()
+        rate = job.chunks_embedded / max(elapsed, 1e-6)
+        eta = (job.chunks_total - job.chunks_embedded) / rate
+
+    return round(percent, 1), (round(eta, 1) if eta is not None else None)
+
+
+def retry_delay(attempts):
+    """Exponential backoff with a little jitter for the given attempt count"""
+    delay = settings.INGEST_RETRY_BACKOFF_SECONDS * (2 ** max(attempts - 1, 0))
+    delay = min(delay, settings.INGEST_RETRY_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(1.0, 1.25)
+
+
+@contextmanager
+def claim_lock():
+    """Hold the lock that serializes job claims; yields False on timeout.
+
+    MySQL and PostgreSQL take a lock on the connection, held until after
+    the claiming transaction has committed. Other databases (SQLite) only
+    serve a single host, where a process-wide lock is enough.
+    """
+    vendor = connection.vendor
+    if vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, %s)", [CLAIM_LOCK_NAME, CLAIM_LOCK_TIMEOUT_SECONDS])
+            acquired = cursor.fetchone()[0] == 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT RELEASE_LOCK(%s)", [CLAIM_LOCK_NAME])
+    elif vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", [CLAIM_LOCK_KEY])
+        try:
+            yield True
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [CLAIM_LOCK_KEY])
+    else:
+        acquired = _claim_lock.acquire(timeout=CLAIM_LOCK_TIMEOUT_SECONDS)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                _claim_lock.release()
+
+
+class JobProgressReporter:
+    """Progress callback that writes stage and chunk counts to the job row.
+
+    Writes are throttled so a large document does not turn into one UPDATE
+    per embedding batch; stage changes are always written.
+    """
+
+    def __init__(self, job, min_interval=None):
+        self.job = job
+        self.min_interval = settings.INGEST_PROGRESS_INTERVAL_SECONDS if min_interval is None else min_interval
+        self._last_write = 0.0
+
+    def __call__(self, stage, done, total):
+        now = time.monotonic()
+        stage_changed = stage != self.job.stage
+        if not stage_changed and now - self._last_write < self.min_interval and done < total:
+            return
+
+        fields = {
+            'stage': stage,
+            'chunks_embedded': done,
+            'chunks_total': total,
+            'heartbeat_at': timezone.now(),
+        }
+        if stage_changed:
+            fields['stage_started_at'] = fields['heartbeat_at']
+
+        IngestionJob.objects.filter(pk=self.job.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(self.job, name, value)
+        self._last_write = now
+
+
+class JobHeartbeat:
+    """Refreshes a running job's ``heartbeat_at`` from a background thread.
+
+    Progress writes only happen between embedding batches; a long
+    extraction (a huge page, OCR, a slow parser) reports nothing for a
+    while, and the job must not look stale to ``requeue_stale_jobs`` then.
+    """
+
+    def __init__(self, job, interval=None):
+        self.job = job
+        self.interval = settings.INGEST_HEARTBEAT_SECONDS if interval is None else interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name=f'ingest-heartbeat-{self.job.pk}', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    IngestionJob.objects.filter(
+                        pk=self.job.pk,
+                        status='running',
+                        locked_by=self.job.locked_by
+                    ).update(heartbeat_at=timezone.now())
+                except Exception as e:
+                    logger.warning("Heartbeat of ingestion job %s failed: %s", self.job.pk, e)
+        finally:
+            # This thread's own connection
+            connection.close()
+
+
+class IngestionWorker:
+    """Claims queued jobs from the database and runs them on a thread pool"""
+
+    def __init__(self, engine, concurrency=None, poll_interval=None, worker_id=None):
+        self.engine = engine
+        self.concurrency = concurrency or settings.INGEST_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or settings.INGEST_POLL_INTERVAL_SECONDS
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._active = set()
+        self._active_lock = threading.Lock()
+
+    def claim_next_job(self):
+        """Atomically move the next runnable job to 'running'.
+
+        Claims are serialized with ``claim_lock`` so two workers cannot both
+        see a free slot and exceed INGEST_MAX_CONCURRENT_JOBS.
+        """
+        with claim_lock() as acquired:
+            if not acquired:
+                return None
+            with transaction.atomic():
+                return self._claim()
+
+    def _claim(self):
+        running = IngestionJob.objects.filter(status='running').count()
+        if running >= settings.INGEST_MAX_CONCURRENT_JOBS:
+            return None
+
+        job = (
+            IngestionJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='queued', run_after__lte=timezone.now())
+            .order_by('run_after', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+
+        now = timezone.now()
+        job.status = 'running'
+        job.stage = 'extracting'
+        job.attempts += 1
+        job.locked_by = self.worker_id
+        job.started_at = now
+        job.stage_started_at = now
+        job.heartbeat_at = now
+        job.chunks_embedded = 0
+        job.chunks_total = 0
+        job.save()
+        return job
+
+    def requeue_stale_jobs(self):
+        """Put jobs whose worker stopped heartbeating back on the queue.
+
+        A job that has used up its attempts is marked failed, and so is its
+        document, instead: a document that kills its worker would otherwise
+        be requeued forever. Returns the number of jobs requeued.
+        """
+        now = timezone.now()
+        cutoff = now - timedelta(seconds=settings.INGEST_STALE_JOB_SECONDS)
+        with transaction.atomic():
+            stale = IngestionJob.objects.select_for_update().filter(status='running', heartbeat_at__lt=cutoff)
+            exhausted = list(stale.filter(attempts__gte=F('max_attempts')).values_list('id', 'document_id'))
+            if exhausted:
+                IngestionJob.objects.filter(id__in=[job_id for job_id, _ in exhausted]).update(
+                    status='failed',
+                    stage='failed',
+                    locked_by='',
+                    finished_at=now,
+                    last_error='Worker stopped responding'
+                )
+                Document.objects.filter(id__in=[document_id for _, document_id in exhausted]).update(
+                    processing_status='failed',
+                    updated_at=now
+                )
+                for job_id, document_id in exhausted:
+                    logger.error(
+                        "Ingestion of document %s failed permanently: worker of job %s stopped responding",
+                        document_id, job_id
+                    )
+            return stale.update(status='queued', stage='queued', locked_by='', run_after=now)
+
+    def run_job(self, job):
+        """Run one claimed job, scheduling a retry if it fails"""
+        close_old_connections()
+        document = job.document
+        try:
+            with JobHeartbeat(job):
+                self.engine.process_document(document, progress=JobProgressReporter(job))
+        except Exception as e:
+            self._handle_failure(job, document, e)
+        else:
+            job.status = 'succeeded'
+            job.stage = 'completed'
+            job.last_error = ''
+            job.finished_at = timezone.now()
+            job.save()
+            logger.info("Ingested document %s in %s attempt(s)", document.id, job.attempts)
+        finally:
+            close_old_connections()
+
+    def _handle_failure(self, job, document, error):
+        job.last_error = str(error)
+        job.locked_by = ''
+
+        if job.attempts < job.max_attempts:
+            delay = retry_delay(job.attempts)
+            job.status = 'queued'
+            job.stage = 'queued'
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+            job.save()
+            document.processing_status = 'pending'
+            document.save(update_fields=['processing_status', 'updated_at'])
+            logger.warning(
+                "Ingestion of document %s failed (attempt %s/%s), retrying in %.1fs: %s",
+                document.id, job.attempts, job.max_attempts, delay, error
+            )
+        else:
+            job.status = 'failed'
+            job.stage = 'failed'
+            job.finished_at = timezone.now()
+            job.save()
+            logger.error("Ingestion of document %s failed permanently: %s", document.id, error)
+
+    def _run_and_release(self, job):
+        try:
+            self.run_job(job)
+        finally:
+            with self._active_lock:
+                self._active.discard(job.pk)
+            _wakeup.set()
+
+    def run_forever(self, stop_event=None, exit_when_idle=False):
+        """Poll for jobs until ``stop_event`` is set.
+
+        With ``exit_when_idle`` the loop returns once the queue is empty and
+        all running jobs have finished, which is handy for draining a backlog.
+        Queued retries that are not due yet are waited for.
+        """
+        stop_event = stop_event or threading.Event()
+        last_stale_check = 0.0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='ingest') as pool:
+            while not stop_event.is_set():
+                if time.monotonic() - last_stale_check > settings.INGEST_STALE_JOB_SECONDS / 2:
+                    self.requeue_stale_jobs()
+                    last_stale_check = time.monotonic()
+
+                job = None
+                with self._active_lock:
+                    has_capacity = len(self._active) < self.concurrency
+                if has_capacity:
+                    try:
+                        job = self.claim_next_job()
+                    except Exception as e:
+                        logger.error("Failed to claim ingestion job: %s", e)
+                    finally:
+                        close_old_connections()
+
+                if job is not None:
+                    with self._active_lock:
+                        self._active.add(job.pk)
+                    pool.submit(self._run_and_release, job)
+                    continue
+
+                with self._active_lock:
+                    idle = not self._active
+                if exit_when_idle and idle and not self._has_queued_jobs():
+                    break
+
+                _wakeup.wait(self.poll_interval)
+                _wakeup.clear()
+
+
+    def _has_queued_jobs(self):
+        try:
+            return IngestionJob.objects.filter(status='queued').exists()
+        finally:
+            close_old_connections()
+
+
+def start_local_worker(engine):
+    """Start the in-process worker pool once per process"""
+    global _local_worker, _local_worker_pid
+
+    if settings.INGEST_WORKER_MODE != 'thread':
+        return None
+
+    with _local_worker_lock:
+        if _local_worker is not None and _local_worker_pid == os.getpid():
+            return _local_worker
+
+        worker = IngestionWorker(engine)
+        thread = threading.Thread(
+            target=worker.run_forever,
+            name='ingest-worker',
+            daemon=True
+        )
+        thread.start()
+        _local_worker = worker
+        _local_worker_pid = os.getpid()
+        return worker
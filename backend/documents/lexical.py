@@ -0,0 +1,362 @@
+"""Per-document BM25 index over chunk text.
+
+Dense retrieval finds paraphrases but is unreliable for exact identifiers -
+email addresses, phone numbers, skill names like ``c++`` or ``node.js``. The
+lexical index keeps them as terms of their own (an email is indexed whole
+and as its parts, a phone number as its digits) and scores chunks with
+Okapi BM25.
+
+Layout next to the vector index, one directory per document::
+
+    doc_<id>/lexical.npz   offsets (V+1,), rows (P,), tfs (P,), lengths (N,)
+    doc_<id>/lexical.json  chunk ids and the vocabulary, in term order
+
+Postings of term ``t`` are ``rows[offsets[t]:offsets[t+1]]`` with matching
+term frequencies, sorted by row. Like ``NumpyVectorStore``, ``add`` buffers
+chunks and ``commit`` merges them into the postings and atomically replaces
+the files, so a document's index is updated incrementally as its chunks are
+stored.
+"""
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+from .vector_stores import document_id_from_chunk_id
+
+_TOKEN = re.compile(
+    r"""
+      (?P<email>[\w.+-]+@[\w-]+(?:\.[\w-]+)+)
+    | (?P<url>https?://[^\s<>"]+)
+    | (?P<phone>\+?\(?\d{1,4}\)?(?:[ .-]?\(?\d{2,5}\)?){2,4})
+    | (?P<word>\w+(?:[.#+/-]+\w+)*[#+]*)       # also node.js, c++, c#, ci/cd
+    """,
+    re.VERBOSE
+)
+_PART = re.compile(r'[^\W_]+')
+# Digit runs shorter than this are numbers, not phone numbers
+_PHONE_MIN_DIGITS = 9
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i in is it its me my
+of on or she he that the their them they this to was were what when where which who
+whom why will with you your about tell give list show describe explain
+""".split())
+
+
+def lexical_terms(text):
+    """Terms of a text: lowercased words and identifiers, minus stopwords"""
+    terms = []
+    for match in _TOKEN.finditer(text):
+        token = match.group().lower().rstrip('.-/')
+        if not token:
+            continue
+        if match.lastgroup == 'phone':
+            digits = re.sub(r'\D', '', token)
+            if len(digits) >= _PHONE_MIN_DIGITS:
+                terms.append(digits)
+                # Match numbers written with and without a country code
+                if len(digits) > 10:
+                    terms.append(digits[-10:])
+                continue
+        parts = _PART.findall(token)
+        if len(parts) != 1 or parts[0] != token:
+            if match.lastgroup != 'phone':
+                terms.append(token)
+        terms.extend(part for part in parts if part not in STOPWORDS)
+    return terms
+
+
+def query_terms(text):
+    """Distinct terms of a question, in order"""
+    return list(dict.fromkeys(lexical_terms(text)))
+
+
+def is_identifier(term):
+    """Whether a term names something exactly - an email, a phone number,
+    ``c++``, ``node.js``, ``x86`` - rather than being a plain word, whose
+    paraphrases only the embedding model finds"""
+    return not term.isalpha()
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Merge ranked id lists: each id scores sum(1 / (k + rank)), best first"""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class _DocumentPostings:
+    """Loaded postings of one document"""
+
+    def __init__(self, ids, vocabulary, offsets, rows, tfs, lengths, version):
+        self.ids = ids
+        self.vocabulary = vocabulary
+        self.terms = {term: i for i, term in enumerate(vocabulary)}
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.lengths = lengths
+        self.average_length = float(lengths.mean()) if len(lengths) else 0.0
+        self.version = version
+        self._norms = {}
+
+    def has_terms(self, terms):
+        for term in terms:
+            index = self.terms.get(term)
+            if index is None or self.offsets[index] == self.offsets[index + 1]:
+                return False
+        return True
+
+    def search(self, terms, k, k1=1.2, b=0.75):
+        """Return [(chunk_id, score)] of the best ``k`` chunks, best first"""
+        num_chunks = len(self.ids)
+        if not num_chunks:
+            return []
+        scores = np.zeros(num_chunks, dtype=np.float32)
+        norm = self._norms.get((k1, b))
+        if norm is None:
+            norm = (k1 * (1 - b + b * self.lengths / max(self.average_length, 1e-9))).astype(np.float32)
+            self._norms[(k1, b)] = norm
+        for term in terms:
+            index = self.terms.get(term)
+            if index is None:
+                continue
+            start, end = self.offsets[index], self.offsets[index + 1]
+            df = end - start
+            if df == 0:
+                continue
+            rows = self.rows[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            idf = math.log(1 + (num_chunks - df + 0.5) / (df + 0.5))
+            scores[rows] += idf * tf * (k1 + 1) / (tf + norm[rows])
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind='stable')]
+        return [(self.ids[row], float(scores[row])) for row in matched]
+
+
+class LexicalStore:
+    """BM25 postings for every document under ``root``"""
+
+    def __init__(self, root, k1=1.2, b=0.75):
+        self.root = root
+        self.k1 = k1
+        self.b = b
+        self._pending = {}
+        self._loaded = {}
+        self._lock = threading.RLock()
+
+    def _dir(self, document_id):
+        return os.path.join(self.root, f'doc_{document_id}')
+
+    def _version(self, document_id):
+        try:
+            stat = os.stat(os.path.join(self._dir(document_id), 'lexical.json'))
+            return (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def load(self, document_id):
+        version = self._version(document_id)
+        with self._lock:
+            cached = self._loaded.get(document_id)
+            if cached is not None and cached.version == version:
+                return cached
+            if version is None:
+                self._loaded.pop(document_id, None)
+                return None
+
+            directory = self._dir(document_id)
+            for _ in range(3):
+                with open(os.path.join(directory, 'lexical.json'), encoding='utf-8') as file:
+                    payload = json.load(file)
+                with np.load(os.path.join(directory, 'lexical.npz')) as arrays:
+                    offsets, rows, tfs, lengths = (arrays[name] for name in ('offsets', 'rows', 'tfs', 'lengths'))
+                # A concurrent commit may have replaced the arrays between reads
+                if len(lengths) == len(payload['ids']) and len(offsets) == len(payload['vocabulary']) + 1:
+                    break
+                version = self._version(document_id)
+            else:
+                raise RuntimeError(f"Lexical index for document {document_id} is inconsistent")
+
+            postings = _DocumentPostings(
+                payload['ids'], payload['vocabulary'], offsets, rows, tfs, lengths, version
+            )
+            self._loaded[document_id] = postings
+            return postings
+
+    def add(self, ids, texts):
+        with self._lock:
+            for chunk_id, text in zip(ids, texts):
+                document_id = document_id_from_chunk_id(chunk_id)
+                self._pending.setdefault(document_id, []).append((chunk_id, lexical_terms(text)))
+
+    def commit(self, document_id):
+        with self._lock:
+            pending = self._pending.pop(document_id, None)
+            if not pending:
+                return
+            existing = self.load(document_id)
+            replaced = {chunk_id for chunk_id, _ in pending}
+
+            if existing is not None:
+                vocabulary = list(existing.vocabulary)
+                keep = np.array([chunk_id not in replaced for chunk_id in existing.ids], dtype=bool)
+                remap = np.cumsum(keep) - 1
+                term_of = np.repeat(np.arange(len(vocabulary)), np.diff(existing.offsets))
+                valid = keep[existing.rows]
+                term_parts = [term_of[valid]]
+                row_parts = [remap[existing.rows[valid]]]
+                tf_parts = [existing.tfs[valid]]
+                ids = [chunk_id for chunk_id, kept in zip(existing.ids, keep) if kept]
+                lengths = [existing.lengths[keep]]
+            else:
+                vocabulary, ids, lengths = [], [], []
+                term_parts, row_parts, tf_parts = [], [], []
+
+            term_index = {term: i for i, term in enumerate(vocabulary)}
+            new_terms, new_rows, new_tfs, new_lengths = [], [], [], []
+            for chunk_id, terms in pending:
+                row = len(ids)
+                ids.append(chunk_id)
+                new_lengths.append(len(terms))
+                for term, count in Counter(terms).items():
+                    if term not in term_index:
+                        term_index[term] = len(vocabulary)
+                        vocabulary.append(term)
+                    new_terms.append(term_index[term])
+                    new_rows.append(row)
+                    new_tfs.append(min(count, 65535))
+
+            term_parts.append(np.asarray(new_terms, dtype=np.int64))
+            row_parts.append(np.asarray(new_rows, dtype=np.int64))
+            tf_parts.append(np.asarray(new_tfs, dtype=np.uint16))
+            lengths.append(np.asarray(new_lengths, dtype=np.int32))
+
+            terms = np.concatenate(term_parts)
+            rows = np.concatenate(row_parts)
+            tfs = np.concatenate(tf_parts)
+            order = np.lexsort((rows, terms))
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(vocabulary)))])
+            self._write(
+                document_id,
+                ids,
+                vocabulary,
+                offsets.astype(np.int64),
+                rows[order].astype(np.int32),
+                tfs[order].astype(np.uint16),
+                np.concatenate(lengths).astype(np.int32)
+            )
+
+    def rollback(self, document_id):
+        """Drop what was added for a document since its last commit"""
+        with self._lock:
+            self._pending.pop(document_id, None)
+
+    def _write(self, document_id, ids, vocabulary, offsets, rows, tfs, lengths):
+        directory = self._dir(document_id)
+        os.makedirs(directory, exist_ok=True)
+
+        # Arrays first, lexical.json last: it is what readers version on
+        tmp_path = os.path.join(directory, '.lexical.npz.tmp')
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, offsets=offsets, rows=rows, tfs=tfs, lengths=lengths)
+        os.replace(tmp_path, os.path.join(directory, 'lexical.npz'))
+
+        tmp_path = os.path.join(directory, '.lexical.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'ids': ids, 'vocabulary': vocabulary}, file)
+        os.replace(tmp_path, os.path.join(directory, 'lexical.json'))
+        self._loaded.pop(document_id, None)
+
+    def delete(self, ids=None, document_id=None):
+        """Remove chunks (or a whole document) from the index"""
+        with self._lock:
+            if ids is None:
+                if document_id is not None:
+                    self._pending.pop(document_id, None)
+                    self._remove(document_id)
+                return
+
+            by_document = {}
+            for chunk_id in ids:
+                by_document.setdefault(document_id_from_chunk_id(chunk_id), set()).add(chunk_id)
+            for doc_id, doc_ids in by_document.items():
+                pending = self._pending.get(doc_id)
+                if pending:
+                    self._pending[doc_id] = [item for item in pending if item[0] not in doc_ids]
+                existing = self.load(doc_id)
+                if existing is None or not doc_ids.intersection(existing.ids):
+                    continue
+                keep = [chunk_id not in doc_ids for chunk_id in existing.ids]
+                if any(keep):
+                    self._rewrite_without(doc_id, existing, keep)
+                else:
+                    self._remove(doc_id)
+
+    def _remove(self, document_id):
+        directory = self._dir(document_id)
+        for name in ('lexical.json', 'lexical.npz'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+        # Still holds the document's vectors when both indexes share a root
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+        self._loaded.pop(document_id, None)
+
+    def _rewrite_without(self, document_id, existing, keep):
+        keep = np.asarray(keep, dtype=bool)
+        remap = np.cumsum(keep) - 1
+        term_of = np.repeat(np.arange(len(existing.vocabulary)), np.diff(existing.offsets))
+        valid = keep[existing.rows]
+        terms = term_of[valid]
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(existing.vocabulary)))])
+        self._write(
+            document_id,
+            [chunk_id for chunk_id, kept in zip(existing.ids, keep) if kept],
+            list(existing.vocabulary),
+            offsets.astype(np.int64),
+            remap[existing.rows[valid]].astype(np.int32),
+            existing.tfs[valid],
+            existing.lengths[keep]
+        )
+
+    def list_document_ids(self):
+        """Ids of all documents that have a lexical index"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            int(name[4:]) for name in os.listdir(self.root)
+            if name.startswith('doc_') and name[4:].isdigit() and self._version(int(name[4:])) is not None
+        )
+
+    def list_ids(self, document_id):
+        postings = self.load(document_id)
+        return list(postings.ids) if postings is not None else []
+
+    def search(self, document_id, terms, k):
+        """Return [(chunk_id, score)] for the best ``k`` chunks of a document"""
+        postings = self.load(document_id)
+        if postings is None:
+            return []
+        return postings.search(terms, k, self.k1, self.b)
+
+    def has_terms(self, document_id, terms):
+        """True when every term occurs somewhere in the document"""
+        postings = self.load(document_id)
+        return postings is not None and bool(terms) and postings.has_terms(terms)
@@ -0,0 +1,358 @@
+"""Client for the OpenAI-compatible chat completion API (OpenAI or LM Studio).
+
+``LLMClient`` replaces the module-global ``openai`` calls:
+
+* connections are pooled and kept alive - one ``httpx.Client`` per process
+  for synchronous callers and one ``httpx.AsyncClient`` per event loop for
+  ASGI views;
+* every request has connect and read timeouts;
+* connection errors, timeouts, 429 and 5xx responses are retried with
+  exponential backoff and full jitter (streams only until the response
+  starts);
+* an ``AdmissionController`` caps the requests in flight. Callers beyond
+  the cap wait in a bounded queue; when the queue is full, or a caller has
+  waited ``queue_timeout`` seconds, ``LLMOverloaded`` is raised at once so
+  views can answer 503 instead of piling up on a slow LLM.
+
+Sync (``complete``) and async (``acomplete``, ``astream``) callers share the
+same admission limits.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import weakref
+from collections import deque
+
+import httpx
+from django.conf import settings
+from tenacity import (
+    AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+)
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMOverloaded(LLMError):
+    """Too many LLM requests are in flight or queued; retry later"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMUnavailable(LLMError):
+    """The LLM failed or timed out after all retries"""
+
+
+class _Waiter:
+    def __init__(self, loop=None):
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded wait queue, shared by threads and
+    event loops. A released slot is handed directly to the oldest waiter."""
+
+    def __init__(self, max_concurrency, max_queue, queue_timeout):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()
+        self.shed = 0
+
+    def _enter(self, loop=None):
+        """Take a free slot (returns None) or enqueue a waiter"""
+        with self._lock:
+            if self._active < self.max_concurrency and not self._waiters:
+                self._active += 1
+                return None
+            if len(self._waiters) >= self.max_queue:
+                self.shed += 1
+                raise LLMOverloaded(
+                    f"LLM overloaded: {self._active} requests in flight, {len(self._waiters)} queued"
+                )
+            waiter = _Waiter(loop)
+            self._waiters.append(waiter)
+            return waiter
+
+    def _give_up(self, waiter):
+        """Remove a waiter that stopped waiting; True if it got a slot anyway"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self.shed += 1
+            return False
+
+    def _timed_out(self):
+        return LLMOverloaded(f"LLM overloaded: no slot free within {self.queue_timeout}s")
+
+    def acquire(self):
+        waiter = self._enter()
+        if waiter is None or waiter.event.wait(self.queue_timeout):
+            return
+        if not self._give_up(waiter):
+            raise self._timed_out()
+
+    async def aacquire(self):
+        waiter = self._enter(asyncio.get_running_loop())
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not self._give_up(waiter):
+                raise self._timed_out()
+        except asyncio.CancelledError:
+            if self._give_up(waiter):
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self._active -= 1
+
+    def saturated(self):
+        """True when a new request would be shed right away"""
+        with self._lock:
+            return self._active >= self.max_concurrency and len(self._waiters) >= self.max_queue
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'in_flight': self._active,
+                'queued': len(self._waiters),
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'shed': self.shed,
+            }
+
+
+def _retryable(error):
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS
+    return isinstance(error, httpx.TransportError)
+
+
+class LLMClient:
+    def __init__(self, api_base, api_key, model, max_tokens=500, temperature=0.3,
+                 timeout=60.0, connect_timeout=5.0, max_retries=2,
+                 max_concurrency=8, max_queue=32, queue_timeout=10.0,
+                 pool_size=16, keepalive_seconds=30.0):
+        self.url = api_base.rstrip('/') + '/chat/completions'
+        self.api_key = api_key
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.keepalive_seconds = keepalive_seconds
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.admission = AdmissionController(max_concurrency, max_queue, queue_timeout)
+        self._sync_client = None
+        self._sync_pid = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            api_base=settings.LLM_API_BASE,
+            api_key=settings.LLM_API_KEY,
+            model=settings.LLM_MODEL,
+            max_tokens=settings.LLM_MAX_TOKENS,
+            temperature=settings.LLM_TEMPERATURE,
+            timeout=settings.LLM_TIMEOUT_SECONDS,
+            connect_timeout=settings.LLM_CONNECT_TIMEOUT_SECONDS,
+            max_retries=settings.LLM_MAX_RETRIES,
+            max_concurrency=settings.LLM_MAX_CONCURRENT_REQUESTS,
+            max_queue=settings.LLM_MAX_QUEUED_REQUESTS,
+            queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS,
+            pool_size=settings.LLM_POOL_SIZE,
+        )
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size,
+            keepalive_expiry=self.keepalive_seconds
+        )
+
+    def _headers(self):
+        return {'Authorization': f'Bearer {self.api_key}'}
+
+    @property
+    def sync_client(self):
+        # Pooled sockets must not be shared with a forked child
+        if self._sync_client is None or self._sync_pid != os.getpid():
+            with self._lock:
+                if self._sync_client is None or self._sync_pid != os.getpid():
+                    self._sync_client = httpx.Client(
+                        headers=self._headers(), timeout=self.timeout, limits=self._limits()
+                    )
+                    self._sync_pid = os.getpid()
+        return self._sync_client
+
+    def async_client(self):
+        """The pooled AsyncClient of the running event loop"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(headers=self._headers(), timeout=self.timeout, limits=self._limits())
+            self._async_clients[loop] = client
+        return client
+
+    def payload(self, prompt, stream=False, **overrides):
+        return {
+            'model': overrides.get('model', self.model),
+            'messages': [{'role': 'user', 'content': prompt}],
+            'max_tokens': overrides.get('max_tokens', self.max_tokens),
+            'temperature': overrides.get('temperature', self.temperature),
+            'stream': stream,
+        }
+
+    def _retry_options(self):
+        return {
+            'stop': stop_after_attempt(self.max_retries + 1),
+            'wait': wait_random_exponential(multiplier=0.5, max=8),
+            'retry': retry_if_exception(_retryable),
+            'reraise': True,
+        }
+
+    @staticmethod
+    def _message_content(data):
+        try:
+            return data['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError):
+            raise LLMError(f"Unexpected LLM response: {str(data)[:200]}")
+
+    @staticmethod
+    def _delta_content(line):
+        """Text of one SSE line of a streamed completion; None at the end"""
+        if not line.startswith('data:'):
+            return ''
+        data = line[5:].strip()
+        if data == '[DONE]':
+            return None
+        choices = json.loads(data).get('choices') or [{}]
+        return (choices[0].get('delta') or {}).get('content') or ''
+
+    def complete(self, prompt, **overrides):
+        """Return the completion text for a prompt (blocking)"""
+        self.admission.acquire()
+        try:
+            for attempt in Retrying(**self._retry_options()):
+                with attempt:
+                    response = self.sync_client.post(self.url, json=self.payload(prompt, **overrides))
+                    response.raise_for_status()
+            return self._message_content(response.json())
+        except httpx.HTTPError as e:
+            raise LLMUnavailable(f"LLM request failed: {e}") from e
+        finally:
+            self.admission.release()
+
+    async def acomplete(self, prompt, **overrides):
+        """Return the completion text for a prompt"""
+        await self.admission.aacquire()
+        try:
+            async for attempt in AsyncRetrying(**self._retry_options()):
+                with attempt:
+                    response = await self.async_client().post(self.url, json=self.payload(prompt, **overrides))
+                    response.raise_for_status()
+            return self._message_content(response.json())
+        except httpx.HTTPError as e:
+            raise LLMUnavailable(f"LLM request failed: {e}") from e
+        finally:
+            self.admission.release()
+
+    async def astream(self, prompt, **overrides):
+        """Yield completion text pieces as the LLM produces them.
+
+        Closing the generator early (``aclose``) closes the upstream
+        response, so the LLM stops generating for a client that left.
+        """
+        await self.admission.aacquire()
+        response = None
+        try:
+            client = self.async_client()
+            request = client.build_request('POST', self.url, json=self.payload(prompt, stream=True, **overrides))
+            async for attempt in AsyncRetrying(**self._retry_options()):
+                with attempt:
+                    response = await client.send(request, stream=True)
+                    if response.is_error:
+                        await response.aread()
+                        await response.aclose()
+                        response.raise_for_status()
+
+            async for line in response.aiter_lines():
+                text = self._delta_content(line)
+                if text is None:
+                    break
+                if text:
+                    yield text
+        except httpx.HTTPError as e:
+            raise LLMUnavailable(f"LLM request failed: {e}") from e
+        finally:
+            if response is not None:
+                await response.aclose()
+            self.admission.release()
+
+    def stats(self):
+        return self.admission.snapshot()
+
+    def close(self):
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+
+def get_llm_client():
+    """Process-wide LLM client built from settings"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient.from_settings()
+    return _client
+
+
+def reset_llm_client():
+    """Drop the shared client so the next call rebuilds it from settings"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from documents.benchmark.corpus import synthetic_pages
+from documents.embeddings import get_tokenizer, max_sequence_tokens
+from documents.rag_engine import RAGEngine
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark the token-aware chunker against the legacy character chunker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _time(self, func, repeat):
+        best = None
+        result = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def _report(self, name, seconds, texts, tokenizer, limit):
+        counts = [len(ids) for ids in tokenizer(texts, add_special_tokens=False)['input_ids']]
+        over = [count for count in counts if count > limit]
+        truncated = sum(count - limit for count in over)
+        total = sum(counts)
+        self.stdout.write(
+            f"{name:<8} {seconds * 1000:9.1f} ms  {len(texts):6d} chunks  "
+            f"mean {total / max(len(texts), 1):6.1f} tok  max {max(counts, default=0):5d} tok  "
+            f"over limit {len(over):5d}  tokens truncated {truncated:7d} ({100.0 * truncated / max(total, 1):.1f}%)"
+        )
+
+    def handle(self, *args, **options):
+        engine = RAGEngine()
+        tokenizer = get_tokenizer()
+        limit = max_sequence_tokens()
+        pages = [
+            (page_number, engine.clean_extracted_text(text))
+            for page_number, text in synthetic_pages(options['pages'], options['seed'])
+        ]
+        full_text = '\n\n'.join(text for _, text in pages)
+        self.stdout.write(
+            f"{len(pages)} pages, {len(full_text)} chars, tokenizer {type(tokenizer).__name__}, "
+            f"model limit {limit} tokens"
+        )
+
+        legacy_seconds, legacy_chunks = self._time(lambda: engine.chunk_text(full_text), options['repeat'])
+        chunker = engine.get_chunker(section_profile='resume')
+        token_seconds, token_chunks = self._time(lambda: list(chunker.chunk_pages(pages)), options['repeat'])
+
+        self._report('legacy', legacy_seconds, legacy_chunks, tokenizer, limit)
+        self._report('token', token_seconds, [chunk.text for chunk in token_chunks], tokenizer, limit)
@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.benchmark import embedding_recall, results
+
+DEFAULT_CONFIGS = [
+    'sentence-transformers:float32',
+    'sentence-transformers:float16',
+    'sentence-transformers:int8',
+    'onnx:float32',
+    'onnx-int8:float32',
+    'onnx-int8:int8',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare embedding backends and vector dtypes on chunks of processed documents: encode throughput, '
+        'query latency, index size and recall@k against the first configuration'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--configs',
+            nargs='+',
+            default=DEFAULT_CONFIGS,
+            help="backend:dtype pairs, backend one of sentence-transformers, onnx, onnx-int8, fake; "
+                 "the first is the reference for recall"
+        )
+        parser.add_argument('--documents', type=int, nargs='+', help='Only sample chunks of these documents')
+        parser.add_argument('--chunks', type=int, default=2000, help='Chunks to sample')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('-k', type=int, default=5, help='Top-k compared')
+        parser.add_argument('--threads', type=int, default=settings.RAG_EMBEDDING_THREADS)
+        parser.add_argument('--batch-size', type=int, default=settings.RAG_EMBEDDING_BATCH_SIZE)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Also write the results as JSON')
+
+    def handle(self, *args, **options):
+        for config in options['configs']:
+            backend, _, dtype = embedding_recall.parse_config(config)
+            if backend not in ('sentence-transformers', 'onnx', 'fake') or dtype not in ('float32', 'float16', 'int8'):
+                raise CommandError(f"Unknown configuration {config}")
+
+        chunks = embedding_recall.sample_chunks(options['chunks'], options['seed'], options['documents'])
+        queries = embedding_recall.sample_queries(chunks, options['queries'], options['seed'])
+        if not queries:
+            raise CommandError('No processed documents with text to sample from')
+        self.stdout.write(f"{len(chunks)} chunks, {len(queries)} queries, k={options['k']}")
+        self.stdout.write(
+            f"{'configuration':<32} {'load s':>7} {'chunks/s':>9} {'q enc p50':>10} {'search p50':>11} "
+            f"{'vectors':>10} {'recall':>7} {'hit rate':>8}"
+        )
+
+        measured = {}
+        reference = None
+        for config in options['configs']:
+            try:
+                result, top_ids = embedding_recall.measure(
+                    config,
+                    chunks,
+                    queries,
+                    options['k'],
+                    settings.RAG_EMBEDDING_MODEL,
+                    settings.RAG_ONNX_MODEL_DIR,
+                    threads=options['threads'],
+                    batch_size=options['batch_size'],
+                    normalize=settings.RAG_NORMALIZE_EMBEDDINGS
+                )
+            except ImportError as e:
+                self.stderr.write(f"{config}: skipped, {e}")
+                continue
+            if reference is None:
+                # A skipped reference makes the first configuration that ran the reference
+                reference = top_ids
+            recall = result[f"recall_at_{options['k']}"] = embedding_recall.recall_at_k(reference, top_ids)
+            measured[config] = result
+            self.stdout.write(
+                f"{config:<32} {result['load_seconds']:7.2f} {result['chunks_per_s']:9.1f} "
+                f"{result['query_encode']['p50_ms']:8.2f}ms {result['search']['p50_ms']:9.2f}ms "
+                f"{result['vector_bytes'] / 2 ** 20:8.2f}MB {recall:7.3f} "
+                f"{result['hit_rate']:8.3f}"
+            )
+
+        if options['output']:
+            run = {
+                'environment': results.environment(),
+                'options': {
+                    name: options[name]
+                    for name in ('configs', 'documents', 'chunks', 'queries', 'k', 'threads', 'batch_size', 'seed')
+                },
+                'model': settings.RAG_EMBEDDING_MODEL,
+                'results': measured,
+            }
+            results.save(options['output'], run)
+            self.stdout.write(f"results written to {options['output']}")
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from documents.models import Document
+from documents.llm_service import reset_llm_client
+from documents.stub_llm import StubLLMServer
+
+BLOCKING_PATH = '/api/documents/ask/'
+STREAMING_PATH = '/api/documents/ask/stream/'
+
+
+async def asgi_request(application, path, payload, abort_after_tokens=None):
+    """Drive one POST through the ASGI application in-process.
+
+    Returns timings in ms: ``ttfb`` (first body bytes), ``first_token``
+    (first SSE token event, or the whole body for JSON responses) and
+    ``total``, plus ``events``, the ``(name, ms)`` of every SSE event. With
+    ``abort_after_tokens`` the client disconnects after that many token
+    events.
+    """
+    body = json.dumps(payload).encode('utf-8')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode('ascii'),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [
+            (b'host', b'localhost'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii')),
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    disconnect = asyncio.Event()
+    request_sent = False
+    timings = {'status': None, 'ttfb': None, 'first_token': None, 'total': None, 'tokens': 0, 'events': []}
+    started = time.perf_counter()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        elapsed = (time.perf_counter() - started) * 1000
+        if message['type'] == 'http.response.start':
+            timings['status'] = message['status']
+            return
+        if message['type'] != 'http.response.body':
+            return
+        chunk = message.get('body', b'')
+        if chunk and timings['ttfb'] is None:
+            timings['ttfb'] = elapsed
+        for line in chunk.split(b'\n'):
+            if line.startswith(b'event: '):
+                timings['events'].append((line[7:].decode('ascii'), elapsed))
+        if path == BLOCKING_PATH:
+            if chunk and timings['first_token'] is None:
+                timings['first_token'] = elapsed
+        elif b'event: token' in chunk:
+            timings['tokens'] += chunk.count(b'event: token')
+            if timings['first_token'] is None:
+                timings['first_token'] = elapsed
+            if abort_after_tokens is not None and timings['tokens'] >= abort_after_tokens:
+                disconnect.set()
+        if not message.get('more_body', False):
+            timings['total'] = elapsed
+            disconnect.set()
+
+    await application(scope, receive, send)
+    if timings['total'] is None:
+        timings['total'] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def percentiles(samples):
+    samples = [sample for sample in samples if sample is not None]
+    if not samples:
+        return 'n/a'
+    p50, p95 = np.percentile(samples, [50, 95])
+    return f"p50 {p50:8.1f} / p95 {p95:8.1f} ms"
+
+
+class Command(BaseCommand):
+    help = 'Measure time-to-first-byte of the blocking and the streaming ask endpoints against a stub LLM'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--document-id', type=int, required=True)
+        parser.add_argument('--question', default='What is this document about?')
+        parser.add_argument('--requests', type=int, default=10)
+        parser.add_argument('--clients', type=int, default=1, help='Concurrent requests')
+        parser.add_argument('--first-token-ms', type=int, default=300)
+        parser.add_argument('--token-ms', type=int, default=20)
+        parser.add_argument('--tokens', type=int, default=100)
+        parser.add_argument('--disconnect-after', type=int, default=3,
+                            help='Token events before the disconnect check hangs up')
+
+    async def _run_mode(self, application, path, payload, options):
+        semaphore = asyncio.Semaphore(options['clients'])
+
+        async def one():
+            async with semaphore:
+                return await asgi_request(application, path, payload)
+
+        return await asyncio.gather(*(one() for _ in range(options['requests'])))
+
+    async def _run(self, application, stub, payload, options):
+        for name, path in (('blocking', BLOCKING_PATH), ('streaming', STREAMING_PATH)):
+            results = await self._run_mode(application, path, payload, options)
+            statuses = sorted({result['status'] for result in results})
+            self.stdout.write(f"{name:<10} status {statuses}")
+            self.stdout.write(f"  ttfb         {percentiles([r['ttfb'] for r in results])}")
+            self.stdout.write(f"  first token  {percentiles([r['first_token'] for r in results])}")
+            self.stdout.write(f"  total        {percentiles([r['total'] for r in results])}")
+
+        before = stub.stats.snapshot()
+        aborted = await asgi_request(
+            application, STREAMING_PATH, payload, abort_after_tokens=options['disconnect_after']
+        )
+        # Give the server side a moment to notice the closed upstream stream
+        for _ in range(50):
+            await asyncio.sleep(options['token_ms'] / 1000 + 0.01)
+            after = stub.stats.snapshot()
+            finished = after['streams_aborted'] + after['streams_completed']
+            if finished > before['streams_aborted'] + before['streams_completed']:
+                break
+        after = stub.stats.snapshot()
+        upstream_tokens = after['tokens_sent'] - before['tokens_sent']
+        stopped = after['streams_aborted'] > before['streams_aborted']
+        self.stdout.write(
+            f"disconnect after {aborted['tokens']} token events: upstream "
+            f"{'stopped' if stopped else 'NOT stopped'} after {upstream_tokens}/{options['tokens']} tokens"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            document = Document.objects.get(id=options['document_id'])
+        except Document.DoesNotExist:
+            raise CommandError(f"Document {options['document_id']} does not exist")
+        if document.processing_status != 'completed':
+            raise CommandError(f"Document {document.id} is {document.processing_status}, not completed")
+
+        from document_intelligence.asgi import application
+
+        payload = {'document_id': document.id, 'question': options['question']}
+        stub = StubLLMServer(options['first_token_ms'], options['token_ms'], options['tokens'])
+        # Every request must reach the LLM, so the answer caches are off
+        overrides = override_settings(
+            RAG_CACHE_ENABLED=False,
+            RAG_SEMANTIC_CACHE_ENABLED=False,
+            LLM_API_BASE=stub.api_base,
+            LLM_API_KEY='stub'
+        )
+        with stub, overrides:
+            reset_llm_client()
+            try:
+                self.stdout.write(
+                    f"stub LLM at {stub.api_base}: first token {options['first_token_ms']} ms, "
+                    f"{options['tokens']} tokens every {options['token_ms']} ms"
+                )
+                asyncio.run(self._run(application, stub, payload, options))
+            finally:
+                reset_llm_client()
@@ -0,0 +1,131 @@
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.benchmark import corpus, harness, results
+from documents.runtime import memory_usage
+from documents.stub_llm import StubLLMServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Offline benchmark: ingest throughput over synthetic TXT/DOCX/PDF corpora and query latency under '
+        'concurrent clients, written as JSON and optionally compared with a baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', choices=sorted(corpus.SIZES), default=['small', 'medium'])
+        parser.add_argument('--formats', nargs='+', choices=corpus.FORMATS, default=list(corpus.FORMATS))
+        parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16], help='Concurrency levels')
+        parser.add_argument('--requests', type=int, default=100, help='Questions per concurrency level')
+        parser.add_argument('--repeat', type=int, default=1, help='Ingest every corpus this often and keep the fastest')
+        parser.add_argument(
+            '--embeddings',
+            choices=['fake', 'model'],
+            default='fake',
+            help="'fake' uses the deterministic hashing embedder, 'model' the configured RAG_EMBEDDING_MODEL"
+        )
+        parser.add_argument('--vector-store', default='numpy')
+        parser.add_argument('--first-token-ms', type=int, default=20, help='Stub LLM latency')
+        parser.add_argument('--token-ms', type=int, default=2)
+        parser.add_argument('--tokens', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark-results.json', help='Where to write the results')
+        parser.add_argument('--baseline', help='Results file to compare with')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.10,
+            help='Relative slowdown beyond which a metric counts as a regression'
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Also write the results to --baseline instead of comparing'
+        )
+
+    def handle(self, *args, **options):
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('--save-baseline needs --baseline')
+
+        root = tempfile.mkdtemp(prefix='bench_suite_')
+        stub = StubLLMServer(options['first_token_ms'], options['token_ms'], options['tokens'])
+        environment = harness.BenchmarkEnvironment(
+            root,
+            stub.api_base,
+            embedding_model='fake' if options['embeddings'] == 'fake' else None,
+            vector_store=options['vector_store']
+        )
+        measured = {'ingest': {}, 'query': {}}
+        documents = []
+        try:
+            with stub, environment:
+                try:
+                    for size in options['sizes']:
+                        files = corpus.build_corpus(root, size, options['formats'], options['seed'])
+                        for file_type, paths in files.items():
+                            processed, result = None, None
+                            for _ in range(max(1, options['repeat'])):
+                                attempt, attempt_result = harness.ingest_files(paths, file_type)
+                                if result is None or attempt_result['seconds'] < result['seconds']:
+                                    attempt, processed, result = processed, attempt, attempt_result
+                                if attempt:
+                                    harness.remove_documents(attempt)
+                            documents.extend(processed)
+                            measured['ingest'][f"{file_type}-{size}"] = result
+                            self.stdout.write(
+                                f"ingest {file_type:<4} {size:<6} {result['pages']:6d} pages "
+                                f"{result['chunks']:7d} chunks "
+                                f"in {result['seconds']:8.2f}s  {result['pages_per_s']:8.1f} pages/s  "
+                                f"{result['chunks_per_s']:8.1f} chunks/s  peak rss {result['peak_rss_mb']:.0f} MB"
+                            )
+
+                    document_ids = [document.id for document in documents]
+                    questions = corpus.synthetic_questions(max(options['requests'], 1), options['seed'])
+                    for clients in options['clients']:
+                        result = harness.run_queries(document_ids, questions, clients, options['requests'])
+                        measured['query'][f"clients-{clients}"] = result
+                        self.stdout.write(
+                            f"query  {clients:3d} clients  p50 {result['p50_ms']:8.1f}  p95 {result['p95_ms']:8.1f}  "
+                            f"p99 {result['p99_ms']:8.1f} ms  {result['requests_per_s']:7.1f} req/s  "
+                            f"{result['errors']} errors"
+                        )
+                finally:
+                    harness.remove_documents(documents)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+        measured['memory'] = {'peak_rss_mb': memory_usage()['peak_rss_mb']}
+        run = {
+            'environment': results.environment(),
+            'options': {
+                name: options[name]
+                for name in ('sizes', 'formats', 'clients', 'requests', 'repeat', 'embeddings', 'vector_store',
+                             'first_token_ms', 'token_ms', 'tokens', 'seed')
+            },
+            'results': measured,
+        }
+        results.save(options['output'], run)
+        self.stdout.write(f"results written to {options['output']}")
+
+        if options['save_baseline']:
+            results.save(options['baseline'], run)
+            self.stdout.write(f"baseline written to {options['baseline']}")
+        elif options['baseline']:
+            self._compare(run, results.load(options['baseline']), options['threshold'])
+
+    def _compare(self, run, baseline, threshold):
+        if baseline.get('options') != run['options']:
+            self.stderr.write('warning: the baseline was measured with different options')
+        rows = results.compare(run, baseline, threshold)
+        regressions = [row for row in rows if row[4]]
+        for name, before, now, change, regressed in rows:
+            flag = 'REGRESSION' if regressed else ''
+            self.stdout.write(f"{name:<45} {before:>10.2f} -> {now:>10.2f}  {change:+7.1%}  {flag}")
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} metrics regressed by more than {threshold:.0%}: "
+                + ', '.join(row[0] for row in regressions)
+            )
+        self.stdout.write(f"no regressions beyond {threshold:.0%} ({len(rows)} metrics compared)")
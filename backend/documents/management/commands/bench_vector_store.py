@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from documents.runtime import memory_usage
+from documents.vector_stores import ChromaVectorStore, NumpyVectorStore
+
+DOCUMENT_ID = 1
+
+
+def directory_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q)) if samples else 0.0
+
+
+class Command(BaseCommand):
+    help = 'Compare ingest time, query latency, memory and disk size of the vector store backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+        parser.add_argument('--dim', type=int, default=384)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--batch', type=int, default=16, help='Questions per batched query')
+        parser.add_argument('--top-k', type=int, default=3)
+        parser.add_argument('--backends', nargs='+', default=['numpy', 'numpy-float16', 'numpy-int8', 'chroma'])
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _make_store(self, backend, root):
+        if backend == 'numpy':
+            return NumpyVectorStore(root)
+        if backend in ('numpy-float16', 'numpy-int8'):
+            return NumpyVectorStore(root, dtype=backend.split('-')[1])
+        if backend == 'chroma':
+            import chromadb
+            client = chromadb.PersistentClient(path=root)
+            collection = client.get_or_create_collection(name='documents')
+            return ChromaVectorStore(lambda: collection)
+        raise ValueError(f"Unknown backend {backend}")
+
+    def _run(self, backend, vectors, queries, options):
+        root = tempfile.mkdtemp(prefix=f'bench_{backend}_')
+        try:
+            rss_before = memory_usage()['rss_mb'] or 0
+            store = self._make_store(backend, root)
+
+            started = time.perf_counter()
+            # Chroma rejects very large single adds, so ingest in batches the
+            # way RAGEngine.store_chunks does
+            for start in range(0, len(vectors), 5000):
+                stop = min(start + 5000, len(vectors))
+                ids = [f"doc_{DOCUMENT_ID}_chunk_{i}" for i in range(start, stop)]
+                metadatas = [{"document_id": DOCUMENT_ID, "chunk_index": i} for i in range(start, stop)]
+                store.add(ids, vectors[start:stop], [''] * len(ids), metadatas)
+            store.commit(DOCUMENT_ID)
+            ingest_seconds = time.perf_counter() - started
+
+            # First query loads (or memory-maps) the index
+            started = time.perf_counter()
+            store.query(queries[:1], n_results=options['top_k'], document_id=DOCUMENT_ID)
+            first_query_ms = (time.perf_counter() - started) * 1000
+
+            single = []
+            for query in queries:
+                started = time.perf_counter()
+                store.query(query[None, :], n_results=options['top_k'], document_id=DOCUMENT_ID)
+                single.append((time.perf_counter() - started) * 1000)
+
+            batched = []
+            for start in range(0, len(queries), options['batch']):
+                block = queries[start:start + options['batch']]
+                started = time.perf_counter()
+                store.query(block, n_results=options['top_k'], document_id=DOCUMENT_ID)
+                batched.append((time.perf_counter() - started) * 1000 / len(block))
+
+            rss_after = memory_usage()['rss_mb'] or 0
+            disk_mb = directory_size(root) / 1024 / 1024
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+        self.stdout.write(
+            f"{backend:<14} {len(vectors):>8d}  ingest {ingest_seconds:8.2f} s  "
+            f"first {first_query_ms:8.1f} ms  "
+            f"single p50 {percentile(single, 50):7.2f} / p99 {percentile(single, 99):7.2f} ms  "
+            f"batched {percentile(batched, 50):7.2f} ms/q  "
+            f"rss +{rss_after - rss_before:7.1f} MB  disk {disk_mb:8.1f} MB"
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        queries = rng.standard_normal((options['queries'], options['dim']), dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        backends = list(options['backends'])
+        if 'chroma' in backends:
+            try:
+                import chromadb  # noqa: F401
+            except ImportError:
+                self.stderr.write('chromadb is not installed, skipping the chroma backend')
+                backends.remove('chroma')
+
+        for size in options['sizes']:
+            vectors = rng.standard_normal((size, options['dim']), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            for backend in backends:
+                self._run(backend, vectors, queries, options)
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from documents.models import Document, DocumentChunk
+from documents.rag_engine import get_rag_engine
+from documents.routing import centroid_bytes, unit_rows_sum
+
+
+class Command(BaseCommand):
+    help = 'Compute the routing centroids of documents from their stored vectors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--document-id', type=int, help='Only this document')
+        parser.add_argument('--missing', action='store_true', help='Only documents without a centroid')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        vector_store = get_rag_engine().vector_store
+        documents = Document.objects.filter(processing_status='completed')
+        if options['document_id']:
+            documents = documents.filter(id=options['document_id'])
+        if options['missing']:
+            documents = documents.filter(centroid__isnull=True)
+
+        batch_size = options['batch_size']
+        for document in documents.order_by('id').only('id'):
+            chunk_ids = list(
+                DocumentChunk.objects.filter(document=document)
+                .order_by('chunk_index')
+                .values_list('embedding_id', flat=True)
+            )
+            vector_sum = None
+            found = 0
+            for start in range(0, len(chunk_ids), batch_size):
+                stored = vector_store.get(chunk_ids[start:start + batch_size], include_embeddings=True)
+                if not stored['ids']:
+                    continue
+                batch_sum = unit_rows_sum(stored['embeddings'])
+                vector_sum = batch_sum if vector_sum is None else vector_sum + batch_sum
+                found += len(stored['ids'])
+
+            centroid = centroid_bytes(vector_sum) if vector_sum is not None else None
+            Document.objects.filter(id=document.id).update(centroid=centroid, updated_at=timezone.now())
+            self.stdout.write(f"Document {document.id}: centroid from {found}/{len(chunk_ids)} vectors")
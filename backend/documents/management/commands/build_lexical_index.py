@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from documents.chunk_text import iter_chunk_texts
+from documents.models import Document, DocumentChunk
+from documents.rag_engine import get_rag_engine
+
+
+class Command(BaseCommand):
+    help = 'Build the BM25 lexical index from stored chunks (for documents processed before hybrid retrieval)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--document-id', type=int, help='Only rebuild this document')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        lexical_index = get_rag_engine().lexical_index
+        documents = Document.objects.filter(processing_status='completed')
+        if options['document_id']:
+            documents = documents.filter(id=options['document_id'])
+
+        for document in documents.order_by('id'):
+            started = time.perf_counter()
+            lexical_index.delete(document_id=document.id)
+            rows = iter_chunk_texts(
+                DocumentChunk.objects.filter(document=document).order_by('chunk_index'),
+                batch_size=options['batch_size']
+            )
+            count = 0
+            for chunk_id, text in rows:
+                lexical_index.add([chunk_id], [text])
+                count += 1
+            lexical_index.commit(document.id)
+            self.stdout.write(
+                f"Document {document.id}: indexed {count} chunks in {time.perf_counter() - started:.2f}s"
+            )
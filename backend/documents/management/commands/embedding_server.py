@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.embedding_server import EmbeddingClient, EmbeddingServer, EmbeddingServerUnavailable
+from documents.embeddings import get_embedding_model
+
+
+class Command(BaseCommand):
+    help = 'Run the shared embedding server that micro-batches encode requests from all workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--address',
+            default=None,
+            help="'unix:/path.sock' or 'tcp:127.0.0.1:PORT' (default: EMBEDDING_SERVER_ADDRESS)"
+        )
+        parser.add_argument('--max-batch-size', type=int, default=None)
+        parser.add_argument('--max-wait-ms', type=float, default=None)
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Print latency and batching statistics of a running server and exit'
+        )
+
+    def handle(self, *args, **options):
+        address = options['address'] or settings.EMBEDDING_SERVER_ADDRESS
+        if not address:
+            raise CommandError('No address given and EMBEDDING_SERVER_ADDRESS is not set')
+
+        if options['stats']:
+            try:
+                stats = EmbeddingClient(address, timeout=5).stats()
+            except EmbeddingServerUnavailable as e:
+                raise CommandError(f'Embedding server not reachable: {e}')
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+
+        model = get_embedding_model()
+
+        def encode(texts, batch_size, normalize):
+            return model.encode(
+                texts,
+                batch_size=batch_size,
+                normalize_embeddings=normalize,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+
+        max_wait_ms = options['max_wait_ms']
+        if max_wait_ms is None:
+            max_wait_ms = settings.EMBEDDING_SERVER_MAX_WAIT_MS
+        server = EmbeddingServer(
+            address,
+            encode,
+            max_batch_size=options['max_batch_size'] or settings.EMBEDDING_SERVER_MAX_BATCH_SIZE,
+            max_wait_ms=max_wait_ms
+        )
+        self.stdout.write(f'Embedding server listening on {address}')
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping embedding server')
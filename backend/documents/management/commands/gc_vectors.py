@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+
+from documents import dedup
+from documents.models import Document, DocumentChunk
+from documents.rag_engine import get_rag_engine
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove vectors and lexical postings that no document chunk refers to, and stored chunk '
+        'embeddings of other embedding spaces or of texts no chunk contains'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+        parser.add_argument(
+            '--keep-other-spaces',
+            action='store_true',
+            help='Keep stored chunk embeddings of other models, e.g. to switch back to one'
+        )
+        parser.add_argument(
+            '--min-age-hours',
+            type=float,
+            default=24,
+            help='Only remove unreferenced chunk embeddings older than this (an ingest stores them first)'
+        )
+
+    def handle(self, *args, **options):
+        engine = get_rag_engine()
+        dry_run = options['dry_run']
+        statuses = dict(Document.objects.values_list('id', 'processing_status'))
+
+        for name, store in (('vectors', engine.vector_store), ('lexical', engine.lexical_index)):
+            removed_documents = 0
+            removed_chunks = 0
+            for document_id in store.list_document_ids():
+                if document_id not in statuses:
+                    removed_documents += 1
+                    removed_chunks += len(store.list_ids(document_id))
+                    if not dry_run:
+                        store.delete(document_id=document_id)
+                    continue
+                # Chunks of a running ingest are not in the database yet
+                if statuses[document_id] in ('pending', 'processing'):
+                    continue
+
+                referenced = set(
+                    DocumentChunk.objects.filter(document_id=document_id).values_list('embedding_id', flat=True)
+                )
+                orphans = [chunk_id for chunk_id in store.list_ids(document_id) if chunk_id not in referenced]
+                if orphans:
+                    removed_chunks += len(orphans)
+                    if not dry_run:
+                        store.delete(ids=orphans)
+
+            verb = 'Would remove' if dry_run else 'Removed'
+            self.stdout.write(
+                f"{name}: {verb} {removed_chunks} orphaned chunks "
+                f"({removed_documents} deleted documents)"
+            )
+
+        other_spaces, unreferenced = dedup.stale_chunk_embeddings(min_age_seconds=options['min_age_hours'] * 3600)
+        if options['keep_other_spaces']:
+            other_spaces = other_spaces.none()
+        if dry_run:
+            other_count, unreferenced_count = other_spaces.count(), unreferenced.count()
+        else:
+            other_count = other_spaces.delete()[0]
+            unreferenced_count = unreferenced.delete()[0]
+        verb = 'Would remove' if dry_run else 'Removed'
+        self.stdout.write(
+            f"chunk embeddings: {verb} {other_count} of other embedding spaces and "
+            f"{unreferenced_count} no chunk refers to"
+        )
@@ -0,0 +1,232 @@
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.bulk_ingest import BulkWriter, extract_file, get_ingest_pool, ingested_hashes
+from documents.rag_engine import get_rag_engine
+from documents.uploads import used_bytes
+from documents.validation import file_content_error, file_size_error, file_type_error, file_type_of
+
+CHECKPOINT_NAME = '.ingest_dir.checkpoint'
+# Statuses a resumed run does not retry
+DONE_STATUSES = ('ingested', 'duplicate', 'empty')
+
+
+class Command(BaseCommand):
+    help = (
+        'Ingest every supported file under a directory: parse in a process pool, embed in large '
+        'batches and write in bulk. Interrupted runs resume from a checkpoint file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Directory to ingest')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Extraction processes'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.RAG_INGEST_BATCH_SIZE * 4,
+            help='Chunks embedded and written together'
+        )
+        parser.add_argument('--checkpoint', help=f'Checkpoint file (default: <path>/{CHECKPOINT_NAME})')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Extract and chunk only, and report the expected chunk counts (the text cache is still filled)'
+        )
+
+    def walk(self, root):
+        """Relative paths of files to ingest, and ``(path, reason)`` of files
+        rejected by type, size or content, as the upload API would"""
+        accepted = []
+        rejected = []
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories[:] = sorted(name for name in subdirectories if not name.startswith('.'))
+            for name in sorted(files):
+                if name.startswith('.'):
+                    continue
+                full_path = os.path.join(directory, name)
+                relative = os.path.relpath(full_path, root)
+                error = file_type_error(name)
+                if not error:
+                    size = os.path.getsize(full_path)
+                    error = file_size_error(size)
+                if not error:
+                    with open(full_path, 'rb') as handle:
+                        error = file_content_error(handle, file_type_of(name), size)
+                if error:
+                    rejected.append((relative, error))
+                else:
+                    accepted.append(relative)
+        return accepted, rejected
+
+    def within_quota(self, paths):
+        """Split ``paths`` into those that fit in UPLOAD_MAX_TOTAL_BYTES, in
+        order, and ``(path, reason)`` of the rest"""
+        if not settings.UPLOAD_MAX_TOTAL_BYTES:
+            return paths, []
+        available = settings.UPLOAD_MAX_TOTAL_BYTES - used_bytes()
+        fitting = []
+        over = []
+        for path in paths:
+            size = os.path.getsize(os.path.join(self.root, path))
+            if size > available:
+                over.append((path, f'Storage quota exceeded: {max(available, 0)} bytes available, {size} needed'))
+            else:
+                fitting.append(path)
+                available -= size
+        return fitting, over
+
+    def read_checkpoint(self, checkpoint_path):
+        done = {}
+        if not os.path.exists(checkpoint_path):
+            return done
+        with open(checkpoint_path, encoding='utf-8') as handle:
+            for line in handle:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by the interruption
+                    continue
+                done[entry['path']] = entry
+        return {path: entry for path, entry in done.items() if entry['status'] in DONE_STATUSES}
+
+    def record(self, entry):
+        if self.checkpoint is None:
+            return
+        self.checkpoint.write(json.dumps(entry) + '\n')
+        self.checkpoint.flush()
+        os.fsync(self.checkpoint.fileno())
+
+    def report(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self.last_report < 2:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        done = self.counts['files']
+        rate = done / elapsed
+        eta = (self.total - done) / rate if rate else 0
+        verb = 'extracted' if self.dry_run else 'ingested'
+        self.stdout.write(
+            f"{done}/{self.total} files {verb}, {self.counts['pages']} pages, {self.counts['chunks']} chunks "
+            f"| {rate:.1f} files/s, {self.counts['pages'] / elapsed:.1f} pages/s, "
+            f"{self.counts['chunks'] / elapsed:.1f} chunks/s | ETA {eta:.0f}s"
+        )
+
+    def count(self, extracted):
+        self.counts['files'] += 1
+        self.counts['pages'] += extracted.page_count
+        self.counts['chunks'] += len(extracted.chunks)
+
+    def finish(self, committed):
+        for extracted, document in committed:
+            self.count(extracted)
+            self.record({
+                'path': os.path.relpath(extracted.path, self.root),
+                'status': 'ingested',
+                'document_id': document.id,
+                'chunks': len(extracted.chunks)
+            })
+
+    def skip(self, extracted, status, message):
+        self.counts['files'] += 1
+        self.counts[status] += 1
+        relative = os.path.relpath(extracted.path, self.root)
+        self.record({'path': relative, 'status': status, 'error': message})
+        if status == 'failed':
+            self.stderr.write(f"{relative}: {message}")
+
+    def handle(self, *args, **options):
+        self.root = os.path.abspath(options['path'])
+        if not os.path.isdir(self.root):
+            raise CommandError(f"{self.root} is not a directory")
+        self.dry_run = options['dry_run']
+        batch_size = max(1, options['batch_size'])
+        workers = max(1, options['workers'])
+
+        checkpoint_path = options['checkpoint'] or os.path.join(self.root, CHECKPOINT_NAME)
+        done = {} if options['restart'] else self.read_checkpoint(checkpoint_path)
+        accepted, rejected = self.walk(self.root)
+        todo = [path for path in accepted if path not in done]
+        already_done = len(accepted) - len(todo)
+        todo, over_quota = self.within_quota(todo)
+        rejected += over_quota
+        for path, reason in rejected:
+            self.stdout.write(f"{path}: {reason}")
+        self.stdout.write(
+            f"{len(todo) + already_done} files to ingest ({already_done} already done per checkpoint), "
+            f"{len(rejected)} rejected"
+        )
+
+        engine = get_rag_engine()
+        writer = BulkWriter(engine, batch_size)
+        seen_hashes = ingested_hashes()
+        self.total = len(todo)
+        self.counts = {'files': 0, 'pages': 0, 'chunks': 0, 'duplicate': 0, 'empty': 0, 'failed': 0}
+        expected = []
+        self.checkpoint = None
+        if not self.dry_run:
+            self.checkpoint = open(checkpoint_path, 'w' if options['restart'] else 'a', encoding='utf-8')
+        self.started = time.perf_counter()
+        self.last_report = self.started
+
+        try:
+            with get_ingest_pool(workers, seen_hashes) as pool:
+                paths = iter(todo)
+                running = set()
+                while True:
+                    # Bounded read-ahead: extracted chunks wait in memory for the writer
+                    for path in paths:
+                        full_path = os.path.join(self.root, path)
+                        running.add(pool.submit(extract_file, full_path, file_type_of(path)))
+                        if len(running) >= workers * 2:
+                            break
+                    if not running:
+                        break
+                    finished, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        extracted = future.result()
+                        if extracted.error:
+                            self.skip(extracted, 'failed', extracted.error)
+                        elif extracted.duplicate or extracted.content_hash in seen_hashes:
+                            self.skip(extracted, 'duplicate', 'same content as an ingested document')
+                        elif not extracted.chunks:
+                            self.skip(extracted, 'empty', 'no text content found')
+                        elif self.dry_run:
+                            seen_hashes.add(extracted.content_hash)
+                            expected.append((os.path.relpath(extracted.path, self.root), len(extracted.chunks)))
+                            self.count(extracted)
+                        else:
+                            seen_hashes.add(extracted.content_hash)
+                            self.finish(writer.add(extracted))
+                    self.report()
+                if not self.dry_run:
+                    self.finish(writer.flush())
+        finally:
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+
+        elapsed = time.perf_counter() - self.started
+        self.report(force=True)
+        if self.dry_run:
+            for path, chunks in sorted(expected):
+                self.stdout.write(f"{path}: {chunks} chunks")
+            verb = 'Would ingest'
+        else:
+            verb = 'Ingested'
+        ingested = self.counts['files'] - self.counts['duplicate'] - self.counts['empty'] - self.counts['failed']
+        self.stdout.write(
+            f"{verb} {ingested} files, {self.counts['pages']} pages, {self.counts['chunks']} chunks "
+            f"in {elapsed:.2f}s ({self.counts['duplicate']} duplicates, {self.counts['empty']} empty, "
+            f"{self.counts['failed']} failed)"
+        )
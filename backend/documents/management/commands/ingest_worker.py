@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from documents.jobs import IngestionWorker
+from documents.rag_engine import get_rag_engine
+
+
+class Command(BaseCommand):
+    help = 'Run the background worker that processes queued document ingestion jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help='Maximum number of jobs this worker runs at once (default: INGEST_WORKER_CONCURRENCY)'
+        )
+        parser.add_argument(
+            '--drain',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling forever'
+        )
+
+    def handle(self, *args, **options):
+        worker = IngestionWorker(get_rag_engine(), concurrency=options['concurrency'])
+        self.stdout.write(
+            f"Ingestion worker {worker.worker_id} started (concurrency={worker.concurrency})"
+        )
+        try:
+            worker.run_forever(exit_when_idle=options['drain'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping ingestion worker')
@@ -0,0 +1,79 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from documents.models import Document
+from documents.rag_engine import get_rag_engine
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the chunks of processed documents from the extracted-text cache, '
+        'embedding only chunks whose text changed'
+    )
+    # reembed runs the same pipeline but embeds every chunk again
+    reuse_vectors = True
+
+    def add_arguments(self, parser):
+        parser.add_argument('--document-id', type=int, action='append', help='Only these documents (repeatable)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.INGEST_WORKER_CONCURRENCY,
+            help='Documents processed in parallel'
+        )
+        parser.add_argument(
+            '--extract-missing',
+            action='store_true',
+            help='Parse the original file of documents that are not in the text cache instead of skipping them'
+        )
+
+    def _process(self, engine, document):
+        close_old_connections()
+        started = time.perf_counter()
+        try:
+            engine.process_document(document, reuse_vectors=self.reuse_vectors)
+            return document, document.chunks.count(), time.perf_counter() - started, None
+        except Exception as e:
+            return document, 0, time.perf_counter() - started, e
+        finally:
+            close_old_connections()
+
+    def handle(self, *args, **options):
+        engine = get_rag_engine()
+        if engine.text_cache is None:
+            raise CommandError('The extracted-text cache is disabled (RAG_TEXT_CACHE_ENABLED)')
+
+        documents = Document.objects.filter(processing_status='completed').order_by('id')
+        if options['document_id']:
+            documents = documents.filter(id__in=options['document_id'])
+
+        todo = []
+        for document in documents:
+            if options['extract_missing'] or engine.has_cached_text(document):
+                todo.append(document)
+            else:
+                self.stdout.write(f"Document {document.id}: not in the text cache, skipped")
+
+        started = time.perf_counter()
+        failed = 0
+        total_chunks = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            futures = [pool.submit(self._process, engine, document) for document in todo]
+            for future in as_completed(futures):
+                document, chunks, seconds, error = future.result()
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f"Document {document.id}: failed: {error}")
+                    continue
+                total_chunks += chunks
+                self.stdout.write(f"Document {document.id}: {chunks} chunks in {seconds:.2f}s")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{len(todo) - failed}/{len(todo)} documents, {total_chunks} chunks in {elapsed:.2f}s "
+            f"({len(documents) - len(todo)} skipped, {failed} failed)"
+        )
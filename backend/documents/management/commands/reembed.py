@@ -0,0 +1,12 @@
+from .rechunk import Command as RechunkCommand
+
+
+class Command(RechunkCommand):
+    help = (
+        'Re-embed every chunk of processed documents from the extracted-text cache, '
+        'e.g. after changing the embedding model'
+    )
+    # Every chunk is embedded again (bypassing the chunk embedding store) and the
+    # new vectors replace each document's vector index rather than merge into it,
+    # so this also works after switching to a model of another dimension
+    reuse_vectors = False
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from documents.rag_engine import warmup
+
+
+class Command(BaseCommand):
+    help = 'Load the embedding model, run a dummy encode and report startup time and memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-encode',
+            action='store_true',
+            help='Only load the model weights, skip the dummy encode'
+        )
+
+    def handle(self, *args, **options):
+        report = warmup(encode=not options['no_encode'])
+        for key, value in report.items():
+            self.stdout.write(f"{key}: {value}")
@@ -0,0 +1,247 @@
+"""Per-stage timings and Prometheus metrics.
+
+Code marks the stages of ingestion and answering with ``span(stage)`` (or
+``timed(stage, iterable)`` for a generator that is consumed elsewhere, such
+as the page extractor). Each span records its own time, excluding nested
+spans, so stage times add up instead of counting the same second twice.
+
+Every span is observed in a per-process histogram that ``/metrics``
+exports in the Prometheus text format. When a ``Timings`` collector is
+active (``collect()``, used per request by ``ServerTimingMiddleware`` and
+per document by ``process_document``) the time is also added to it; that is
+where the ``Server-Timing`` header and ``Document.ingest_timings`` come from.
+
+Metrics live in process memory like the cache and dedup stats: with several
+server workers each one has to be scraped.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+STAGES = (
+    'extract', 'clean', 'chunk', 'embed', 'vector_write', 'db_write',
+    'retrieve', 'prompt_build', 'llm',
+)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current = contextvars.ContextVar('rag_timings', default=None)
+_local = threading.local()
+
+
+class Histogram:
+    def __init__(self, name, help_text, label, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, (counts, total, count) in sorted(self._series.items()):
+                label = f'{self.label}="{_escape(label_value)}"'
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{label}}} {total:.6f}')
+                lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+                lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+stage_seconds = Histogram('rag_stage_seconds', 'Time spent per pipeline stage, excluding nested stages', 'stage')
+request_seconds = Histogram('rag_request_seconds', 'API request latency by view', 'view')
+requests_total = Counter('rag_requests_total', 'API requests by view and status code', ('view', 'status'))
+documents_ingested = Counter('rag_documents_ingested_total', 'Documents processed by result', ('result',))
+chunks_stored = Counter('rag_chunks_stored_total', 'Chunks written, by whether they were embedded', ('source',))
+
+REGISTRY = (stage_seconds, request_seconds, requests_total, documents_ingested, chunks_stored)
+
+
+class Timings:
+    """Seconds spent per stage within one request or one document ingest"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        with self._lock:
+            timings = {stage: round(seconds, 4) for stage, seconds in self.stages.items()}
+        timings['total'] = round(self.total(), 4)
+        return timings
+
+    def server_timing(self):
+        """``Server-Timing`` header value (durations in milliseconds)"""
+        with self._lock:
+            parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        parts.append(f"total;dur={self.total() * 1000:.1f}")
+        return ', '.join(parts)
+
+
+@contextmanager
+def collect(timings=None):
+    """Collect the spans of the enclosed code (in this context) into ``timings``"""
+    timings = timings or Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def current_timings():
+    return _current.get()
+
+
+def record(stage, seconds, observe=True):
+    """Add time measured by the caller to the histogram and the active collector"""
+    if observe and settings.RAG_METRICS_ENABLED:
+        stage_seconds.observe(stage, seconds)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _run_span():
+    """Start a frame; returns a function that ends it and gives the exclusive time"""
+    stack = _stack()
+    frame = [time.perf_counter(), 0.0]
+    stack.append(frame)
+
+    def end():
+        stack.pop()
+        elapsed = time.perf_counter() - frame[0]
+        if stack:
+            stack[-1][1] += elapsed
+        return elapsed - frame[1]
+
+    return end
+
+
+@contextmanager
+def span(stage):
+    """Time a block as ``stage``.
+
+    Do not yield from inside a span in a generator; use ``timed`` instead.
+    Spans are tracked per thread, so they are for synchronous code.
+    """
+    end = _run_span()
+    try:
+        yield
+    finally:
+        record(stage, end())
+
+
+def timed(stage, iterable):
+    """Iterate ``iterable``, timing only the work done to produce each item.
+
+    The stage total is observed once the iteration ends.
+    """
+    iterator = iter(iterable)
+    total = 0.0
+    try:
+        while True:
+            end = _run_span()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                seconds = end()
+                total += seconds
+                record(stage, seconds, observe=False)
+            yield item
+    finally:
+        if settings.RAG_METRICS_ENABLED:
+            stage_seconds.observe(stage, total)
+
+
+def exposition():
+    """All metrics of this process in the Prometheus text format"""
+    from . import caching, dedup
+
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.exposition())
+
+    lines += ["# HELP rag_cache_requests_total Query cache lookups by layer and result",
+              "# TYPE rag_cache_requests_total counter"]
+    for layer, counts in caching.stats.snapshot().items():
+        lines.append(f'rag_cache_requests_total{{layer="{layer}",result="hit"}} {counts["hits"]}')
+        lines.append(f'rag_cache_requests_total{{layer="{layer}",result="miss"}} {counts["misses"]}')
+
+    dedup_stats = dedup.stats.snapshot()
+    lines += ["# HELP rag_dedup_uploads_total Uploads, and uploads linked to an existing document",
+              "# TYPE rag_dedup_uploads_total counter",
+              f'rag_dedup_uploads_total{{result="new"}} {dedup_stats["uploads"] - dedup_stats["uploads_deduplicated"]}',
+              f'rag_dedup_uploads_total{{result="deduplicated"}} {dedup_stats["uploads_deduplicated"]}']
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in REGISTRY:
+        metric.reset()
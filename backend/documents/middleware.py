@@ -0,0 +1,83 @@
+import cProfile
+import logging
+import os
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ServerTimingMiddleware:
+    """Collects stage spans per request.
+
+    Adds a ``Server-Timing`` header with the time of each stage, records the
+    request in the ``/metrics`` histograms and, for a sampled fraction of
+    synchronous requests, runs cProfile and keeps the profile if the request
+    turned out slow. For streamed answers the header covers the work done
+    before the first byte.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        profiler = self._start_profiler()
+        with metrics.collect() as timings:
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        self._finish(request, response, timings, profiler)
+        return response
+
+    async def __acall__(self, request):
+        with metrics.collect() as timings:
+            response = await self.get_response(request)
+        self._finish(request, response, timings, None)
+        return response
+
+    def _start_profiler(self):
+        rate = settings.RAG_PROFILE_SAMPLE_RATE
+        if rate <= 0 or random.random() >= rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            return None
+        return profiler
+
+    def _finish(self, request, response, timings, profiler):
+        seconds = timings.total()
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name or match.view_name if match else 'unmatched'
+
+        if settings.RAG_SERVER_TIMING_ENABLED:
+            response['Server-Timing'] = timings.server_timing()
+        if settings.RAG_METRICS_ENABLED:
+            metrics.request_seconds.observe(view, seconds)
+            metrics.requests_total.inc(view, str(response.status_code))
+
+        if profiler is not None and seconds * 1000 >= settings.RAG_PROFILE_SLOW_MS:
+            os.makedirs(settings.RAG_PROFILE_DIR, exist_ok=True)
+            path = os.path.join(
+                settings.RAG_PROFILE_DIR,
+                f"{time.strftime('%Y%m%d-%H%M%S')}-{view}-{round(seconds * 1000)}ms.prof"
+            )
+            profiler.dump_stats(path)
+            logger.warning("Slow request %s %s took %.0f ms, profile saved to %s",
+                           request.method, request.path, seconds * 1000, path)
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='index_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,31 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_document_index_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='ChunkEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=150)),
+                ('text_hash', models.CharField(max_length=64)),
+                ('dim', models.IntegerField()),
+                ('vector', models.BinaryField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('model_name', 'text_hash')},
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_content_hash_chunkembedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='centroid',
+            field=models.BinaryField(blank=True, editable=False, null=True),
+        ),
+    ]
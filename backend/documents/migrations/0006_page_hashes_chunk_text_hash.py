@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_document_centroid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='page_hashes',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='text_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_page_hashes_chunk_text_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='ingest_timings',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,50 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_document_ingest_timings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_number', models.IntegerField()),
+                ('codec', models.CharField(max_length=8)),
+                ('text', models.BinaryField()),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='page_texts', to='documents.document')),
+            ],
+            options={
+                'unique_together': {('document', 'page_number')},
+            },
+        ),
+        migrations.AlterField(
+            model_name='documentchunk',
+            name='text_content',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AlterField(
+            model_name='documentchunk',
+            name='embedding_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='page',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='documents.documentpage'),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='char_start',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='char_length',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.utils import timezone
 
@@ -7,7 +9,18 @@ class Document(models.Model):
     file_path = models.FileField(upload_to='documents/')
     file_type = models.CharField(max_length=10)
     file_size = models.IntegerField()
+    # SHA-256 of the uploaded bytes, used to detect duplicate uploads
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
     pages_count = models.IntegerField(default=0)
+    # Bumped every time the document is (re)indexed; part of query cache keys
+    index_version = models.IntegerField(default=0)
+    # Unit-length mean of the chunk embeddings (float32 bytes), used to route
+    # corpus-wide questions to the most relevant documents
+    centroid = models.BinaryField(blank=True, null=True, editable=False)
+    # Hash of every extracted page, in order, from the last (re)processing
+    page_hashes = models.JSONField(default=list, blank=True, editable=False)
+    # Seconds per stage (extract, chunk, embed, ...) of the last ingest run
+    ingest_timings = models.JSONField(default=dict, blank=True, editable=False)
 
     processing_status = models.CharField(
         max_length=20,
@@ -27,6 +40,24 @@ class Document(models.Model):
         return self.title
 
 
+class DocumentPage(models.Model):
+    """Cleaned text of one page, compressed (``RAG_CHUNK_TEXT_STORAGE=pages``)"""
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name='page_texts'
+    )
+    page_number = models.IntegerField()
+    codec = models.CharField(max_length=8)
+    text = models.BinaryField()
+
+    class Meta:
+        unique_together = ('document', 'page_number')
+
+    def __str__(self):
+        return f"{self.document.title} - Page {self.page_number}"
+
+
 class DocumentChunk(models.Model):
     document = models.ForeignKey(
         Document,
@@ -34,9 +65,23 @@ class DocumentChunk(models.Model):
         related_name='chunks'
     )
     chunk_index = models.IntegerField()
-    text_content = models.TextField()
+    # Empty when the text is the span [char_start, char_start + char_length)
+    # of ``page``; see documents/chunk_text.py
+    text_content = models.TextField(blank=True, default='')
     page_number = models.IntegerField(default=1)
-    embedding_id = models.CharField(max_length=255, blank=True, null=True)
+    page = models.ForeignKey(
+        DocumentPage,
+        on_delete=models.CASCADE,
+        related_name='chunks',
+        blank=True,
+        null=True
+    )
+    char_start = models.IntegerField(blank=True, null=True)
+    char_length = models.IntegerField(blank=True, null=True)
+    embedding_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
+    # Hash of the normalized text; unchanged chunks keep their embedding_id
+    # when the document is reprocessed
+    text_hash = models.CharField(max_length=64, blank=True, default='')
     created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
@@ -44,3 +89,75 @@ class DocumentChunk(models.Model):
 
     def __str__(self):
         return f"{self.document.title} - Chunk {self.chunk_index}"
+
+
+class IngestionJob(models.Model):
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name='jobs'
+    )
+
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('queued', 'Queued'),
+            ('running', 'Running'),
+            ('succeeded', 'Succeeded'),
+            ('failed', 'Failed'),
+        ],
+        default='queued',
+        db_index=True
+    )
+    stage = models.CharField(max_length=30, default='queued')
+    chunks_total = models.IntegerField(default=0)
+    chunks_embedded = models.IntegerField(default=0)
+
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True, default='')
+
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    stage_started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.document.title} - Job {self.id} ({self.status})"
+
+
+class UploadSession(models.Model):
+    """A resumable upload in progress (see documents/uploads.py)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_name = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=10)
+    # Declared total size; counts against UPLOAD_MAX_TOTAL_BYTES until done
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    # Type sniffed from the first bytes, once enough of them have arrived
+    detected_type = models.CharField(max_length=10, blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.file_name} ({self.received}/{self.size} bytes)"
+
+
+class ChunkEmbedding(models.Model):
+    """Embedding of a chunk text, shared by every document containing it"""
+    model_name = models.CharField(max_length=150)
+    text_hash = models.CharField(max_length=64)
+    dim = models.IntegerField()
+    vector = models.BinaryField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('model_name', 'text_hash')
+
+    def __str__(self):
+        return f"{self.model_name} - {self.text_hash[:12]}"
@@ -1,28 +1,142 @@
+import logging
 import os
 import re
-import chromadb
-from sentence_transformers import SentenceTransformer
-import openai
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import numpy as np
 from django.conf import settings
-from .models import Document, DocumentChunk
-import PyPDF2
-from docx import Document as DocxDocument
-import fitz  # PyMuPDF - better PDF extraction
-from pdfplumber import PDF  # Alternative PDF library
+from django.db import connections, transaction
+from .models import Document, DocumentChunk, DocumentPage
+from .embeddings import (
+    encode_texts, get_embedding_model, get_tokenizer, embedding_model_load_seconds, embedding_model_name,
+    max_sequence_tokens
+)
+from .runtime import memory_usage
+from . import caching
+from . import metrics
+from .semantic_cache import semantic_cache
+from . import dedup
+from . import chunk_text
+from .extraction import PageExtractor
+from .chunking import TokenChunker, as_chunk
+from .vector_stores import create_vector_store, document_id_from_chunk_id
+from .llm_service import LLMOverloaded, get_llm_client
+from .context import Candidate, assemble_context, get_prompt_tokenizer
+from .lexical import LexicalStore, is_identifier, query_terms, reciprocal_rank_fusion
+from .routing import centroid_bytes, document_router, unit_rows_sum
+from .text_cache import TextCache
+from .metrics import span, timed
+
+logger = logging.getLogger(__name__)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+_CHUNK_NUMBER = re.compile(r'_chunk_(\d+)$')
+
+
+def _noop_progress(stage, done, total):
+    pass
+
+
+def _total_unknown(done):
+    return done
+
+
+def get_rag_engine():
+    """Return the process-wide RAGEngine, creating it on first use"""
+    global _engine
+
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RAGEngine()
+    return _engine
+
+
+def reset_rag_engine():
+    """Drop the shared engine so the next call rebuilds it from settings"""
+    global _engine
+    with _engine_lock:
+        _engine = None
+
+
+def warmup(encode=True):
+    """Load the embedding model ahead of the first request.
+
+    With ``encode`` a dummy sentence is also embedded so lazy kernel and
+    tokenizer initialisation is paid up front. Returns a small report with
+    timings and the process memory footprint.
+    """
+    started = time.perf_counter()
+    engine = get_rag_engine()
+    if not settings.EMBEDDING_SERVER_ADDRESS:
+        # With an embedding server the model lives there, not in this process
+        engine.embedding_model
+
+    encode_seconds = None
+    if encode:
+        encode_started = time.perf_counter()
+        engine.embed_texts(["warmup"])
+        encode_seconds = round(time.perf_counter() - encode_started, 3)
+
+    load_seconds = embedding_model_load_seconds()
+    report = {
+        'model': embedding_model_name(),
+        'backend': settings.RAG_EMBEDDING_BACKEND,
+        'model_load_seconds': round(load_seconds, 3) if load_seconds is not None else None,
+        'warmup_encode_seconds': encode_seconds,
+        'total_seconds': round(time.perf_counter() - started, 3),
+    }
+    report.update(memory_usage())
+    return report
 
 
 class RAGEngine:
     def __init__(self):
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.chroma_client = chromadb.PersistentClient(path="./chroma_db")
-        self.collection = self.chroma_client.get_or_create_collection(name="documents")
-
-        # Setup OpenAI or LM Studio
-        if settings.OPENAI_API_KEY:
-            openai.api_key = settings.OPENAI_API_KEY
-        else:
-            openai.api_base = settings.LM_STUDIO_BASE_URL
-            openai.api_key = "lm-studio"
+        self._chroma_client = None
+        self._collection = None
+        self._chroma_pid = None
+        self._chroma_lock = threading.Lock()
+        self.vector_store = create_vector_store(
+            settings.RAG_VECTOR_STORE,
+            get_collection=lambda: self.collection,
+            root=settings.RAG_VECTOR_INDEX_DIR,
+            dtype=settings.RAG_VECTOR_DTYPE
+        )
+        self.lexical_index = LexicalStore(
+            settings.RAG_LEXICAL_INDEX_DIR,
+            k1=settings.RAG_BM25_K1,
+            b=settings.RAG_BM25_B
+        )
+        self.text_cache = None
+        if settings.RAG_TEXT_CACHE_ENABLED:
+            self.text_cache = TextCache(settings.RAG_TEXT_CACHE_DIR, codec=settings.RAG_TEXT_CACHE_CODEC)
+
+    @property
+    def llm(self):
+        return get_llm_client()
+
+    @property
+    def embedding_model(self):
+        return get_embedding_model()
+
+    @property
+    def collection(self):
+        # The Chroma client holds SQLite handles that must not cross a fork,
+        # so it is opened lazily and reopened if we find ourselves in a child.
+        if self._collection is None or self._chroma_pid != os.getpid():
+            with self._chroma_lock:
+                if self._collection is None or self._chroma_pid != os.getpid():
+                    import chromadb
+
+                    self._chroma_client = chromadb.PersistentClient(path=settings.CHROMA_DB_PATH)
+                    self._collection = self._chroma_client.get_or_create_collection(name=settings.CHROMA_COLLECTION)
+                    self._chroma_pid = os.getpid()
+        return self._collection
 
     def clean_extracted_text(self, text):
         """Clean and normalize extracted text"""
@@ -50,77 +164,95 @@ class RAGEngine:
 
         return text.strip()
 
+    def open_pages(self, file_path, file_type, content_hash=None):
+        """Open a file for page-by-page extraction (see PageExtractor).
+
+        With the file's ``content_hash`` pages come from the extracted-text
+        cache when present, and are recorded into it otherwise.
+        """
+        extractor = PageExtractor(
+            file_path,
+            file_type,
+            text_page_chars=settings.RAG_TEXT_PAGE_CHARS,
+            parallel_workers=settings.PDF_PARALLEL_WORKERS,
+            parallel_min_pages=settings.PDF_PARALLEL_MIN_PAGES,
+            pages_per_task=settings.PDF_PARALLEL_PAGES_PER_TASK
+        )
+        if self.text_cache is None or not content_hash:
+            return extractor
+        return self.text_cache.open(self.text_cache_key(content_hash, file_type), extractor)
+
+    def text_cache_key(self, content_hash, file_type):
+        return self.text_cache.key(content_hash, file_type, settings.RAG_TEXT_PAGE_CHARS)
+
+    def has_cached_text(self, document):
+        """True when the document's pages can be replayed from the cache"""
+        return (
+            self.text_cache is not None
+            and bool(document.content_hash)
+            and self.text_cache.get(self.text_cache_key(document.content_hash, document.file_type)) is not None
+        )
+
     def extract_text_from_file(self, file_path, file_type):
-        """Extract text content from different file formats with better quality"""
+        """Extract the whole text content of a file in one string.
+
+        Kept for callers that need the full text; ingestion streams pages
+        through ``iter_page_chunks`` instead.
+        """
         text = ""
         pages_count = 1
 
         try:
-            if file_type.lower() == 'txt':
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    text = file.read()
-                pages_count = 1
-
-            elif file_type.lower() == 'pdf':
-                text = self.extract_pdf_text_advanced(file_path)
-                with open(file_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    pages_count = len(pdf_reader.pages)
-
-            elif file_type.lower() in ['docx', 'doc']:
-                doc = DocxDocument(file_path)
-                pages_count = 1
-                paragraphs = [p.text.strip() for p in doc.paragraphs if p.text.strip()]
-                text = '\n\n'.join(paragraphs)
-
+            with self.open_pages(file_path, file_type) as extractor:
+                text = "\n".join(page_text for _, page_text in extractor.pages())
+                pages_count = extractor.page_count
         except Exception as e:
-            print(f"Error extracting text: {str(e)}")
+            logger.error("Error extracting text: %s", e)
 
         text = self.clean_extracted_text(text)
         return text, pages_count
 
     def extract_pdf_text_advanced(self, file_path):
-        """Advanced PDF text extraction using multiple methods"""
-        text = ""
-
-        try:
-            import fitz
-            doc = fitz.open(file_path)
-            for page in doc:
-                text += page.get_text() + "\n"
-            doc.close()
-            if text.strip():
-                return text
-        except ImportError:
-            print("PyMuPDF not installed, falling back to PyPDF2")
-        except Exception as e:
-            print(f"PyMuPDF extraction failed: {e}")
-
-        try:
-            import pdfplumber
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            if text.strip():
-                return text
-        except ImportError:
-            print("pdfplumber not installed, falling back to PyPDF2")
-        except Exception as e:
-            print(f"pdfplumber extraction failed: {e}")
-
-        try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-        except Exception as e:
-            print(f"PyPDF2 extraction failed: {e}")
-
-        return text
+        """PDF text extraction with per-page fallback between libraries"""
+        with self.open_pages(file_path, 'pdf') as extractor:
+            return "".join(page_text + "\n" for _, page_text in extractor.pages())
+
+    def iter_clean_pages(self, extractor, page_hashes=None, page_texts=None):
+        """Yield (page_number, cleaned_text) for pages that have text.
+
+        If ``page_hashes`` is a list, the hash of every yielded page is
+        appended to it; if ``page_texts`` is, the yielded pair is.
+        """
+        for page_number, page_text in timed('extract', extractor.pages()):
+            with span('clean'):
+                text = self.clean_extracted_text(page_text)
+            if text:
+                if page_hashes is not None:
+                    page_hashes.append(dedup.chunk_text_hash(text))
+                if page_texts is not None:
+                    page_texts.append((page_number, text))
+                yield page_number, text
+
+    def get_chunker(self, section_profile=None):
+        return TokenChunker(
+            get_tokenizer(),
+            max_tokens=max_sequence_tokens(),
+            overlap_tokens=settings.RAG_CHUNK_OVERLAP_TOKENS,
+            section_profile=section_profile or settings.RAG_SECTION_PROFILE
+        )
+
+    def iter_page_chunks(self, extractor, section_profile=None, page_hashes=None, page_texts=None):
+        """Yield chunks while pages are being extracted"""
+        pages = self.iter_clean_pages(extractor, page_hashes, page_texts)
+        if settings.RAG_CHUNKER == 'legacy':
+            chunks = (
+                (page_number, chunk)
+                for page_number, text in pages
+                for chunk in self.chunk_text(text)
+            )
+        else:
+            chunks = self.get_chunker(section_profile).chunk_pages(pages)
+        yield from timed('chunk', chunks)
 
     def chunk_text(self, text, chunk_size=500, overlap=50):
         """Split text into meaningful chunks with better handling"""
@@ -217,71 +349,682 @@ class RAGEngine:
 
         return chunks
 
-    def process_document(self, document):
-        """Process document and create embeddings"""
-        try:
-            document.processing_status = 'processing'
-            document.save()
+    def process_document(self, document, progress=None, reuse_vectors=True):
+        """Process document and create embeddings.
 
-            text, pages_count = self.extract_text_from_file(
-                document.file_path.path,
-                document.file_type
-            )
+        ``progress`` is an optional callable ``progress(stage, done, total)``
+        used by the ingestion worker to report how far along the run is.
+        Page text comes from the extracted-text cache when the file was
+        extracted before. With ``reuse_vectors`` False every chunk is
+        embedded again (after an embedding model change). The time spent in
+        each stage is saved in ``document.ingest_timings``.
+        """
+        if progress is None:
+            progress = _noop_progress
 
-            if not text.strip():
-                document.processing_status = 'failed'
+        with metrics.collect() as timings:
+            try:
+                document.processing_status = 'processing'
                 document.save()
-                raise Exception("No text content found in document")
-
-            document.pages_count = pages_count
-            document.save()
-
-            chunks = self.chunk_text(text)
+                caching.invalidate_document(document)
+
+                progress('extracting', 0, 0)
+
+                if not document.content_hash and self.text_cache is not None:
+                    document.content_hash = dedup.hash_file(document.file_path.path)
+                with self.open_pages(document.file_path.path, document.file_type, document.content_hash) as extractor:
+                    document.pages_count = extractor.page_count or 0
+                    document.save()
+
+                    def estimate_total(done):
+                        # Chunks per page so far, extrapolated to the whole document
+                        if not extractor.page_count or not extractor.pages_done:
+                            return done
+                        return max(done, round(done * extractor.page_count / extractor.pages_done))
+
+                    page_hashes = []
+                    page_texts = [] if chunk_text.stores_pages() else None
+                    chunk_count = self.store_chunks(
+                        document,
+                        self.iter_page_chunks(extractor, page_hashes=page_hashes, page_texts=page_texts),
+                        progress=progress,
+                        estimate_total=estimate_total,
+                        reuse_vectors=reuse_vectors,
+                        pages=page_texts
+                    )
+
+                if not extractor.chars_extracted:
+                    raise Exception("No text content found in document")
+                if not chunk_count:
+                    raise Exception("No chunks created from document")
+
+                if document.page_hashes:
+                    changed = self.changed_pages(document.page_hashes, page_hashes)
+                    logger.info("Document %s: %d/%d pages changed", document.id, len(changed), len(page_hashes))
+                document.page_hashes = page_hashes
+                document.pages_count = extractor.page_count
+                document.processing_status = 'completed'
+                document.ingest_timings = timings.as_dict()
+                document.save()
+                metrics.documents_ingested.inc('completed')
 
-            if not chunks:
+            except Exception as e:
                 document.processing_status = 'failed'
+                document.ingest_timings = timings.as_dict()
                 document.save()
-                raise Exception("No chunks created from document")
-
-            for i, chunk_text in enumerate(chunks):
-                embedding = self.embedding_model.encode([chunk_text])[0]
-                chunk_id = f"doc_{document.id}_chunk_{i}"
-
-                metadata = {
-                    "document_id": document.id,
-                    "chunk_index": i,
-                    "document_title": document.title
-                }
-
-                self.collection.add(
-                    embeddings=[embedding.tolist()],
-                    documents=[chunk_text],
-                    ids=[chunk_id],
-                    metadatas=[metadata]
-                )
-
-                DocumentChunk.objects.create(
-                    document=document,
-                    chunk_index=i,
-                    text_content=chunk_text,
-                    page_number=1,
-                    embedding_id=chunk_id
-                )
-
-            document.processing_status = 'completed'
-            document.save()
+                metrics.documents_ingested.inc('failed')
+                logger.exception("Error processing document %s: %s", document.id, e)
+                raise e
+
+    def changed_pages(self, old_hashes, new_hashes):
+        """Positions (1-based) of pages whose text is new or edited"""
+        old = set(old_hashes)
+        return [i for i, page_hash in enumerate(new_hashes, start=1) if page_hash not in old]
+
+    def embed_texts(self, texts, batch_size=None, normalize=None):
+        """Encode a list of texts in batches and return an embedding matrix"""
+        return encode_texts(texts, batch_size=batch_size, normalize=normalize)
+
+    def embed_chunks(self, texts, reuse=True):
+        """Return (embeddings, reused_count), reusing stored chunk embeddings
+        unless ``reuse`` is False"""
+        normalize = settings.RAG_NORMALIZE_EMBEDDINGS
+        if not settings.RAG_CHUNK_EMBEDDING_STORE_ENABLED:
+            return self.embed_texts(texts, normalize=normalize), 0
+        return dedup.embed_with_store(
+            texts,
+            lambda missing: self.embed_texts(missing, normalize=normalize),
+            normalize,
+            reuse=reuse
+        )
+
+    def previous_chunks(self, document):
+        """Chunk ids already stored for a document, grouped by text hash in
+        chunk order, so a reprocessing run can reuse them"""
+        previous = {}
+        rows = (
+            DocumentChunk.objects
+            .filter(document=document)
+            .order_by('chunk_index')
+            .values_list('embedding_id', 'text_hash', 'text_content')
+        )
+        for chunk_id, text_hash, text in rows:
+            if chunk_id:
+                previous.setdefault(text_hash or dedup.chunk_text_hash(text), deque()).append(chunk_id)
+        return previous
+
+    def next_chunk_number(self, chunk_ids):
+        """First free N for new ``doc_<id>_chunk_<N>`` ids"""
+        numbers = [int(match.group(1)) for match in map(_CHUNK_NUMBER.search, chunk_ids) if match]
+        return max(numbers) + 1 if numbers else 0
+
+    def store_chunks(self, document, chunks, progress=None, estimate_total=None, reuse_vectors=True,
+                     pages=None):
+        """Embed chunks in batches and write vectors and rows in bulk.
+
+        ``chunks`` is an iterable of ``Chunk`` objects or ``(page_number,
+        text)`` pairs (plain strings are treated as page 1) and is consumed one
+        batch at a time, so a streaming source is never held in memory as a
+        whole.
+
+        When the document already has chunks (reprocessing), a new chunk whose
+        text hash matches an old one keeps its ``embedding_id`` and stored
+        vector; only changed chunks are embedded, and old chunks that are
+        gone are removed from the vector store and the lexical index
+        afterwards. A stored vector is only reused when it was made in the
+        current embedding space. With ``reuse_vectors`` False every chunk is
+        embedded again and the new vectors replace the document's vector
+        index as a whole instead of being merged into it, so a re-embed also
+        works when the model's dimension changed.
+
+        ``pages`` is the list the chunk source appends ``(page_number,
+        text)`` to (see ``iter_clean_pages``) when chunk text is stored once
+        per page: it is drained into ``DocumentPage`` rows with every batch,
+        chunk rows only reference their span and vectors are added without
+        text.
+
+        Chunk rows are written inside a single transaction. If anything fails
+        the transaction is rolled back and so is the vector store: vectors
+        new in this run are deleted again and the stored rows of kept chunks,
+        whose metadata a store that writes immediately (Chroma) has already
+        overwritten, are restored.
+        On success ``document.centroid`` is set for corpus routing; the caller
+        saves the document.
+        """
+        if progress is None:
+            progress = _noop_progress
+        if estimate_total is None:
+            estimate_total = _total_unknown
+
+        ingest_batch_size = settings.RAG_INGEST_BATCH_SIZE
+        chunks = (as_chunk(chunk) for chunk in chunks)
+        previous = self.previous_chunks(document)
+        old_ids = {chunk_id for chunk_ids in previous.values() for chunk_id in chunk_ids}
+        next_number = self.next_chunk_number(old_ids)
+        kept_ids = set()
+        written_ids = []
+        reused_total = 0
+        start = 0
+        vector_sum = None
+        page_ids = {}
+        space = dedup.embedding_space(settings.RAG_NORMALIZE_EMBEDDINGS)
+        progress('embedding', 0, 0)
 
+        try:
+            with transaction.atomic():
+                with span('db_write'):
+                    if old_ids:
+                        DocumentChunk.objects.filter(document=document).delete()
+                    DocumentPage.objects.filter(document=document).delete()
+
+                while True:
+                    batch = list(islice(chunks, ingest_batch_size))
+                    if not batch:
+                        break
+
+                    texts = [chunk.text for chunk in batch]
+                    hashes = [dedup.chunk_text_hash(text) for text in texts]
+                    indexes = range(start, start + len(batch))
+
+                    chunk_ids = []
+                    for text_hash in hashes:
+                        pool = previous.get(text_hash)
+                        if pool:
+                            chunk_ids.append(pool.popleft())
+                        else:
+                            chunk_ids.append(f"doc_{document.id}_chunk_{next_number}")
+                            next_number += 1
+
+                    vectors = {}
+                    unchanged = [chunk_id for chunk_id in chunk_ids if chunk_id in old_ids]
+                    if unchanged and reuse_vectors:
+                        stored = self.vector_store.get(unchanged, include_embeddings=True)
+                        # Vectors written before spaces were recorded are assumed current
+                        vectors = {
+                            chunk_id: vector
+                            for chunk_id, vector, metadata in zip(
+                                stored['ids'], stored['embeddings'], stored['metadatas']
+                            )
+                            if metadata.get('embedding_space', space) == space
+                        }
+                    to_embed = [row for row, chunk_id in enumerate(chunk_ids) if chunk_id not in vectors]
+                    if to_embed:
+                        with span('embed'):
+                            embedded, reused = self.embed_chunks(
+                                [texts[row] for row in to_embed],
+                                reuse=reuse_vectors
+                            )
+                        reused_total += reused
+                        vectors.update((chunk_ids[row], vector) for row, vector in zip(to_embed, embedded))
+                    kept_ids.update(set(chunk_ids) & old_ids)
+                    reused_total += len(chunk_ids) - len(to_embed)
+                    embeddings = np.vstack([np.asarray(vectors[chunk_id], dtype=np.float32) for chunk_id in chunk_ids])
+
+                    batch_sum = unit_rows_sum(embeddings)
+                    vector_sum = batch_sum if vector_sum is None else vector_sum + batch_sum
+
+                    metadatas = [
+                        {
+                            "document_id": document.id,
+                            "chunk_index": i,
+                            "page_number": chunk.page_number,
+                            "char_start": chunk.char_start if chunk.char_start is not None else -1,
+                            "document_title": document.title,
+                            "embedding_space": space
+                        }
+                        for i, chunk in zip(indexes, batch)
+                    ]
+
+                    with span('vector_write'):
+                        self.vector_store.add(chunk_ids, embeddings, None if pages is not None else texts, metadatas)
+                        self.lexical_index.add(chunk_ids, texts)
+                    written_ids.extend(chunk_id for chunk_id in chunk_ids if chunk_id not in old_ids)
+
+                    with span('db_write'):
+                        if pages:
+                            page_ids.update(chunk_text.store_pages(document, pages))
+                            pages.clear()
+                        DocumentChunk.objects.bulk_create([
+                            chunk_text.chunk_row(document, i, chunk, chunk_id, text_hash, page_ids)
+                            for i, chunk, chunk_id, text_hash in zip(indexes, batch, chunk_ids, hashes)
+                        ])
+                    start += len(batch)
+                    progress('embedding', start, estimate_total(start))
+
+                if pages:
+                    with span('db_write'):
+                        chunk_text.store_pages(document, pages)
+                        pages.clear()
+                with span('vector_write'):
+                    self.vector_store.commit(document.id, replace=not reuse_vectors)
+                    self.lexical_index.commit(document.id)
+        except Exception:
+            try:
+                self.vector_store.rollback(document.id)
+                self.lexical_index.rollback(document.id)
+                if written_ids:
+                    # In case the failure came after the commits above
+                    self.vector_store.delete(ids=written_ids)
+                    self.lexical_index.delete(ids=written_ids)
+            except Exception as cleanup_error:
+                logger.warning("Failed to remove vectors after ingest error: %s", cleanup_error)
+            raise
+
+        removed_ids = sorted(old_ids - kept_ids)
+        if removed_ids:
+            with span('vector_write'):
+                self.vector_store.delete(ids=removed_ids)
+                self.lexical_index.delete(ids=removed_ids)
+        if old_ids:
+            logger.info(
+                "Document %s: kept %d unchanged chunks, embedded %d new, removed %d",
+                document.id, len(kept_ids), len(written_ids), len(removed_ids)
+            )
+
+        document.centroid = centroid_bytes(vector_sum) if vector_sum is not None else None
+        progress('embedding', start, start)
+        metrics.chunks_stored.inc('reused', amount=reused_total)
+        metrics.chunks_stored.inc('embedded', amount=start - reused_total)
+        if reused_total:
+            logger.info("Document %s: reused stored embeddings for %d/%d chunks", document.id, reused_total, start)
+        return start
+
+    def remove_document_index(self, document_id):
+        """Drop every vector and lexical posting of a document"""
+        self.vector_store.delete(document_id=document_id)
+        self.lexical_index.delete(document_id=document_id)
+        semantic_cache.invalidate(document_id)
+
+    def delete_document(self, document):
+        """Delete a document with its chunks, jobs, vectors and file.
+
+        Rows go first, in a transaction; the index is dropped once it
+        commits. If that fails the vectors are orphans that ``manage.py
+        gc_vectors`` removes later.
+        """
+        document_id = document.id
+        stored_file = document.file_path
+        content_hash = document.content_hash
+        with transaction.atomic():
+            document.delete()
+            transaction.on_commit(lambda: self._remove_after_delete(document_id, stored_file, content_hash))
+
+    def _remove_after_delete(self, document_id, stored_file, content_hash):
+        try:
+            self.remove_document_index(document_id)
         except Exception as e:
-            document.processing_status = 'failed'
-            document.save()
-            print(f"Error processing document: {str(e)}")
-            raise e
+            logger.warning("Failed to remove index of deleted document %s: %s", document_id, e)
+        if self.text_cache is not None and content_hash:
+            # Another document with the same file still reads the cached text
+            if not Document.objects.filter(content_hash=content_hash).exists():
+                self.text_cache.remove(content_hash)
+        if stored_file and stored_file.name:
+            stored_file.storage.delete(stored_file.name)
+
+    def embed_question(self, question):
+        """Return the embedding for a question, using the embedding cache"""
+        return self.embed_questions([question])[0]
+
+    def embed_questions(self, questions):
+        """Embed several questions, encoding all cache misses in one call"""
+        normalize = settings.RAG_NORMALIZE_EMBEDDINGS
+        embeddings = [caching.get_question_embedding(question, normalize) for question in questions]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            with span('embed'):
+                encoded = self.embed_texts([questions[i] for i in missing], normalize=normalize)
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding
+                caching.set_question_embedding(questions[i], normalize, embedding)
+        return embeddings
+
+    def needs_candidate_embeddings(self):
+        return settings.RAG_CONTEXT_DEDUP_THRESHOLD < 1 or settings.RAG_CONTEXT_MMR_LAMBDA is not None
+
+    def candidate_count(self, num_chunks):
+        """How many chunks to retrieve so context assembly has room to choose"""
+        if self.needs_candidate_embeddings():
+            return num_chunks * max(1, settings.RAG_CONTEXT_OVERFETCH)
+        return num_chunks
+
+    def hydrate_candidates(self, chunk_ids, with_embeddings, texts=True):
+        """Return {chunk_id: Candidate} for stored chunks, fetched from the
+        vector store in one call; unknown ids are left out. With ``texts``
+        False, texts the vector store does not hold are left None."""
+        if not chunk_ids:
+            return {}
+        stored = self.vector_store.get(list(chunk_ids), include_embeddings=with_embeddings)
+        embeddings = stored['embeddings'] if with_embeddings else [None] * len(stored['ids'])
+        found = {
+            chunk_id: Candidate(
+                chunk_id,
+                text,
+                metadata.get('page_number', 1),
+                metadata.get('chunk_index', 0),
+                None,
+                embedding
+            )
+            for chunk_id, text, metadata, embedding in zip(
+                stored['ids'], stored['documents'], stored['metadatas'], embeddings
+            )
+        }
+        return self.with_texts(found) if texts else found
+
+    def with_texts(self, candidates):
+        """Fill in the texts of {chunk_id: Candidate} that the vector store
+        does not hold (``RAG_CHUNK_TEXT_STORAGE=pages``) with one database
+        query; candidates whose chunk no longer exists are dropped"""
+        missing = [chunk_id for chunk_id, candidate in candidates.items() if candidate.text is None]
+        if not missing:
+            return candidates
+        texts = chunk_text.fetch_texts(missing)
+        return {
+            chunk_id: candidate if candidate.text is not None else candidate._replace(text=texts[chunk_id])
+            for chunk_id, candidate in candidates.items()
+            if candidate.text is not None or chunk_id in texts
+        }
+
+    def lexical_fast_path(self, document, question, num_chunks):
+        """Candidates for a short identifier lookup from BM25 alone, or None.
+
+        Used when the question has at most RAG_LEXICAL_FAST_PATH_MAX_TERMS
+        words, names at least one identifier (an email, a phone number, a
+        token with digits or symbols) and every one of its terms occurs in
+        the document, so the embedding model is not needed at all. Questions
+        of plain words ("what is her experience") always go through vector
+        search, which also finds their paraphrases.
+        """
+        if not (settings.RAG_HYBRID_ENABLED and settings.RAG_LEXICAL_FAST_PATH):
+            return None
+        if len(question.split()) > settings.RAG_LEXICAL_FAST_PATH_MAX_TERMS:
+            return None
+        terms = query_terms(question)
+        if not any(is_identifier(term) for term in terms):
+            return None
+        if not self.lexical_index.has_terms(document.id, terms):
+            return None
+        chunk_ids = [chunk_id for chunk_id, _ in self.lexical_index.search(document.id, terms, num_chunks)]
+        found = self.hydrate_candidates(chunk_ids, with_embeddings=False)
+        return [found[chunk_id] for chunk_id in chunk_ids if chunk_id in found] or None
+
+    def _query_candidates(self, found, row, with_embeddings):
+        """Candidates of one query row of a vector store result"""
+        if not found['ids'] or row >= len(found['ids']):
+            return []
+        ids = found['ids'][row]
+        embeddings = found['embeddings'][row] if with_embeddings else [None] * len(ids)
+        return [
+            Candidate(
+                chunk_id,
+                text,
+                metadata.get('page_number', 1),
+                metadata.get('chunk_index', 0),
+                distance,
+                embedding
+            )
+            for chunk_id, text, metadata, distance, embedding in zip(
+                ids, found['documents'][row], found['metadatas'][row], found['distances'][row], embeddings
+            )
+        ]
+
+    @span('retrieve')
+    def retrieve(self, document, questions, num_chunks):
+        """Retrieve context candidates for questions about one document.
+
+        Returns one ``(question_embedding, candidates, mode)`` per question.
+        Keyword questions answered by the lexical fast path have mode
+        'lexical' and no embedding; all others are embedded in one call and
+        retrieved together ('hybrid' or 'vector').
+        """
+        num_candidates = self.candidate_count(num_chunks)
+        results = [None] * len(questions)
+        for i, question in enumerate(questions):
+            candidates = self.lexical_fast_path(document, question, num_candidates)
+            if candidates is not None:
+                results[i] = (None, candidates, 'lexical')
+
+        rest = [i for i, result in enumerate(results) if result is None]
+        if rest:
+            rest_questions = [questions[i] for i in rest]
+            embeddings = self.embed_questions(rest_questions)
+            retrieved = self.retrieve_chunks_batch(document, embeddings, num_candidates, questions=rest_questions)
+            mode = 'hybrid' if settings.RAG_HYBRID_ENABLED else 'vector'
+            for i, embedding, candidates in zip(rest, embeddings, retrieved):
+                results[i] = (embedding, candidates, mode)
+        return results
+
+    def retrieve_chunks(self, document, question_embedding, num_chunks, question=None):
+        """Return the Candidates closest to the question, best first"""
+        questions = [question] if question is not None else None
+        return self.retrieve_chunks_batch(document, [question_embedding], num_chunks, questions=questions)[0]
+
+    @span('retrieve')
+    def retrieve_chunks_batch(self, document, question_embeddings, num_chunks, questions=None):
+        """Return one list of Candidates (best first) per question embedding.
+
+        All embeddings not in the retrieval cache are sent to the vector
+        store in one query. When the question texts are given and hybrid
+        retrieval is on, each vector ranking is merged with the document's
+        BM25 ranking by reciprocal rank fusion. Chunks not returned by the
+        vector store are hydrated with a single database lookup; candidate
+        embeddings are fetched only when context assembly needs them.
+        """
+        with_embeddings = self.needs_candidate_embeddings()
+        hybrid = questions is not None and settings.RAG_HYBRID_ENABLED
+        ranked = {}
+        for i, embedding in enumerate(question_embeddings):
+            chunk_ids = caching.get_retrieval(document, embedding, num_chunks)
+            if chunk_ids is not None:
+                ranked[i] = chunk_ids
+
+        known = {}
+        missing = [i for i in range(len(question_embeddings)) if i not in ranked]
+        chunk_count = document.chunks.count() if missing else 0
+        if missing and chunk_count:
+            found = self.vector_store.query(
+                [question_embeddings[i] for i in missing],
+                n_results=min(num_chunks, chunk_count),
+                document_id=document.id,
+                include_embeddings=with_embeddings
+            )
+
+            for row, i in enumerate(missing):
+                candidates = self._query_candidates(found, row, with_embeddings)
+                known.update((candidate.chunk_id, candidate) for candidate in candidates)
+                chunk_ids = [candidate.chunk_id for candidate in candidates]
+                if hybrid:
+                    hits = self.lexical_index.search(document.id, query_terms(questions[i]), num_chunks)
+                    lexical_ids = [chunk_id for chunk_id, _ in hits]
+                    chunk_ids = reciprocal_rank_fusion([chunk_ids, lexical_ids], settings.RAG_RRF_K)[:num_chunks]
+                if chunk_ids:
+                    caching.set_retrieval(document, question_embeddings[i], num_chunks, chunk_ids)
+                ranked[i] = chunk_ids
+
+        needed = {chunk_id for chunk_ids in ranked.values() for chunk_id in chunk_ids if chunk_id not in known}
+        if needed:
+            known.update(self.hydrate_candidates(needed, with_embeddings, texts=False))
+        known = self.with_texts({
+            chunk_id: known[chunk_id] for chunk_ids in ranked.values() for chunk_id in chunk_ids if chunk_id in known
+        })
+
+        return [
+            [known[chunk_id] for chunk_id in ranked.get(i, []) if chunk_id in known]
+            for i in range(len(question_embeddings))
+        ]
+
+    def build_prompt(self, question, context):
+        return f"""Based on the following context from the document, answer the question accurately and concisely.
+
+Context:
+{context}
+
+Question: {question}
+
+Answer:"""
+
+    def generate_answer(self, prompt, context):
+        """Ask the LLM, using the answer cache; falls back to a context excerpt.
+
+        Returns ``(answer, source)`` where source is 'answer_cache', 'llm' or
+        'fallback'. ``LLMOverloaded`` is raised, not papered over, so callers
+        can answer 503.
+        """
+        llm = self.llm
+        answer = caching.get_answer(prompt, llm.model, llm.temperature)
+        if answer is not None:
+            return answer, 'answer_cache'
+
+        try:
+            with span('llm'):
+                answer = llm.complete(prompt)
+        except LLMOverloaded:
+            raise
+        except Exception as llm_error:
+            logger.warning("LLM error: %s", llm_error)
+            return self.fallback_answer(context), 'fallback'
+
+        caching.set_answer(prompt, llm.model, llm.temperature, answer)
+        return answer, 'llm'
+
+    def fallback_answer(self, context):
+        return f"Based on the document content: {context[:300]}..."
+
+    def plan_answer(self, document, question, question_embedding, candidates, num_chunks, retrieval='vector'):
+        """Assemble the context and prompt for one question.
+
+        Returns a dict with the chosen chunks, the prompt and its token
+        accounting, and ``answer``/``source``/``cache`` filled in when the
+        semantic cache already answers it. Returns None when nothing
+        relevant was retrieved. ``question_embedding`` is None for questions
+        answered by the lexical fast path; they skip the semantic cache.
+        """
+        if not candidates:
+            return None
+
+        with span('prompt_build'):
+            tokenizer = get_prompt_tokenizer()
+            assembly = assemble_context(
+                question_embedding,
+                candidates,
+                num_chunks,
+                tokenizer,
+                max_tokens=settings.RAG_CONTEXT_MAX_TOKENS,
+                dedup_threshold=settings.RAG_CONTEXT_DEDUP_THRESHOLD,
+                mmr_lambda=settings.RAG_CONTEXT_MMR_LAMBDA
+            )
+            prompt = self.build_prompt(question, assembly.text)
+            # What the prompt would have cost with the top chunks joined verbatim
+            baseline = self.build_prompt(question, "\n\n".join(candidate.text for candidate in candidates[:num_chunks]))
+            prompt_tokens, baseline_tokens = tokenizer.count([prompt, baseline])
+
+        plan = {
+            'question_embedding': question_embedding,
+            'retrieval': retrieval,
+            'chunk_ids': [chunk.chunk_id for chunk in assembly.chunks],
+            'chunk_texts': [chunk.text for chunk in assembly.chunks],
+            'chunk_pages': [chunk.page_number for chunk in assembly.chunks],
+            'context': assembly.text,
+            'prompt': prompt,
+            'prompt_tokens': prompt_tokens,
+            'baseline_tokens': baseline_tokens,
+            'context_stats': {
+                'candidates': len(candidates),
+                'chunks_used': len(assembly.chunks),
+                'duplicates_dropped': assembly.dropped_duplicates,
+                'chunks_truncated': assembly.truncated,
+                'context_tokens': assembly.context_tokens,
+            },
+            'answer': None,
+            'source': None,
+            'cache': {'hit': False, 'layer': None},
+        }
+
+        semantic_hit = self.semantic_lookup(document, question_embedding, plan['chunk_ids'])
+        if semantic_hit is not None:
+            plan['answer'], plan['cache'] = semantic_hit
+            plan['source'] = 'semantic_cache'
+        return plan
+
+    def usage(self, plan):
+        """Prompt tokens sent to the LLM for a plan and tokens saved by
+        context assembly and caching"""
+        sent = plan['prompt_tokens'] if plan['source'] in ('llm', 'fallback', 'cancelled') else 0
+        return dict(
+            plan['context_stats'],
+            prompt_tokens=sent,
+            prompt_tokens_saved=max(plan['baseline_tokens'] - sent, 0)
+        )
+
+    def prepare_answer(self, document, question, num_chunks=3):
+        """Run everything before generation for a streamed answer.
+
+        Like ``plan_answer``, but also consults the answer cache, so a plan
+        without ``answer`` must be streamed from the LLM.
+        """
+        question_embedding, candidates, retrieval = self.retrieve(document, [question], num_chunks)[0]
+        plan = self.plan_answer(document, question, question_embedding, candidates, num_chunks, retrieval)
+        if plan is None or plan['answer'] is not None:
+            return plan
+
+        return self._check_answer_cache(plan)
+
+    def _check_answer_cache(self, plan):
+        answer = caching.get_answer(plan['prompt'], self.llm.model, self.llm.temperature)
+        if answer is not None:
+            plan['answer'], plan['source'] = answer, 'answer_cache'
+            plan['cache'] = {'hit': True, 'layer': 'answer'}
+        return plan
+
+    async def stream_answer(self, plan, disconnected=None):
+        """Yield the answer for a prepared plan piece by piece.
+
+        Cached answers are yielded whole. Otherwise tokens are streamed from
+        the LLM until it finishes or ``disconnected`` (an asyncio.Event) is
+        set, in which case the upstream stream is closed. If the LLM fails
+        before producing anything, the context excerpt fallback is yielded
+        and ``plan['source']`` becomes 'fallback'.
+        """
+        if plan['answer'] is not None:
+            yield plan['answer']
+            return
+
+        started = False
+        began = time.perf_counter()
+        stream = self.llm.astream(plan['prompt'])
+        try:
+            async for text in stream:
+                if disconnected is not None and disconnected.is_set():
+                    plan['source'] = 'cancelled'
+                    return
+                started = True
+                yield text
+        except LLMOverloaded:
+            raise
+        except Exception as llm_error:
+            if started:
+                raise
+            logger.warning("LLM error: %s", llm_error)
+            plan['source'] = 'fallback'
+            yield self.fallback_answer(plan['context'])
+            return
+        finally:
+            await stream.aclose()
+            # Spans are per thread; time the stream by hand
+            metrics.record('llm', time.perf_counter() - began)
+        plan['source'] = 'llm'
+
+    def finish_stream(self, document, plan, answer):
+        """Cache a completely streamed LLM answer"""
+        if plan['source'] != 'llm' or not answer:
+            return
+        caching.set_answer(plan['prompt'], self.llm.model, self.llm.temperature, answer)
+        if (settings.RAG_SEMANTIC_CACHE_ENABLED and document is not None
+                and plan['question_embedding'] is not None):
+            semantic_cache.store(document, plan['question_embedding'], plan['chunk_ids'], answer)
 
     def query_documents(self, document_id, question, num_chunks=3):
         """Query document using RAG pipeline"""
         try:
-            question_embedding = self.embedding_model.encode([question])[0]
-
             try:
                 document = Document.objects.get(id=document_id)
                 if document.processing_status != 'completed':
@@ -289,56 +1032,210 @@ class RAGEngine:
             except Document.DoesNotExist:
                 return "Document not found."
 
-            chunk_count = document.chunks.count()
-            if chunk_count == 0:
+            if not document.chunks.exists():
                 return "No chunks found for this document."
 
-            try:
-                results = self.collection.query(
-                    query_embeddings=[question_embedding.tolist()],
-                    n_results=min(num_chunks, chunk_count),
-                    where={"document_id": document_id}
-                )
-            except Exception as e:
-                print(f"ChromaDB query error: {str(e)}")
-                results = self.collection.query(
-                    query_embeddings=[question_embedding.tolist()],
-                    n_results=min(num_chunks, chunk_count)
-                )
-
-            if not results['documents'] or not results['documents'][0]:
+            question_embedding, candidates, retrieval = self.retrieve(document, [question], num_chunks)[0]
+            plan = self.plan_answer(document, question, question_embedding, candidates, num_chunks, retrieval)
+            if plan is None:
                 return "No relevant information found in the document."
 
-            context = "\n\n".join(results['documents'][0])
-
-            prompt = f"""Based on the following context from the document, answer the question accurately and concisely.
-
-Context:
-{context}
-
-Question: {question}
-
-Answer:"""
+            if plan['answer'] is None:
+                plan['answer'], plan['source'] = self.generate_answer(plan['prompt'], plan['context'])
+            return self.finish_answer(document, plan)
 
-            try:
-                response = openai.ChatCompletion.create(
-                    model="gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=500,
-                    temperature=0.3
-                )
-                answer = response.choices[0].message.content
-            except Exception as llm_error:
-                print(f"LLM error: {str(llm_error)}")
-                answer = f"Based on the document content: {context[:300]}..."
+        except LLMOverloaded:
+            raise
+        except Exception as e:
+            logger.exception("Query error: %s", e)
+            return f"Error processing query: {str(e)}"
 
+    def corpus_document_ids(self, document_ids=None):
+        """Ids of the completed documents among ``document_ids`` (all of them
+        when None)"""
+        documents = Document.objects.filter(processing_status='completed')
+        if document_ids is not None:
+            documents = documents.filter(id__in=document_ids)
+        return list(documents.order_by('id').values_list('id', flat=True))
+
+    @span('retrieve')
+    def retrieve_corpus(self, document_ids, question_embedding, question, num_chunks):
+        """Return (candidates, mode) for a question over several documents:
+        one vector store query restricted to them, fused with their BM25
+        hits when hybrid retrieval is on"""
+        with_embeddings = self.needs_candidate_embeddings()
+        chunk_count = DocumentChunk.objects.filter(document_id__in=document_ids).count()
+        if not chunk_count:
+            return [], 'vector'
+        found = self.vector_store.query(
+            [question_embedding],
+            n_results=min(num_chunks, chunk_count),
+            document_ids=document_ids,
+            include_embeddings=with_embeddings
+        )
+        candidates = self._query_candidates(found, 0, with_embeddings)
+        if not settings.RAG_HYBRID_ENABLED:
+            known = self.with_texts({candidate.chunk_id: candidate for candidate in candidates})
+            return [known[candidate.chunk_id] for candidate in candidates if candidate.chunk_id in known], 'vector'
+
+        terms = query_terms(question)
+        hits = sorted(
+            (hit for document_id in document_ids for hit in self.lexical_index.search(document_id, terms, num_chunks)),
+            key=lambda hit: hit[1],
+            reverse=True
+        )[:num_chunks]
+        known = {candidate.chunk_id: candidate for candidate in candidates}
+        chunk_ids = reciprocal_rank_fusion(
+            [list(known), [chunk_id for chunk_id, _ in hits]], settings.RAG_RRF_K
+        )[:num_chunks]
+        missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in known]
+        if missing:
+            known.update(self.hydrate_candidates(missing, with_embeddings, texts=False))
+        known = self.with_texts({chunk_id: known[chunk_id] for chunk_id in chunk_ids if chunk_id in known})
+        return [known[chunk_id] for chunk_id in chunk_ids if chunk_id in known], 'hybrid'
+
+    def plan_corpus_answer(self, question, document_ids, num_chunks=3):
+        """Plan the answer to a question across ``document_ids``.
+
+        With more than RAG_ROUTING_TOP_DOCUMENTS documents the question is
+        first routed to the most similar ones by their centroid embeddings,
+        and only those are searched chunk by chunk.
+        """
+        question_embedding = self.embed_question(question)
+        top_n = settings.RAG_ROUTING_TOP_DOCUMENTS
+        if len(document_ids) > top_n:
+            with span('retrieve'):
+                document_ids = document_router.route(question_embedding, document_ids, top_n)
+        candidates, retrieval = self.retrieve_corpus(
+            document_ids, question_embedding, question, self.candidate_count(num_chunks)
+        )
+        plan = self.plan_answer(None, question, question_embedding, candidates, num_chunks, retrieval)
+        if plan is not None:
+            used = {document_id_from_chunk_id(chunk_id) for chunk_id in plan['chunk_ids']}
+            plan['titles'] = dict(Document.objects.filter(id__in=used).values_list('id', 'title'))
+            plan['documents_searched'] = list(document_ids)
+        return plan
+
+    def prepare_corpus_answer(self, question, document_ids, num_chunks=3):
+        """``prepare_answer`` for a question across several documents"""
+        plan = self.plan_corpus_answer(question, document_ids, num_chunks)
+        if plan is None:
+            return None
+        return self._check_answer_cache(plan)
+
+    def query_corpus(self, question, document_ids, num_chunks=3):
+        """Answer a question across several completed documents"""
+        plan = self.plan_corpus_answer(question, document_ids, num_chunks)
+        if plan is None:
+            return "No relevant information found in the documents."
+        plan['answer'], plan['source'] = self.generate_answer(plan['prompt'], plan['context'])
+        return self.finish_answer(None, plan)
+
+    def semantic_lookup(self, document, question_embedding, chunk_ids):
+        """Return (answer, cache_info) from the semantic cache, or None"""
+        if not settings.RAG_SEMANTIC_CACHE_ENABLED or document is None or question_embedding is None:
+            return None
+        semantic_hit = semantic_cache.lookup(document, question_embedding, chunk_ids)
+        caching.stats.record('semantic', semantic_hit is not None)
+        if semantic_hit is None:
+            return None
+        answer, similarity = semantic_hit
+        return answer, {'hit': True, 'layer': 'semantic', 'similarity': round(similarity, 4)}
+
+    def finish_answer(self, document, plan):
+        """Record a generated answer in the semantic cache and build the result"""
+        if plan['source'] == 'answer_cache':
+            plan['cache'] = {'hit': True, 'layer': 'answer'}
+        if (plan['source'] in ('llm', 'answer_cache') and settings.RAG_SEMANTIC_CACHE_ENABLED
+                and document is not None and plan['question_embedding'] is not None):
+            semantic_cache.store(document, plan['question_embedding'], plan['chunk_ids'], plan['answer'])
+        return self.build_result(document, plan)
+
+    def describe_sources(self, document, plan):
+        """Source labels for the chunks of a plan, with document titles for
+        corpus answers (``document`` None)"""
+        if document is not None:
             return {
-                'answer': answer,
-                'context': results['documents'][0],
-                'sources': [f"Chunk {i+1}" for i in range(len(results['documents'][0]))],
-                'document_title': document.title
+                'sources': [f"Chunk {i+1}" for i in range(len(plan['chunk_texts']))],
+                'document_title': document.title,
             }
+        titles = plan['titles']
+        document_ids = [document_id_from_chunk_id(chunk_id) for chunk_id in plan['chunk_ids']]
+        return {
+            'sources': [
+                f"{titles.get(document_id, '')} (page {page})"
+                for document_id, page in zip(document_ids, plan['chunk_pages'])
+            ],
+            'documents': [
+                {'id': document_id, 'title': titles.get(document_id, '')}
+                for document_id in dict.fromkeys(document_ids)
+            ],
+            'documents_searched': plan['documents_searched'],
+        }
 
-        except Exception as e:
-            print(f"Query error: {str(e)}")
-            return f"Error processing query: {str(e)}"
+    def build_result(self, document, plan):
+        result = {
+            'answer': plan['answer'],
+            'context': plan['chunk_texts'],
+        }
+        result.update(self.describe_sources(document, plan))
+        result.update({
+            'cache': plan['cache'],
+            'retrieval': plan['retrieval'],
+            'usage': self.usage(plan)
+        })
+        return result
+
+    def _generate_answer_in_thread(self, prompt, context):
+        try:
+            return self.generate_answer(prompt, context)
+        finally:
+            # Cache backends may have opened a database connection here
+            connections.close_all()
+
+    def query_documents_batch(self, document_id, questions, num_chunks=3, max_concurrency=None):
+        """Answer several questions about one document.
+
+        Keyword questions go through the lexical fast path; the rest are
+        embedded in one encode call and retrieved with one vector store
+        query; LLM calls then run concurrently, at most
+        ``max_concurrency`` (RAG_LLM_MAX_CONCURRENCY) at a time. Returns one
+        entry per question, in order, each with either ``answer`` (the dict
+        ``query_documents`` returns) or ``error`` set.
+        """
+        document = Document.objects.get(id=document_id)
+        if document.processing_status != 'completed':
+            raise ValueError(f"Document is not ready. Status: {document.processing_status}")
+        if not document.chunks.exists():
+            raise ValueError("No chunks found for this document.")
+
+        retrievals = self.retrieve(document, questions, num_chunks)
+
+        entries = [{'question': question, 'answer': None, 'error': None} for question in questions]
+        plans = {}
+        for i, (embedding, candidates, retrieval) in enumerate(retrievals):
+            plan = self.plan_answer(document, questions[i], embedding, candidates, num_chunks, retrieval)
+            if plan is None:
+                entries[i]['error'] = "No relevant information found in the document."
+            elif plan['answer'] is not None:
+                entries[i]['answer'] = self.build_result(document, plan)
+            else:
+                plans[i] = plan
+
+        if plans:
+            max_concurrency = max_concurrency or settings.RAG_LLM_MAX_CONCURRENCY
+            with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(plans)))) as pool:
+                futures = [
+                    (i, pool.submit(self._generate_answer_in_thread, plan['prompt'], plan['context']))
+                    for i, plan in plans.items()
+                ]
+                for i, future in futures:
+                    try:
+                        plans[i]['answer'], plans[i]['source'] = future.result()
+                    except Exception as e:
+                        logger.exception("Query error: %s", e)
+                        entries[i]['error'] = f"Error processing query: {str(e)}"
+                        continue
+                    entries[i]['answer'] = self.finish_answer(document, plans[i])
+
+        return entries
@@ -0,0 +1,103 @@
+"""Document-level routing for questions asked across many documents.
+
+Searching every chunk of every document gets slower as the corpus grows.
+Instead each document keeps a centroid - the normalised mean of its chunk
+embeddings, computed while its chunks are stored - and a corpus question is
+answered in two levels:
+
+1. ``DocumentRouter.route`` ranks the documents in scope by cosine
+   similarity between the question and their centroids (one matrix-vector
+   product over all documents);
+2. chunk retrieval then runs only over the top-N documents.
+
+The centroid matrix is cached per process and reloaded when the set of
+completed documents changes.
+"""
+import threading
+from collections import Counter
+
+import numpy as np
+from django.db.models import Count, Max
+
+from .models import Document
+
+
+def centroid_bytes(vector_sum):
+    """Serialize the normalised sum of unit chunk vectors as a centroid"""
+    vector = np.asarray(vector_sum, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if not norm:
+        return None
+    return (vector / norm).astype(np.float32).tobytes()
+
+
+def unit_rows_sum(embeddings):
+    """Sum of the rows of ``embeddings`` scaled to unit length"""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.maximum(norms, 1e-12)).sum(axis=0)
+
+
+class DocumentRouter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._matrix = None
+
+    def _completed(self):
+        return Document.objects.filter(processing_status='completed')
+
+    def _load(self):
+        state = self._completed().aggregate(count=Count('id'), updated=Max('updated_at'))
+        version = (state['count'], state['updated'])
+        with self._lock:
+            if version == self._version:
+                return self._ids, self._matrix
+
+            rows = [
+                (document_id, np.frombuffer(bytes(centroid), dtype=np.float32))
+                for document_id, centroid in self._completed()
+                .filter(centroid__isnull=False)
+                .values_list('id', 'centroid')
+            ]
+            if rows:
+                # Centroids from an older embedding model are left out
+                dim = Counter(len(vector) for _, vector in rows).most_common(1)[0][0]
+                rows = [(document_id, vector) for document_id, vector in rows if len(vector) == dim]
+                self._ids = np.array([document_id for document_id, _ in rows], dtype=np.int64)
+                self._matrix = np.vstack([vector for _, vector in rows])
+            else:
+                self._ids = np.zeros(0, dtype=np.int64)
+                self._matrix = None
+            self._version = version
+            return self._ids, self._matrix
+
+    def route(self, question_embedding, document_ids, top_n):
+        """Return up to ``top_n`` of ``document_ids``, most similar first.
+
+        Documents without a usable centroid rank after all that have one.
+        """
+        ids, matrix = self._load()
+        scope = np.asarray(list(document_ids), dtype=np.int64)
+        ranked = []
+        routable = matrix is not None and len(question_embedding) == matrix.shape[1]
+        if routable:
+            in_scope = np.isin(ids, scope)
+            candidate_ids = ids[in_scope]
+            if len(candidate_ids):
+                query = np.asarray(question_embedding, dtype=np.float32)
+                query = query / max(float(np.linalg.norm(query)), 1e-12)
+                scores = matrix[in_scope] @ query
+                k = min(top_n, len(candidate_ids))
+                best = np.argpartition(-scores, k - 1)[:k]
+                best = best[np.argsort(-scores[best], kind='stable')]
+                ranked = [int(document_id) for document_id in candidate_ids[best]]
+
+        if len(ranked) < top_n:
+            with_centroid = set(ids.tolist()) if routable else set()
+            ranked.extend(int(document_id) for document_id in scope if int(document_id) not in with_centroid)
+        return ranked[:top_n]
+
+
+document_router = DocumentRouter()
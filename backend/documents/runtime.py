@@ -0,0 +1,40 @@
+"""Process memory and startup reporting helpers"""
+import os
+import resource
+
+
+def memory_usage():
+    """Return resident memory figures for the current process in MiB.
+
+    ``rss`` counts every resident page, including pages shared with a forked
+    parent. ``pss`` and ``shared`` come from /proc/self/smaps_rollup where
+    available and show how much of the RSS is actually shared copy-on-write.
+    """
+    usage = {
+        'pid': os.getpid(),
+        'rss_mb': None,
+        'pss_mb': None,
+        'shared_mb': None,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+    try:
+        with open('/proc/self/smaps_rollup') as rollup:
+            fields = {}
+            for line in rollup:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':'):
+                    fields[parts[0][:-1]] = int(parts[1])
+        usage['rss_mb'] = round(fields.get('Rss', 0) / 1024, 1)
+        usage['pss_mb'] = round(fields.get('Pss', 0) / 1024, 1)
+        shared_kb = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+        usage['shared_mb'] = round(shared_kb / 1024, 1)
+    except (OSError, ValueError):
+        try:
+            with open('/proc/self/statm') as statm:
+                resident_pages = int(statm.read().split()[1])
+            usage['rss_mb'] = round(resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+        except (OSError, ValueError, IndexError):
+            usage['rss_mb'] = usage['peak_rss_mb']
+
+    return usage
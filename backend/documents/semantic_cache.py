@@ -0,0 +1,135 @@
+"""Semantic answer cache.
+
+Reuses an earlier LLM answer when a new question is a near-paraphrase of one
+already answered for the same document. Past question embeddings are kept
+per document in a compact float32 matrix, so a lookup is one matrix-vector
+product. The matrix grows with the entries it holds, up to
+``RAG_SEMANTIC_CACHE_MAX_ENTRIES`` rows, and the least recently used
+documents are dropped once all of them together hold more than
+``RAG_SEMANTIC_CACHE_MAX_TOTAL_ENTRIES``. A cached answer is only reused when the cosine similarity clears
+``RAG_SEMANTIC_CACHE_THRESHOLD`` *and* retrieval returned the same chunks,
+which keeps paraphrases that hit different context from sharing answers.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def context_key(chunk_ids):
+    """Order-independent integer key for a set of retrieved chunk ids"""
+    return hash(tuple(sorted(chunk_ids)))
+
+
+class _DocumentEntries:
+    """Ring of (question embedding, chunk ids, answer) holding at most
+    ``capacity`` entries; the arrays double in size as entries are added"""
+
+    initial_rows = 16
+
+    def __init__(self, index_version, dim, capacity):
+        self.index_version = index_version
+        self.capacity = capacity
+        rows = min(self.initial_rows, capacity)
+        self.matrix = np.zeros((rows, dim), dtype=np.float32)
+        self.context_keys = np.zeros(rows, dtype=np.int64)
+        self.answers = [None] * rows
+        self.count = 0
+        self.next_slot = 0
+
+    def _grow(self):
+        rows = min(len(self.answers) * 2, self.capacity)
+        matrix = np.zeros((rows, self.matrix.shape[1]), dtype=np.float32)
+        matrix[:self.count] = self.matrix[:self.count]
+        context_keys = np.zeros(rows, dtype=np.int64)
+        context_keys[:self.count] = self.context_keys[:self.count]
+        self.matrix, self.context_keys = matrix, context_keys
+        self.answers.extend([None] * (rows - len(self.answers)))
+        # next_slot wrapped to 0 when the old rows filled up
+        self.next_slot = self.count
+
+    def add(self, embedding, context_id, answer):
+        # Until the ring is full, slots are filled in order
+        if self.count == len(self.answers) < self.capacity:
+            self._grow()
+        slot = self.next_slot
+        self.matrix[slot] = embedding
+        self.context_keys[slot] = context_id
+        self.answers[slot] = answer
+        self.next_slot = (slot + 1) % len(self.answers)
+        self.count = min(self.count + 1, len(self.answers))
+
+    def best_match(self, embedding, context_id):
+        if not self.count:
+            return None, 0.0
+        similarities = self.matrix[:self.count] @ embedding
+        similarities[self.context_keys[:self.count] != context_id] = -1.0
+        best = int(np.argmax(similarities))
+        return best, float(similarities[best])
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold=None, max_entries_per_document=None, max_total_entries=None):
+        self.threshold = threshold
+        self.max_entries = max_entries_per_document
+        self.max_total_entries = max_total_entries
+        # Least recently used first
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entries(self, document, dim, create=False):
+        entries = self._documents.get(document.id)
+        if entries is not None and (entries.index_version != document.index_version or entries.matrix.shape[1] != dim):
+            entries = None
+            del self._documents[document.id]
+        if entries is None and create:
+            capacity = self.max_entries or settings.RAG_SEMANTIC_CACHE_MAX_ENTRIES
+            entries = _DocumentEntries(document.index_version, dim, capacity)
+            self._documents[document.id] = entries
+        if entries is not None:
+            self._documents.move_to_end(document.id)
+        return entries
+
+    def _evict(self):
+        """Drop least recently used documents while the total is over the cap"""
+        limit = self.max_total_entries or settings.RAG_SEMANTIC_CACHE_MAX_TOTAL_ENTRIES
+        total = sum(entries.count for entries in self._documents.values())
+        # The most recently used document always stays
+        while total > limit and len(self._documents) > 1:
+            _, entries = self._documents.popitem(last=False)
+            total -= entries.count
+
+    def lookup(self, document, question_embedding, chunk_ids):
+        """Return (answer, similarity) for a near-duplicate question, or None"""
+        threshold = self.threshold if self.threshold is not None else settings.RAG_SEMANTIC_CACHE_THRESHOLD
+        embedding = _unit(question_embedding)
+
+        with self._lock:
+            entries = self._entries(document, embedding.shape[0])
+            if entries is None:
+                return None
+            slot, similarity = entries.best_match(embedding, context_key(chunk_ids))
+            if slot is None or similarity < threshold:
+                return None
+            return entries.answers[slot], similarity
+
+    def store(self, document, question_embedding, chunk_ids, answer):
+        embedding = _unit(question_embedding)
+        with self._lock:
+            entries = self._entries(document, embedding.shape[0], create=True)
+            entries.add(embedding, context_key(chunk_ids), answer)
+            self._evict()
+
+    def invalidate(self, document_id):
+        with self._lock:
+            self._documents.pop(document_id, None)
+
+
+semantic_cache = SemanticAnswerCache()
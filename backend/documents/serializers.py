@@ -1,17 +1,83 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Document, DocumentChunk
+from .models import Document, DocumentChunk, IngestionJob, UploadSession
+from .jobs import job_progress
 
 class DocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Document
-        fields = '__all__'
+        exclude = ['centroid', 'page_hashes']
 
 class DocumentChunkSerializer(serializers.ModelSerializer):
     class Meta:
         model = DocumentChunk
         fields = '__all__'
 
+class IngestionJobSerializer(serializers.ModelSerializer):
+    percent = serializers.SerializerMethodField()
+    eta_seconds = serializers.SerializerMethodField()
+
+    class Meta:
+        model = IngestionJob
+        fields = [
+            'id', 'status', 'stage', 'chunks_total', 'chunks_embedded',
+            'percent', 'eta_seconds', 'attempts', 'max_attempts', 'run_after',
+            'last_error', 'started_at', 'finished_at', 'created_at'
+        ]
+
+    def get_percent(self, job):
+        return job_progress(job)[0]
+
+    def get_eta_seconds(self, job):
+        return job_progress(job)[1]
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    offset = serializers.IntegerField(source='received', read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'file_name', 'file_type', 'size', 'offset', 'detected_type', 'created_at', 'updated_at']
+
+class UploadStartSerializer(serializers.Serializer):
+    file_name = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+
+class UploadCompleteSerializer(serializers.Serializer):
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False)
+
+class DocumentScopeField(serializers.Field):
+    """A list of document ids, or "all" (stored as None) for every document"""
+    default_error_messages = {
+        'invalid': 'Expected a non-empty list of document ids or "all".',
+    }
+
+    def to_internal_value(self, data):
+        if data == 'all':
+            return None
+        if not isinstance(data, list) or not data:
+            self.fail('invalid')
+        ids = serializers.ListField(child=serializers.IntegerField(min_value=1)).run_validation(data)
+        return list(dict.fromkeys(ids))
+
+    def to_representation(self, value):
+        return 'all' if value is None else value
+
 class QuestionSerializer(serializers.Serializer):
-    document_id = serializers.IntegerField()
+    document_id = serializers.IntegerField(required=False)
+    document_ids = DocumentScopeField(required=False)
     question = serializers.CharField(max_length=1000)
+    num_chunks = serializers.IntegerField(default=3, min_value=1, max_value=10)
+
+    def validate(self, data):
+        if ('document_id' in data) == ('document_ids' in data):
+            raise serializers.ValidationError('Give either document_id or document_ids.')
+        return data
+
+class BatchQuestionSerializer(serializers.Serializer):
+    document_id = serializers.IntegerField()
+    questions = serializers.ListField(
+        child=serializers.CharField(max_length=1000),
+        min_length=1,
+        max_length=settings.RAG_BATCH_MAX_QUESTIONS
+    )
     num_chunks = serializers.IntegerField(default=3, min_value=1, max_value=10)
\ No newline at end of file
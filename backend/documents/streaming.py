@@ -0,0 +1,73 @@
+"""Server-Sent Events helpers for streamed answers.
+
+Django 4.2 does not tell a streaming view when the client goes away: the
+ASGI handler reads the request body and then never looks at ``receive``
+again. ``DisconnectMiddleware`` wraps the ASGI application, keeps listening
+for ``http.disconnect`` once the body has been read and exposes the result
+as an ``asyncio.Event`` in ``request.scope['client_disconnected']``, so a
+response generator can stop (and close the upstream LLM stream) as soon as
+nobody is reading.
+"""
+import asyncio
+import json
+
+SCOPE_KEY = 'client_disconnected'
+
+
+def sse_event(event, data):
+    """Encode one SSE event with a JSON payload"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n".encode('utf-8')
+
+
+def client_disconnected(request):
+    """True once the client of an ASGI request has disconnected"""
+    event = getattr(request, 'scope', {}).get(SCOPE_KEY)
+    return event is not None and event.is_set()
+
+
+class DisconnectMiddleware:
+    """ASGI middleware that records client disconnects in the scope"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        disconnected = asyncio.Event()
+        scope = dict(scope, **{SCOPE_KEY: disconnected})
+        body_done = False
+        watcher = None
+
+        async def watch():
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    disconnected.set()
+                    return
+
+        async def wrapped_receive():
+            nonlocal body_done, watcher
+            if body_done:
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+            elif not message.get('more_body', False):
+                body_done = True
+                watcher = asyncio.ensure_future(watch())
+            return message
+
+        async def wrapped_send(message):
+            # Nothing can be delivered any more; let the app wind down
+            if not disconnected.is_set():
+                await send(message)
+
+        try:
+            await self.app(scope, wrapped_receive, wrapped_send)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
@@ -0,0 +1,155 @@
+"""A stub OpenAI-compatible chat completion server for benchmarks.
+
+``StubLLMServer`` answers ``POST /v1/chat/completions`` with scripted
+latency: the first token after ``first_token_ms`` and every further token
+after ``token_ms``, both for plain and for ``stream=True`` requests. It
+counts completed and aborted streams, so a harness can check that a client
+disconnect actually stopped generation upstream.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLLMStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.streams_completed = 0
+        self.streams_aborted = 0
+        self.tokens_sent = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'streams_completed': self.streams_completed,
+                'streams_aborted': self.streams_aborted,
+                'tokens_sent': self.tokens_sent,
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        stub = self.server.stub
+        stub.stats.add(requests=1)
+
+        tokens = stub.tokens
+        if request.get('max_tokens'):
+            tokens = min(tokens, request['max_tokens'])
+        words = [f" word{i}" for i in range(tokens)]
+        model = request.get('model', 'stub')
+
+        if request.get('stream'):
+            self._stream(stub, model, words)
+        else:
+            time.sleep((stub.first_token_ms + stub.token_ms * max(tokens - 1, 0)) / 1000)
+            self._json(200, {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ''.join(words).strip()},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': tokens, 'total_tokens': tokens},
+            })
+            stub.stats.add(tokens_sent=tokens)
+
+    def _json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _event(self, payload):
+        data = payload if isinstance(payload, str) else json.dumps(payload)
+        self._chunk(f"data: {data}\n\n".encode('utf-8'))
+
+    def _stream(self, stub, model, words):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        sent = 0
+        try:
+            for i, word in enumerate(words):
+                time.sleep((stub.first_token_ms if i == 0 else stub.token_ms) / 1000)
+                self._event({
+                    'id': 'chatcmpl-stub',
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': {'content': word}, 'finish_reason': None}],
+                })
+                sent += 1
+            self._event({
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+            })
+            self._event('[DONE]')
+            self._chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            stub.stats.add(streams_aborted=1, tokens_sent=sent)
+            self.close_connection = True
+            return
+        stub.stats.add(streams_completed=1, tokens_sent=sent)
+
+
+class StubLLMServer:
+    """Run the stub in a background thread; usable as a context manager"""
+
+    def __init__(self, first_token_ms=300, token_ms=20, tokens=100, host='127.0.0.1', port=0):
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.tokens = tokens
+        self.stats = StubLLMStats()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def api_base(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-llm', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,117 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase
+
+from ..benchmark import corpus
+from ..benchmark.harness import percentiles_ms
+from ..benchmark.results import compare
+from ..models import Document
+
+
+def read_all(paths):
+    contents = []
+    for path in paths:
+        with open(path, encoding='utf-8') as file:
+            contents.append(file.read())
+    return contents
+
+
+class CorpusTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+
+    def build(self, name, seed):
+        directory = os.path.join(self.root, name)
+        os.makedirs(directory)
+        return corpus.build_corpus(directory, 'small', ('txt',), seed=seed)['txt']
+
+    def test_corpus_is_reproducible_from_its_seed(self):
+        documents, pages = corpus.SIZES['small']
+        first = read_all(self.build('first', seed=3))
+        second = read_all(self.build('second', seed=3))
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(first), documents)
+        # No two documents share content, which would be deduplicated away
+        self.assertEqual(len(set(first)), documents)
+        self.assertEqual(first[0].count('\f'), pages - 1)
+        self.assertNotEqual(read_all(self.build('other', seed=4)), first)
+
+    def test_questions_are_reproducible_from_their_seed(self):
+        self.assertEqual(corpus.synthetic_questions(10, seed=1), corpus.synthetic_questions(10, seed=1))
+
+
+class ResultsTests(SimpleTestCase):
+    def test_percentiles(self):
+        self.assertEqual(percentiles_ms(list(range(1, 101))), {'p50_ms': 50.5, 'p95_ms': 95.05, 'p99_ms': 99.01})
+        self.assertEqual(percentiles_ms([]), {'p50_ms': None, 'p95_ms': None, 'p99_ms': None})
+
+    def test_regressions_beyond_the_threshold_are_flagged(self):
+        baseline = {'results': {
+            'ingest': {'txt-small': {'pages_per_s': 100.0, 'pages': 20}},
+            'query': {'p95_ms': 100.0, 'p50_ms': 50.0},
+        }}
+        current = {'results': {
+            'ingest': {'txt-small': {'pages_per_s': 80.0, 'pages': 20}},
+            'query': {'p95_ms': 105.0, 'p50_ms': 40.0},
+        }}
+
+        rows = {name: regressed for name, _, _, _, regressed in compare(current, baseline, threshold=0.1)}
+        # Counts such as pages are not compared, only rates and latencies
+        self.assertEqual(rows, {
+            'ingest.txt-small.pages_per_s': True,
+            'query.p50_ms': False,
+            'query.p95_ms': False,
+        })
+
+
+class BenchSuiteTests(TransactionTestCase):
+    """The suite end to end on the smallest corpus; query clients run in
+    threads, which need committed data"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+
+    def run_suite(self, *extra):
+        output = os.path.join(self.root, 'results.json')
+        stdout = StringIO()
+        call_command(
+            'bench_suite',
+            '--sizes', 'small',
+            '--formats', 'txt',
+            '--clients', '2',
+            '--requests', '6',
+            '--first-token-ms', '0',
+            '--token-ms', '0',
+            '--output', output,
+            *extra,
+            stdout=stdout,
+            stderr=StringIO()
+        )
+        with open(output, encoding='utf-8') as file:
+            return json.load(file), stdout.getvalue()
+
+    def test_results_are_written_and_compared_with_the_baseline(self):
+        baseline = os.path.join(self.root, 'baseline.json')
+        run, _ = self.run_suite('--baseline', baseline, '--save-baseline')
+
+        ingest = run['results']['ingest']['txt-small']
+        self.assertEqual(ingest['documents'], corpus.SIZES['small'][0])
+        self.assertEqual(ingest['pages'], corpus.SIZES['small'][0] * corpus.SIZES['small'][1])
+        self.assertGreater(ingest['pages_per_s'], 0)
+        self.assertGreater(run['results']['memory']['peak_rss_mb'], 0)
+        query = run['results']['query']['clients-2']
+        self.assertEqual((query['requests'], query['errors']), (6, 0))
+        self.assertLessEqual(query['p50_ms'], query['p99_ms'])
+        # The benchmark cleans up after itself
+        self.assertFalse(Document.objects.exists())
+
+        _, output = self.run_suite('--baseline', baseline, '--threshold', '100')
+        self.assertIn('no regressions', output.lower())
@@ -0,0 +1,97 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..management.commands.ingest_dir import CHECKPOINT_NAME
+from ..models import Document
+from ..rag_engine import get_rag_engine
+from .utils import SAMPLE_TEXT, IsolatedIndexMixin
+
+
+def thread_pool(workers, known_hashes=frozenset()):
+    """Extraction in threads, which see this test's settings"""
+    return ThreadPoolExecutor(workers)
+
+
+@mock.patch('documents.management.commands.ingest_dir.get_ingest_pool', thread_pool)
+class IngestDirTests(IsolatedIndexMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = os.path.join(self.root, 'source')
+        os.makedirs(os.path.join(self.source, 'nested'))
+        self.write('jane.txt', SAMPLE_TEXT)
+        self.write('nested/bob.txt', 'Bob Smith is a chef in Paris.\n')
+
+    def write(self, path, text):
+        with open(os.path.join(self.source, path), 'w', encoding='utf-8') as file:
+            file.write(text)
+
+    def ingest(self, *args):
+        stdout = StringIO()
+        call_command('ingest_dir', self.source, '--workers', '2', *args, stdout=stdout, stderr=StringIO())
+        return stdout.getvalue()
+
+    def checkpoint(self):
+        with open(os.path.join(self.source, CHECKPOINT_NAME), encoding='utf-8') as file:
+            return {entry['path']: entry['status'] for entry in map(json.loads, file)}
+
+    def test_directory_is_ingested_as_completed_documents(self):
+        self.write('copy.txt', SAMPLE_TEXT)
+        self.write('empty.txt', '  \n')
+        self.write('program.exe', 'MZ')
+
+        output = self.ingest()
+        self.assertIn('program.exe: ', output)
+        statuses = self.checkpoint()
+        # Whichever copy of the same text is extracted first is ingested
+        self.assertEqual(sorted([statuses.pop('copy.txt'), statuses.pop('jane.txt')]), ['duplicate', 'ingested'])
+        self.assertEqual(statuses, {'empty.txt': 'empty', os.path.join('nested', 'bob.txt'): 'ingested'})
+        self.assertEqual(Document.objects.count(), 2)
+        engine = get_rag_engine()
+        for document in Document.objects.all():
+            self.assertEqual(document.processing_status, 'completed')
+            ids = sorted(document.chunks.values_list('embedding_id', flat=True))
+            self.assertTrue(ids)
+            self.assertEqual(sorted(engine.vector_store.list_ids(document.id)), ids)
+            self.assertEqual(sorted(engine.lexical_index.list_ids(document.id)), ids)
+
+    def test_interrupted_run_resumes_from_the_checkpoint(self):
+        self.ingest()
+        with open(os.path.join(self.source, CHECKPOINT_NAME), 'a', encoding='utf-8') as file:
+            # The last entry of a run that was killed while writing it
+            file.write('{"path": "new.t')
+        self.write('new.txt', 'Ana Silva is an airline pilot.\n')
+
+        output = self.ingest()
+        self.assertIn('3 files to ingest (2 already done per checkpoint)', output)
+        self.assertIn('Ingested 1 files', output)
+        self.assertEqual(Document.objects.count(), 3)
+
+        # Without the checkpoint every file is seen again, and found ingested
+        output = self.ingest('--restart')
+        self.assertIn('Ingested 0 files', output)
+        self.assertIn('3 duplicates', output)
+        self.assertEqual(Document.objects.count(), 3)
+
+    def test_dry_run_writes_nothing(self):
+        output = self.ingest('--dry-run')
+        self.assertIn('Would ingest 2 files', output)
+        self.assertIn('jane.txt: ', output)
+        self.assertFalse(Document.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.source, CHECKPOINT_NAME)))
+
+    def test_failed_batch_keeps_nothing(self):
+        engine = get_rag_engine()
+        with mock.patch.object(engine.lexical_index, 'commit', side_effect=OSError('disk full')), \
+                self.assertRaises(OSError):
+            self.ingest()
+
+        self.assertFalse(Document.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.root, 'media', 'documents')), [])
+        index_dir = os.path.join(self.root, 'vector_index')
+        self.assertFalse(os.path.exists(index_dir) and any(name.startswith('doc_') for name in os.listdir(index_dir)))
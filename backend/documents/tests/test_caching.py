@@ -0,0 +1,94 @@
+import uuid
+
+import numpy as np
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .. import caching
+from ..cache_backends import BoundedLocMemCache
+from ..models import Document
+from .utils import chunk_ids
+
+
+class BoundedLocMemCacheTests(SimpleTestCase):
+    def make_cache(self, max_entries=3, max_bytes=0):
+        return BoundedLocMemCache(f'test-{uuid.uuid4()}', {
+            'OPTIONS': {'MAX_ENTRIES': max_entries, 'CULL_FREQUENCY': 3, 'MAX_BYTES': max_bytes},
+        })
+
+    def assertUsedBytesMatch(self, cache):
+        self.assertEqual(cache.used_bytes, sum(len(value) for value in cache._cache.values()))
+
+    def test_replacing_a_value_the_cull_evicts_counts_it_once(self):
+        cache = self.make_cache()
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key * 100)
+        # 'a' is the least recently used entry, so the cull on a full cache evicts it
+        cache.set('a', 'x' * 50)
+
+        self.assertEqual(cache.get('a'), 'x' * 50)
+        self.assertUsedBytesMatch(cache)
+
+    def test_least_recently_used_values_are_evicted_beyond_max_bytes(self):
+        cache = self.make_cache(max_entries=100, max_bytes=1000)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key * 300)
+        cache.get('a')
+        cache.set('d', 'd' * 300)
+
+        self.assertIsNone(cache.get('b'))
+        for key in ('a', 'c', 'd'):
+            self.assertEqual(cache.get(key), key * 300)
+        self.assertLessEqual(cache.used_bytes, 1000)
+        self.assertUsedBytesMatch(cache)
+
+    def test_incr_delete_and_clear_keep_the_count(self):
+        cache = self.make_cache(max_entries=100)
+        cache.set('counter', 9)
+        cache.incr('counter', 1000)
+        cache.set('other', 'o' * 10)
+        cache.delete('other')
+        self.assertUsedBytesMatch(cache)
+
+        cache.clear()
+        self.assertEqual(cache.used_bytes, 0)
+
+
+@override_settings(RAG_CACHE_ENABLED=True)
+class RetrievalCacheTests(TestCase):
+    def setUp(self):
+        for layer in caching.LAYERS:
+            caches[layer].clear()
+        self.document = Document.objects.create(
+            title='a.txt', file_path='documents/a.txt', file_type='txt', file_size=1
+        )
+
+    def test_invalidation_bumps_the_index_version(self):
+        embedding = np.ones(4, dtype=np.float32)
+        caching.set_retrieval(self.document, embedding, 3, chunk_ids(self.document.id, [0, 1]))
+        self.assertEqual(caching.get_retrieval(self.document, embedding, 3), chunk_ids(self.document.id, [0, 1]))
+        old_key = caching.retrieval_key(self.document.id, self.document.index_version, embedding, 3)
+
+        caching.invalidate_document(self.document)
+
+        self.assertEqual(self.document.index_version, 1)
+        self.assertEqual(Document.objects.get(pk=self.document.pk).index_version, 1)
+        self.assertNotEqual(caching.retrieval_key(self.document.id, 1, embedding, 3), old_key)
+        self.assertIsNone(caching.get_retrieval(self.document, embedding, 3))
+
+    def test_keys_depend_on_the_question_embedding_and_chunk_count(self):
+        embedding = np.ones(4, dtype=np.float32)
+        caching.set_retrieval(self.document, embedding, 3, ['x'])
+        self.assertIsNone(caching.get_retrieval(self.document, embedding, 5))
+        self.assertIsNone(caching.get_retrieval(self.document, embedding * 2, 3))
+
+    def test_question_embeddings_round_trip(self):
+        embedding = np.arange(4, dtype=np.float32)
+        caching.set_question_embedding('What is this?', False, embedding)
+        np.testing.assert_array_equal(caching.get_question_embedding('What is this?', False), embedding)
+        self.assertIsNone(caching.get_question_embedding('What is this?', True))
+
+    @override_settings(RAG_CACHE_ENABLED=False)
+    def test_nothing_is_cached_when_disabled(self):
+        caching.set_answer('prompt', 'model', 0.3, 'answer')
+        self.assertIsNone(caching.get_answer('prompt', 'model', 0.3))
@@ -0,0 +1,65 @@
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+
+from .. import chunk_text
+from ..models import DocumentChunk, DocumentPage
+from .utils import SAMPLE_TEXT, IsolatedIndexMixin
+
+PAGED_TEXT = SAMPLE_TEXT.replace('\n\nEducation', '\f\nEducation')
+
+
+def texts_in_order(document):
+    chunks = DocumentChunk.objects.filter(document=document).order_by('chunk_index')
+    texts = chunk_text.fetch_texts(chunks.values_list('embedding_id', flat=True))
+    return [texts[chunk_id] for chunk_id in chunks.values_list('embedding_id', flat=True)]
+
+
+class PageStorageTests(IsolatedIndexMixin, TestCase):
+    settings_overrides = dict(RAG_CHUNK_TEXT_STORAGE='pages', RAG_CHUNK_MAX_TOKENS=12, RAG_CHUNK_OVERLAP_TOKENS=4)
+
+    def test_chunks_reference_the_text_of_their_page(self):
+        document = self.processed_document(PAGED_TEXT)
+        self.assertEqual(DocumentPage.objects.filter(document=document).count(), 2)
+        chunks = DocumentChunk.objects.filter(document=document)
+        self.assertGreater(chunks.count(), 2)
+        self.assertFalse(chunks.exclude(text_content='').exists())
+
+        # The same chunks, with their embeddings reused
+        with override_settings(RAG_CHUNK_TEXT_STORAGE='inline'), self.assertLogs('documents.rag_engine', 'INFO'):
+            inline = self.processed_document(PAGED_TEXT, name='inline.txt')
+        self.assertFalse(DocumentPage.objects.filter(document=inline).exists())
+        self.assertEqual(texts_in_order(document), texts_in_order(inline))
+
+    def test_batched_iteration_matches_fetch(self):
+        document = self.processed_document(PAGED_TEXT)
+        chunks = DocumentChunk.objects.filter(document=document).order_by('chunk_index')
+        texts = [text for _, text in chunk_text.iter_chunk_texts(chunks, batch_size=2)]
+        self.assertEqual(texts, texts_in_order(document))
+
+    def test_answer_context_is_read_from_the_pages(self):
+        self.use_stub_llm()
+        document = self.processed_document(PAGED_TEXT)
+        response = Client(HTTP_HOST='localhost').post(
+            '/api/documents/ask/',
+            {'document_id': document.id, 'question': 'Where did Jane study?'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any('Porto' in text for text in response.json()['answer']['context']))
+
+    @override_settings(RAG_CHUNKER='legacy')
+    def test_legacy_chunks_are_stored_inline(self):
+        document = self.processed_document(PAGED_TEXT)
+        self.assertEqual(document.processing_status, 'completed')
+        self.assertFalse(DocumentPage.objects.filter(document=document).exists())
+        self.assertFalse(DocumentChunk.objects.filter(document=document, text_content='').exists())
+
+
+class CodecTests(SimpleTestCase):
+    def test_round_trip(self):
+        codec = chunk_text.resolve_codec('auto')
+        self.assertEqual(chunk_text.decompress(chunk_text.compress('Ação', codec), codec), 'Ação')
+        self.assertEqual(chunk_text.decompress(chunk_text.compress('Ação', 'zlib'), 'zlib'), 'Ação')
+
+    def test_unknown_codec_is_refused(self):
+        with self.assertRaises(ValueError):
+            chunk_text.resolve_codec('lz4')
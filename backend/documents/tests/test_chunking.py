@@ -0,0 +1,50 @@
+from django.test import SimpleTestCase
+
+from ..chunking import TokenChunker, WhitespaceTokenizer
+
+
+class TokenChunkerTests(SimpleTestCase):
+    def chunker(self, max_tokens=10, overlap_tokens=4, section_profile='generic'):
+        return TokenChunker(WhitespaceTokenizer(), max_tokens, overlap_tokens, section_profile)
+
+    def test_consecutive_chunks_share_the_overlap(self):
+        lines = [f'line{i} alpha beta' for i in range(12)]
+        text = '\n'.join(lines)
+        chunks = self.chunker().chunk_page(1, text)
+
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(chunk.token_count, 10)
+            self.assertEqual(text[chunk.char_start:chunk.char_end], chunk.text)
+        for previous, current in zip(chunks, chunks[1:]):
+            self.assertEqual(previous.text.split('\n')[-1], current.text.split('\n')[0])
+        covered = {line for chunk in chunks for line in chunk.text.split('\n')}
+        self.assertEqual(covered, set(lines))
+
+    def test_overlap_never_pushes_a_chunk_over_the_limit(self):
+        # The carried line fits the overlap but not next to the long line after it
+        text = 'a b c\nd e f\ng h i j k l m n'
+        chunks = self.chunker(max_tokens=10, overlap_tokens=4).chunk_page(1, text)
+
+        self.assertEqual([chunk.text for chunk in chunks], ['a b c\nd e f', 'g h i j k l m n'])
+
+    def test_section_header_starts_a_chunk_without_overlap(self):
+        text = 'Experience\nbuilt search at a logistics company\nEducation\nMSc at the University of Porto'
+        chunks = self.chunker(max_tokens=50, section_profile='resume').chunk_page(1, text)
+        self.assertEqual([chunk.text for chunk in chunks], [
+            'Experience\nbuilt search at a logistics company',
+            'Education\nMSc at the University of Porto',
+        ])
+
+    def test_long_line_is_cut_into_overlapping_windows(self):
+        words = [f'w{i}' for i in range(25)]
+        chunks = self.chunker().chunk_page(1, ' '.join(words))
+
+        self.assertEqual([chunk.token_count for chunk in chunks], [10, 10, 10, 7])
+        for previous, current in zip(chunks, chunks[1:]):
+            self.assertEqual(previous.text.split()[-4:], current.text.split()[:4])
+        self.assertEqual(chunks[-1].text.split()[-1], 'w24')
+
+    def test_overlap_must_be_smaller_than_the_chunk(self):
+        with self.assertRaises(ValueError):
+            self.chunker(max_tokens=10, overlap_tokens=10)
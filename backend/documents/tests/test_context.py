@@ -0,0 +1,63 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from ..context import MIN_TRUNCATED_TOKENS, Candidate, assemble_context
+
+
+class WordTokenizer:
+    """Counts whitespace-separated words as tokens"""
+
+    def count(self, texts):
+        return [len(text.split()) for text in texts]
+
+    def truncate(self, text, max_tokens):
+        return ' '.join(text.split()[:max_tokens])
+
+
+def candidate(number, embedding, words=10, page=1):
+    text = ' '.join(f'c{number}w{i}' for i in range(words))
+    return Candidate(f'chunk_{number}', text, page, number, 0.0, np.asarray(embedding, dtype=np.float32))
+
+
+class AssembleContextTests(SimpleTestCase):
+    def assemble(self, candidates, num_chunks=3, **options):
+        return assemble_context([1, 0, 0], candidates, num_chunks, WordTokenizer(), **options)
+
+    def test_near_duplicates_are_dropped_and_excerpts_follow_the_document(self):
+        candidates = [
+            candidate(5, [1, 0, 0], page=3),
+            candidate(6, [0.99, 0.05, 0], page=3),
+            candidate(1, [0.7, 0.7, 0], page=1),
+        ]
+        assembly = self.assemble(candidates)
+
+        self.assertEqual([chunk.chunk_id for chunk in assembly.chunks], ['chunk_1', 'chunk_5'])
+        self.assertEqual(assembly.dropped_duplicates, 1)
+        self.assertEqual(assembly.context_tokens, 20)
+
+    def test_the_chunk_that_crosses_the_budget_is_truncated(self):
+        candidates = [candidate(0, [1, 0, 0], words=60), candidate(1, [0, 1, 0], words=60)]
+        assembly = self.assemble(candidates, max_tokens=100)
+
+        self.assertEqual((assembly.context_tokens, assembly.truncated), (100, 1))
+        self.assertEqual(len(assembly.chunks[1].text.split()), 40)
+
+    def test_a_remainder_too_small_to_be_useful_is_left_out(self):
+        words = 100 - MIN_TRUNCATED_TOKENS + 1
+        candidates = [candidate(0, [1, 0, 0], words=words), candidate(1, [0, 1, 0], words=60)]
+        assembly = self.assemble(candidates, max_tokens=100)
+
+        self.assertEqual([chunk.chunk_id for chunk in assembly.chunks], ['chunk_0'])
+        self.assertEqual(assembly.truncated, 0)
+
+    def test_mmr_prefers_a_different_chunk_to_a_similar_one(self):
+        candidates = [
+            candidate(0, [0.9, 0.436, 0]),
+            candidate(1, [0.85, 0.527, 0]),
+            candidate(2, [0.8, 0, 0.6]),
+        ]
+        by_relevance = self.assemble(candidates, num_chunks=2, dedup_threshold=None)
+        diverse = self.assemble(candidates, num_chunks=2, dedup_threshold=None, mmr_lambda=0.5)
+
+        self.assertEqual([chunk.chunk_id for chunk in by_relevance.chunks], ['chunk_0', 'chunk_1'])
+        self.assertEqual([chunk.chunk_id for chunk in diverse.chunks], ['chunk_0', 'chunk_2'])
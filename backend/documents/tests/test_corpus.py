@@ -0,0 +1,70 @@
+import numpy as np
+from django.test import Client, TestCase, override_settings
+
+from ..models import Document
+from ..rag_engine import get_rag_engine
+from ..routing import DocumentRouter, centroid_bytes
+from .utils import IsolatedIndexMixin
+
+CHEF_TEXT = 'Bob Smith is a chef in Paris.\n'
+PILOT_TEXT = 'Ana Silva is an airline pilot flying out of Madrid.\n'
+
+
+class CorpusQueryTests(IsolatedIndexMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_stub_llm(tokens=5)
+        self.client = Client(HTTP_HOST='localhost')
+        self.jane = self.processed_document()
+        self.bob = self.processed_document(CHEF_TEXT, name='bob.txt')
+
+    def ask(self, document_ids, question='Who is a chef in Paris?'):
+        return self.client.post(
+            '/api/documents/ask/',
+            {'document_ids': document_ids, 'question': question},
+            content_type='application/json'
+        )
+
+    def test_ask_across_documents(self):
+        response = self.ask([self.jane.id, self.bob.id])
+        self.assertEqual(response.status_code, 200)
+        answer = response.json()['answer']
+        self.assertTrue(any('Paris' in text for text in answer['context']))
+        self.assertEqual(sorted(answer['documents_searched']), sorted([self.jane.id, self.bob.id]))
+
+    def test_ask_across_all_documents(self):
+        pending = self.stored_document(name='pending.txt')
+        response = self.ask('all')
+        self.assertEqual(response.status_code, 200)
+        # Documents still being processed are left out of the corpus
+        self.assertNotIn(pending.id, response.json()['answer']['documents_searched'])
+        self.assertEqual(self.ask([pending.id]).status_code, 404)
+
+    @override_settings(RAG_ROUTING_TOP_DOCUMENTS=1)
+    def test_question_is_routed_to_the_closest_documents(self):
+        pilot = self.processed_document(PILOT_TEXT, name='ana.txt')
+        plan = get_rag_engine().plan_corpus_answer('Who is a chef in Paris?', [self.jane.id, self.bob.id, pilot.id])
+        self.assertEqual(plan['documents_searched'], [self.bob.id])
+        self.assertTrue(all(chunk_id.startswith(f'doc_{self.bob.id}_') for chunk_id in plan['chunk_ids']))
+
+
+class DocumentRouterTests(IsolatedIndexMixin, TestCase):
+    def document_with_centroid(self, vector, name):
+        document = self.stored_document(name=name)
+        centroid = centroid_bytes(vector) if vector is not None else None
+        Document.objects.filter(pk=document.pk).update(processing_status='completed', centroid=centroid)
+        return document.id
+
+    def test_documents_are_ranked_by_centroid_similarity(self):
+        east = self.document_with_centroid([1.0, 0.0, 0.0], 'east.txt')
+        north = self.document_with_centroid([0.0, 1.0, 0.0], 'north.txt')
+        north_east = self.document_with_centroid([1.0, 1.0, 0.0], 'north_east.txt')
+        unrouted = self.document_with_centroid(None, 'unrouted.txt')
+        scope = [east, north, north_east, unrouted]
+        router = DocumentRouter()
+
+        self.assertEqual(router.route(np.array([1.0, 0.1, 0.0]), scope, 2), [east, north_east])
+        # Documents without a centroid come after every routed one
+        self.assertEqual(router.route(np.array([0.0, 1.0, 0.0]), scope, 4), [north, north_east, east, unrouted])
+        # Only documents in scope are considered
+        self.assertEqual(router.route(np.array([1.0, 0.0, 0.0]), [north, unrouted], 1), [north])
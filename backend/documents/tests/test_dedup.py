@@ -0,0 +1,97 @@
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase
+from django.utils import timezone
+
+from .. import dedup
+from ..models import ChunkEmbedding, Document
+from ..rag_engine import get_rag_engine
+from .utils import SAMPLE_TEXT, IsolatedIndexMixin
+
+
+def encoder(value, calls):
+    """Encodes every text as a row of ``value``, recording what it was asked"""
+    def encode(texts):
+        calls.append(list(texts))
+        return np.full((len(texts), 4), value, dtype=np.float32)
+    return encode
+
+
+class ChunkEmbeddingStoreTests(IsolatedIndexMixin, TestCase):
+    def test_stored_vectors_are_reused(self):
+        calls = []
+        embeddings, reused = dedup.embed_with_store(['a b', 'c'], encoder(1, calls), False)
+        self.assertEqual((embeddings.shape, reused), ((2, 4), 0))
+
+        # Whitespace does not matter; a repeated text is encoded once
+        embeddings, reused = dedup.embed_with_store(['a  b', 'd', 'd'], encoder(2, calls), False)
+        self.assertEqual(reused, 2)
+        self.assertEqual(calls, [['a b', 'c'], ['d']])
+        np.testing.assert_array_equal(embeddings[:, 0], [1, 2, 2])
+
+    def test_without_reuse_stored_vectors_are_overwritten(self):
+        calls = []
+        dedup.embed_with_store(['a b'], encoder(1, calls), False)
+        embeddings, reused = dedup.embed_with_store(['a b'], encoder(2, calls), False, reuse=False)
+
+        self.assertEqual(reused, 0)
+        np.testing.assert_array_equal(embeddings[0], [2, 2, 2, 2])
+        row = ChunkEmbedding.objects.get(text_hash=dedup.chunk_text_hash('a b'))
+        np.testing.assert_array_equal(np.frombuffer(row.vector, dtype=np.float32), [2, 2, 2, 2])
+
+    def test_overwriting_without_a_conflict_target(self):
+        # MySQL cannot name the unique fields of an upsert
+        calls = []
+        dedup.embed_with_store(['a b', 'c'], encoder(1, calls), False)
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            embeddings, reused = dedup.embed_with_store(['a b', 'e'], encoder(2, calls), False, reuse=False)
+
+        self.assertEqual(reused, 0)
+        np.testing.assert_array_equal(embeddings[:, 0], [2, 2])
+        stored = {
+            row.text_hash: np.frombuffer(row.vector, dtype=np.float32)[0] for row in ChunkEmbedding.objects.all()
+        }
+        expected = {'a b': 2, 'c': 1, 'e': 2}
+        self.assertEqual(stored, {dedup.chunk_text_hash(text): value for text, value in expected.items()})
+
+    def test_stale_embeddings_are_found(self):
+        document = self.processed_document()
+        space = dedup.embedding_space(False)
+        vector = np.zeros(4, dtype=np.float32).tobytes()
+        ChunkEmbedding.objects.create(model_name='another-model', text_hash='a' * 64, dim=4, vector=vector)
+        orphan = ChunkEmbedding.objects.create(model_name=space, text_hash='b' * 64, dim=4, vector=vector)
+        ChunkEmbedding.objects.filter(pk=orphan.pk).update(created_at=timezone.now() - timedelta(days=2))
+
+        other_spaces, unreferenced = dedup.stale_chunk_embeddings()
+        self.assertEqual(list(other_spaces.values_list('text_hash', flat=True)), ['a' * 64])
+        self.assertEqual(list(unreferenced.values_list('text_hash', flat=True)), ['b' * 64])
+        self.assertTrue(document.chunks.exists())
+
+
+class UploadDeduplicationTests(IsolatedIndexMixin, TestCase):
+    def test_identical_upload_is_linked_to_the_existing_document(self):
+        client = Client(HTTP_HOST='localhost')
+        content = SAMPLE_TEXT.encode('utf-8')
+        first = client.post('/api/documents/upload/', {'file': SimpleUploadedFile('a.txt', content)})
+        self.assertEqual(first.status_code, 202)
+
+        second = client.post('/api/documents/upload/', {'file': SimpleUploadedFile('b.txt', content)})
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue(second.json()['deduplicated'])
+        self.assertEqual(second.json()['id'], first.json()['id'])
+        self.assertEqual(Document.objects.count(), 1)
+
+    def test_same_text_in_another_document_is_not_embedded_again(self):
+        self.processed_document()
+        engine = get_rag_engine()
+        with mock.patch.object(engine, 'embed_texts', wraps=engine.embed_texts) as embed:
+            document = self.processed_document(SAMPLE_TEXT + '\nReferences on request.\n', name='copy.txt')
+
+        embedded = [text for call in embed.call_args_list for text in call.args[0]]
+        self.assertEqual(len(embedded), 1)
+        self.assertIn('References on request.', embedded[0])
+        self.assertEqual(document.chunks.count(), 4)
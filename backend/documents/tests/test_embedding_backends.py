@@ -0,0 +1,15 @@
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from ..embedding_backends import tokenizer_max_length
+
+
+class TokenizerMaxLengthTests(SimpleTestCase):
+    def test_configured_limit_is_used(self):
+        self.assertEqual(tokenizer_max_length(SimpleNamespace(model_max_length=128)), 128)
+
+    def test_missing_limit_falls_back_to_512(self):
+        # transformers reports int(1e30) when the tokenizer sets no limit
+        self.assertEqual(tokenizer_max_length(SimpleNamespace(model_max_length=int(1e30))), 512)
+        self.assertEqual(tokenizer_max_length(SimpleNamespace()), 512)
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from .. import embeddings
+from ..embedding_server import EmbeddingClient, EmbeddingServer, MicroBatcher
+from ..embeddings import encode_texts, reset_embedding_model
+
+
+def fake_encode(texts, batch_size, normalize):
+    """One row per text holding its length, after a pause that lets
+    concurrent requests pile up"""
+    time.sleep(0.02)
+    return np.array([[len(text), float(normalize)] for text in texts], dtype=np.float32)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_requests_made_before_the_batcher_runs_are_served(self):
+        async def scenario():
+            batcher = MicroBatcher(fake_encode)
+            request = asyncio.ensure_future(batcher.submit(['early'], False))
+            # The request is queued before the batching loop exists
+            await asyncio.sleep(0)
+            runner = asyncio.create_task(batcher.run())
+            try:
+                return await asyncio.wait_for(request, 5)
+            finally:
+                runner.cancel()
+
+        np.testing.assert_array_equal(asyncio.run(scenario()), [[5.0, 0.0]])
+
+
+class EmbeddingServerTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        self.address = 'unix:' + os.path.join(root, 'embed.sock')
+        self.server = EmbeddingServer(self.address, fake_encode, max_batch_size=64, max_wait_ms=20)
+
+        loop = asyncio.new_event_loop()
+        task = loop.create_task(self.server.serve_forever())
+
+        def serve():
+            try:
+                loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+
+        def stop():
+            loop.call_soon_threadsafe(task.cancel)
+            thread.join()
+            loop.close()
+
+        self.addCleanup(stop)
+        deadline = time.monotonic() + 5
+        while not os.path.exists(self.address[len('unix:'):]):
+            self.assertLess(time.monotonic(), deadline, 'embedding server did not start')
+            time.sleep(0.01)
+        reset_embedding_model()
+        self.addCleanup(reset_embedding_model)
+
+    def test_concurrent_requests_share_forward_passes(self):
+        client = EmbeddingClient(self.address, timeout=5)
+        texts = ['a' * length for length in range(1, 9)]
+        with ThreadPoolExecutor(len(texts)) as pool:
+            results = list(pool.map(lambda text: client.encode([text], normalize=text == 'aa'), texts))
+
+        for text, result in zip(texts, results):
+            np.testing.assert_array_equal(result, [[len(text), float(text == 'aa')]])
+        stats = client.stats()
+        self.assertEqual((stats['requests'], stats['texts']), (8, 8))
+        self.assertLess(stats['batches'], 8)
+
+    @override_settings(RAG_EMBEDDING_MODEL='fake', EMBEDDING_SERVER_RETRY_SECONDS=60)
+    def test_reset_picks_up_a_new_server_address(self):
+        with override_settings(EMBEDDING_SERVER_ADDRESS='unix:/nonexistent/embed.sock'):
+            # Falls back to the in-process model and stops trying the server
+            self.assertEqual(encode_texts(['local']).shape[0], 1)
+            self.assertIsNotNone(embeddings._client)
+
+        reset_embedding_model()
+        self.assertIsNone(embeddings._client)
+        with override_settings(EMBEDDING_SERVER_ADDRESS=self.address):
+            np.testing.assert_array_equal(encode_texts(['remote'], normalize=False), [[6.0, 0.0]])
+        self.assertEqual(self.server.batcher.stats.requests, 1)
@@ -0,0 +1,51 @@
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from .. import embeddings, rag_engine
+from ..rag_engine import get_rag_engine
+from .utils import IsolatedIndexMixin
+
+
+class SharedEngineTests(IsolatedIndexMixin, SimpleTestCase):
+    def test_threads_share_one_engine(self):
+        barrier = threading.Barrier(8)
+        engines = []
+
+        def build():
+            barrier.wait()
+            engines.append(get_rag_engine())
+
+        with mock.patch.object(rag_engine, 'RAGEngine', side_effect=rag_engine.RAGEngine) as create:
+            threads = [threading.Thread(target=build) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        create.assert_called_once()
+        self.assertEqual(len({id(engine) for engine in engines}), 1)
+
+    def test_engine_loads_the_embedding_model_on_first_use(self):
+        get_rag_engine()
+        self.assertIsNone(embeddings._model)
+
+        get_rag_engine().embed_texts(['first'])
+        self.assertIsNotNone(embeddings._model)
+
+    def warmup(self, *args):
+        stdout = StringIO()
+        call_command('warmup', *args, stdout=stdout)
+        return dict(line.split(': ', 1) for line in stdout.getvalue().splitlines())
+
+    def test_warmup_command_loads_the_model_and_reports(self):
+        report = self.warmup('--no-encode')
+        self.assertIsNotNone(embeddings._model)
+        self.assertEqual(report['model'], 'fake')
+        self.assertEqual(report['warmup_encode_seconds'], 'None')
+
+        report = self.warmup()
+        self.assertNotEqual(report['warmup_encode_seconds'], 'None')
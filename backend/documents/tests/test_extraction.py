@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+
+import fitz
+from django.test import SimpleTestCase
+from docx import Document as DocxDocument
+from docx.enum.text import WD_BREAK
+
+from .. import extraction
+from ..extraction import PageExtractor
+
+
+def shutdown_extraction_pool():
+    if extraction._pool is not None:
+        extraction._pool.shutdown()
+        extraction._pool = extraction._pool_key = None
+
+
+class PageExtractorTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+
+    def extract(self, path, file_type, **options):
+        with PageExtractor(path, file_type, **options) as extractor:
+            page_count = extractor.page_count
+            pages = list(extractor.pages())
+        return page_count, pages, extractor
+
+    def make_pdf(self, pages):
+        path = os.path.join(self.root, 'report.pdf')
+        pdf = fitz.open()
+        for number in range(1, pages + 1):
+            pdf.new_page().insert_text((72, 72), f'Page {number} of the report')
+        pdf.save(path)
+        pdf.close()
+        return path
+
+    def test_pdf_pages_are_read_one_at_a_time(self):
+        page_count, pages, extractor = self.extract(self.make_pdf(3), 'pdf')
+
+        # Known before the first page is read, so progress can be reported
+        self.assertEqual(page_count, 3)
+        self.assertEqual([number for number, _ in pages], [1, 2, 3])
+        self.assertEqual([text.strip() for _, text in pages], [f'Page {n} of the report' for n in range(1, 4)])
+        self.assertEqual(extractor.pages_done, 3)
+        self.assertEqual(extractor.chars_extracted, sum(len(text.strip()) for _, text in pages))
+
+    def test_large_pdf_is_extracted_in_page_order_by_worker_processes(self):
+        path = self.make_pdf(9)
+        self.addCleanup(shutdown_extraction_pool)
+
+        _, pages, _ = self.extract(path, 'pdf', parallel_workers=2, parallel_min_pages=5, pages_per_task=2)
+
+        self.assertEqual([number for number, _ in pages], list(range(1, 10)))
+        self.assertEqual([text.strip() for _, text in pages], [f'Page {n} of the report' for n in range(1, 10)])
+        self.assertIsNotNone(extraction._pool)
+
+    def test_docx_is_split_at_page_breaks(self):
+        path = os.path.join(self.root, 'letter.docx')
+        docx = DocxDocument()
+        docx.add_paragraph('First page')
+        docx.add_paragraph('Still the first page').add_run().add_break(WD_BREAK.PAGE)
+        docx.add_paragraph('Second page')
+        docx.save(path)
+
+        page_count, pages, extractor = self.extract(path, 'docx')
+
+        self.assertIsNone(page_count)
+        self.assertEqual(pages, [(1, 'First page\n\nStill the first page'), (2, 'Second page')])
+        self.assertEqual(extractor.page_count, 2)
+
+    def test_text_pages_are_capped_at_twice_the_page_size(self):
+        text = 'x' * 5000 + '\n' + '\n'.join(f'row {i},a,b,c' for i in range(400)) + '\n\fafter the form feed\n'
+        path = os.path.join(self.root, 'log.txt')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+
+        _, pages, _ = self.extract(path, 'txt', text_page_chars=1000)
+
+        self.assertEqual([number for number, _ in pages], list(range(1, len(pages) + 1)))
+        self.assertTrue(all(len(page) <= 2000 for _, page in pages))
+        self.assertEqual(''.join(page for _, page in pages), text.replace('\f', ''))
+        self.assertEqual(pages[-1][1], 'after the form feed\n')
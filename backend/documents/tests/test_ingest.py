@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from ..models import DocumentChunk
+from ..rag_engine import get_rag_engine
+from .utils import IsolatedIndexMixin
+
+TEXTS = ['alpha first chunk', 'beta second chunk', 'gamma third chunk', 'delta fourth chunk', 'epsilon fifth']
+
+
+def failing_after(texts):
+    """A chunk source that breaks once ``texts`` are consumed"""
+    yield from texts
+    raise RuntimeError('extraction failed')
+
+
+@override_settings(RAG_INGEST_BATCH_SIZE=2)
+class StoreChunksTests(IsolatedIndexMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.engine = get_rag_engine()
+        self.document = self.stored_document()
+
+    def stored_rows(self):
+        """Chunk id -> chunk_index, as the vector store and the database hold it"""
+        store = self.engine.vector_store
+        stored = store.get(store.list_ids(self.document.id))
+        vectors = {
+            chunk_id: metadata['chunk_index'] for chunk_id, metadata in zip(stored['ids'], stored['metadatas'])
+        }
+        rows = dict(DocumentChunk.objects.filter(document=self.document).values_list('embedding_id', 'chunk_index'))
+        return vectors, rows
+
+    def test_processing_indexes_every_chunk(self):
+        document = self.processed_document(name='other.txt')
+        ids = sorted(document.chunks.values_list('embedding_id', flat=True))
+        self.assertTrue(ids)
+        self.assertEqual(sorted(self.engine.vector_store.list_ids(document.id)), ids)
+        self.assertEqual(sorted(self.engine.lexical_index.list_ids(document.id)), ids)
+        self.assertEqual(document.index_version, 1)
+
+    def test_chunks_are_embedded_and_written_in_batches(self):
+        with mock.patch.object(self.engine, 'embed_texts', wraps=self.engine.embed_texts) as embed:
+            count = self.engine.store_chunks(self.document, TEXTS)
+
+        self.assertEqual(count, len(TEXTS))
+        self.assertEqual([len(call.args[0]) for call in embed.call_args_list], [2, 2, 1])
+        vectors, rows = self.stored_rows()
+        self.assertEqual(sorted(rows.values()), list(range(len(TEXTS))))
+        self.assertEqual(vectors, rows)
+        self.assertIsNotNone(self.document.centroid)
+
+    def test_failed_ingest_leaves_no_rows_or_vectors(self):
+        with self.assertRaises(RuntimeError):
+            self.engine.store_chunks(self.document, failing_after(TEXTS[:3]))
+
+        self.assertEqual(self.stored_rows(), ({}, {}))
+        self.assertEqual(self.engine.lexical_index.list_ids(self.document.id), [])
+        # Nothing from the failed run is left pending for the next commit
+        self.engine.store_chunks(self.document, TEXTS[3:])
+        vectors, rows = self.stored_rows()
+        self.assertEqual(len(vectors), 2)
+        self.assertEqual(vectors, rows)
+
+    def test_failed_reprocess_restores_kept_chunks(self):
+        for backend in ('numpy', 'chroma'):
+            with self.subTest(backend=backend):
+                if backend == 'chroma':
+                    self.use_chroma()
+                self.document = self.stored_document(name=f'{backend}.txt')
+                self.engine.store_chunks(self.document, TEXTS[:3])
+                before = self.stored_rows()
+
+                # Kept chunks move to new positions before the source breaks
+                with self.assertRaises(RuntimeError):
+                    self.engine.store_chunks(self.document, failing_after(['a new first chunk', *TEXTS[:3]]))
+
+                self.assertEqual(self.stored_rows(), before)
+                self.assertEqual(
+                    sorted(self.engine.lexical_index.list_ids(self.document.id)), sorted(before[1])
+                )
@@ -0,0 +1,171 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.apps import apps
+from django.db import connection
+from django.test import Client, SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .. import jobs
+from ..apps import serves_requests
+from ..jobs import IngestionWorker, claim_lock, enqueue_document
+from ..models import IngestionJob
+from ..rag_engine import get_rag_engine, reset_rag_engine
+from .utils import IsolatedIndexMixin
+
+
+class IngestionJobTests(IsolatedIndexMixin, TransactionTestCase):
+    """The worker closes its database connection after a job, which a
+    TestCase transaction would not survive"""
+
+    settings_overrides = dict(INGEST_MAX_ATTEMPTS=2, INGEST_RETRY_BACKOFF_SECONDS=0)
+
+    def setUp(self):
+        super().setUp()
+        self.worker = IngestionWorker(get_rag_engine(), concurrency=1, poll_interval=0.05, worker_id='test-worker')
+
+    def make_stale(self, job):
+        IngestionJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+
+    def test_worker_claims_and_processes_a_queued_document(self):
+        document = self.stored_document()
+        job = enqueue_document(document)
+
+        claimed = self.worker.claim_next_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual((claimed.status, claimed.attempts, claimed.locked_by), ('running', 1, 'test-worker'))
+        self.assertIsNone(self.worker.claim_next_job())
+
+        self.worker.run_job(claimed)
+        job.refresh_from_db()
+        document.refresh_from_db()
+        self.assertEqual((job.status, job.stage), ('succeeded', 'completed'))
+        self.assertEqual(document.processing_status, 'completed')
+        self.assertGreater(document.chunks.count(), 0)
+
+        response = Client(HTTP_HOST='localhost').get(f'/api/documents/{document.id}/status/')
+        self.assertEqual(response.json()['processing_status'], 'completed')
+        self.assertEqual(response.json()['job']['percent'], 100.0)
+
+    def test_failed_job_is_retried_then_marked_failed(self):
+        document = self.stored_document(text='   \n')
+        job = enqueue_document(document)
+
+        self.worker.run_job(self.worker.claim_next_job())
+        job.refresh_from_db()
+        document.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('No text content', job.last_error)
+        self.assertEqual(document.processing_status, 'pending')
+
+        self.worker.run_job(self.worker.claim_next_job())
+        job.refresh_from_db()
+        document.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertEqual(document.processing_status, 'failed')
+        self.assertIsNone(self.worker.claim_next_job())
+
+    def test_job_without_heartbeat_is_requeued(self):
+        job = enqueue_document(self.stored_document())
+        self.worker.claim_next_job()
+        self.make_stale(job)
+
+        self.assertEqual(self.worker.requeue_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ('queued', ''))
+
+    def test_job_that_keeps_killing_its_worker_fails(self):
+        document = self.stored_document()
+        job = enqueue_document(document)
+        for _ in range(2):
+            self.worker.claim_next_job()
+            self.make_stale(job)
+            self.worker.requeue_stale_jobs()
+
+        job.refresh_from_db()
+        document.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIn('stopped responding', job.last_error)
+        self.assertEqual(document.processing_status, 'failed')
+        self.assertIsNone(self.worker.claim_next_job())
+
+    def test_drain_waits_for_retries_that_are_not_due_yet(self):
+        document = self.stored_document()
+        job = enqueue_document(document)
+        IngestionJob.objects.filter(pk=job.pk).update(run_after=timezone.now() + timedelta(seconds=0.5))
+
+        stop = threading.Event()
+        # Only a safety net should the loop never return
+        timer = threading.Timer(30, stop.set)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.worker.run_forever(stop_event=stop, exit_when_idle=True)
+
+        self.assertFalse(stop.is_set())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+
+    @override_settings(INGEST_MAX_CONCURRENT_JOBS=2)
+    def test_concurrent_claims_respect_the_running_job_cap(self):
+        for number in range(6):
+            enqueue_document(self.stored_document(name=f'resume{number}.txt'))
+        workers = [IngestionWorker(get_rag_engine(), worker_id=f'worker-{n}') for n in range(6)]
+        barrier = threading.Barrier(len(workers))
+        claimed = []
+
+        def claim(worker):
+            barrier.wait()
+            try:
+                claimed.append(worker.claim_next_job())
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim, args=(worker,)) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len([job for job in claimed if job is not None]), 2)
+        self.assertEqual(IngestionJob.objects.filter(status='running').count(), 2)
+
+    def test_no_job_is_claimed_while_another_worker_holds_the_claim_lock(self):
+        enqueue_document(self.stored_document())
+        claimed = []
+        with mock.patch.object(jobs, 'CLAIM_LOCK_TIMEOUT_SECONDS', 0.01), claim_lock():
+            thread = threading.Thread(target=lambda: claimed.append(self.worker.claim_next_job()))
+            thread.start()
+            thread.join()
+        self.assertEqual(claimed, [None])
+        self.assertIsNotNone(self.worker.claim_next_job())
+
+
+class WorkerStartupTests(SimpleTestCase):
+    def test_only_serving_processes_start_the_worker(self):
+        cases = [
+            (['manage.py', 'runserver'], {'RUN_MAIN': 'true'}, True),
+            (['manage.py', 'runserver'], {}, False),
+            (['manage.py', 'runserver', '--noreload'], {}, True),
+            (['manage.py', 'migrate'], {}, False),
+            (['/venv/bin/gunicorn', 'document_intelligence.wsgi'], {}, False),
+            (['/venv/bin/uvicorn', 'document_intelligence.asgi:application'], {}, True),
+        ]
+        for argv, environ, expected in cases:
+            with self.subTest(argv=argv, environ=environ):
+                with mock.patch('sys.argv', argv), mock.patch.dict('os.environ', environ, clear=True):
+                    self.assertIs(serves_requests(), expected)
+
+    @override_settings(INGEST_WORKER_MODE='thread', RAG_WARMUP_ON_STARTUP=False)
+    def test_server_start_starts_the_worker_for_queued_jobs(self):
+        config = apps.get_app_config('documents')
+        self.addCleanup(reset_rag_engine)
+        with mock.patch.object(jobs, 'start_local_worker') as start:
+            with mock.patch('sys.argv', ['manage.py', 'runserver', '--noreload']):
+                config.ready()
+            start.assert_called_once_with(get_rag_engine())
+
+            start.reset_mock()
+            with mock.patch('sys.argv', ['manage.py', 'test']):
+                config.ready()
+            start.assert_not_called()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ..lexical import LexicalStore, is_identifier, lexical_terms, query_terms, reciprocal_rank_fusion
+from ..rag_engine import get_rag_engine
+from .utils import SAMPLE_TEXT, IsolatedIndexMixin, chunk_ids
+
+
+class LexicalStoreTests(SimpleTestCase):
+    TEXTS = [
+        'Kubernetes operator written in Go for the deployment pipeline',
+        'Python data pipelines and pipeline monitoring',
+        'MSc in Computer Science, University of Porto',
+    ]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.store = LexicalStore(self.root)
+        self.store.add(chunk_ids(1, range(3)), self.TEXTS)
+        self.store.commit(1)
+
+    def ranked(self, question):
+        return [chunk_id for chunk_id, _ in self.store.search(1, lexical_terms(question), 3)]
+
+    def test_bm25_ranks_chunks_matching_more_terms_first(self):
+        self.assertEqual(self.ranked('kubernetes pipeline'), chunk_ids(1, [0, 1]))
+        self.assertEqual(self.ranked('Porto'), chunk_ids(1, [2]))
+        self.assertEqual(self.ranked('haskell'), [])
+
+    def test_has_terms_needs_every_term(self):
+        self.assertTrue(self.store.has_terms(1, ['porto']))
+        self.assertFalse(self.store.has_terms(1, ['porto', 'haskell']))
+
+    def test_recommitted_chunks_replace_their_terms(self):
+        self.store.add(chunk_ids(1, [0]), ['Haskell compiler work'])
+        self.store.commit(1)
+        self.assertEqual(self.ranked('haskell'), chunk_ids(1, [0]))
+        self.assertEqual(self.ranked('kubernetes'), [])
+
+    def test_delete_chunks_and_documents(self):
+        self.store.delete(ids=chunk_ids(1, [0]))
+        self.assertEqual(self.ranked('kubernetes pipeline'), chunk_ids(1, [1]))
+
+        self.store.delete(document_id=1)
+        self.assertEqual(self.store.list_ids(1), [])
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'doc_1')))
+
+    def test_identifiers_are_indexed_whole_and_as_their_parts(self):
+        self.store.add(chunk_ids(1, [3]), ['Contact jane.doe@example.com or +351 912 345 678, C++ and node.js'])
+        self.store.commit(1)
+
+        for question in ('jane.doe@example.com', '351 912 345 678', '+351912345678', 'c++', 'node.js', 'example'):
+            with self.subTest(question=question):
+                self.assertEqual(self.ranked(question), chunk_ids(1, [3]))
+
+    def test_only_terms_with_digits_or_symbols_are_identifiers(self):
+        terms = query_terms('her experience with C++, node.js and x86 at jane@example.com, 912 345 678')
+        self.assertEqual(
+            [term for term in terms if is_identifier(term)],
+            ['c++', 'node.js', 'x86', 'jane@example.com', '912345678']
+        )
+
+    def test_reciprocal_rank_fusion_favours_ids_ranked_high_in_both(self):
+        fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['b', 'd', 'a']])
+        self.assertEqual(fused, ['b', 'a', 'd', 'c'])
+
+
+@override_settings(RAG_HYBRID_ENABLED=True, RAG_LEXICAL_FAST_PATH=True, RAG_LEXICAL_FAST_PATH_MAX_TERMS=4)
+class LexicalFastPathTests(IsolatedIndexMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        text = SAMPLE_TEXT + "\nEmail jane.doe@example.com, phone +351 912 345 678. Her experience spans Go and C++.\n"
+        self.document = self.processed_document(text)
+        self.engine = get_rag_engine()
+
+    def fast_path(self, question):
+        return self.engine.lexical_fast_path(self.document, question, 3)
+
+    def test_identifier_lookups_skip_the_embedding_model(self):
+        for question in ('jane.doe@example.com', '+351 912 345 678', 'C++ and Go'):
+            with self.subTest(question=question):
+                candidates = self.fast_path(question)
+                self.assertIsNotNone(candidates)
+                self.assertIn('jane.doe@example.com', candidates[0].text)
+
+    def test_plain_word_questions_use_vector_search(self):
+        # Every term occurs in the document, but none is an identifier
+        self.assertTrue(self.engine.lexical_index.has_terms(self.document.id, query_terms('what is her experience')))
+        self.assertIsNone(self.fast_path('what is her experience'))
+        self.assertIsNone(self.fast_path('Where is Jane based?'))
+
+    def test_identifiers_missing_from_the_document_use_vector_search(self):
+        self.assertIsNone(self.fast_path('john@example.com'))
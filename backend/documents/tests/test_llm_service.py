@@ -0,0 +1,99 @@
+import asyncio
+import os
+import threading
+import time
+from unittest import mock
+
+import httpx
+from django.test import SimpleTestCase
+from tenacity import wait_none
+
+from ..llm_service import AdmissionController, LLMClient, LLMOverloaded, LLMUnavailable
+from ..stub_llm import StubLLMServer
+
+COMPLETION = {'choices': [{'message': {'role': 'assistant', 'content': 'hello'}}]}
+
+
+class LLMClientTests(SimpleTestCase):
+    def client_answering(self, *statuses, max_retries=2):
+        """A client whose requests get ``statuses`` in turn, 200 once they run out"""
+        client = LLMClient('http://llm.test/v1', 'key', 'model', max_retries=max_retries)
+        replies = list(statuses)
+        self.requests = []
+
+        def handle(request):
+            self.requests.append(request)
+            status = replies.pop(0) if replies else 200
+            return httpx.Response(status, json=COMPLETION if status == 200 else {'error': 'busy'})
+
+        client._sync_client = httpx.Client(transport=httpx.MockTransport(handle))
+        client._sync_pid = os.getpid()
+        self.addCleanup(client.close)
+        patcher = mock.patch('documents.llm_service.wait_random_exponential', return_value=wait_none())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return client
+
+    def test_transient_errors_are_retried(self):
+        client = self.client_answering(503, 429)
+        self.assertEqual(client.complete('hi'), 'hello')
+        self.assertEqual(len(self.requests), 3)
+
+    def test_gives_up_after_the_retries(self):
+        client = self.client_answering(503, 503, 503, 503)
+        with self.assertRaises(LLMUnavailable):
+            client.complete('hi')
+        self.assertEqual(len(self.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        client = self.client_answering(400)
+        with self.assertRaises(LLMUnavailable):
+            client.complete('hi')
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(client.stats()['in_flight'], 0)
+
+    def test_answers_are_streamed_from_the_api(self):
+        stub = StubLLMServer(first_token_ms=0, token_ms=0, tokens=3).start()
+        self.addCleanup(stub.stop)
+        client = LLMClient(stub.api_base, 'stub', 'stub')
+
+        async def collect():
+            return [piece async for piece in client.astream('hi')]
+
+        self.assertEqual(''.join(asyncio.run(collect())).strip(), 'word0 word1 word2')
+        self.assertEqual(client.complete('hi'), 'word0 word1 word2')
+
+
+class AdmissionControllerTests(SimpleTestCase):
+    def test_requests_beyond_the_queue_are_shed_at_once(self):
+        admission = AdmissionController(max_concurrency=1, max_queue=0, queue_timeout=5)
+        admission.acquire()
+        with self.assertRaises(LLMOverloaded):
+            admission.acquire()
+        self.assertEqual(admission.snapshot()['shed'], 1)
+
+    def test_queued_request_gives_up_after_the_timeout(self):
+        admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+        admission.acquire()
+        with self.assertRaises(LLMOverloaded):
+            admission.acquire()
+        self.assertEqual(admission.snapshot()['queued'], 0)
+
+    def test_released_slot_goes_to_the_oldest_waiter(self):
+        admission = AdmissionController(max_concurrency=1, max_queue=2, queue_timeout=5)
+        admission.acquire()
+        acquired = threading.Event()
+
+        def wait_for_slot():
+            admission.acquire()
+            acquired.set()
+
+        thread = threading.Thread(target=wait_for_slot)
+        thread.start()
+        while not admission.snapshot()['queued']:
+            time.sleep(0.001)
+        admission.release()
+        thread.join()
+
+        self.assertTrue(acquired.is_set())
+        self.assertEqual(admission.snapshot()['in_flight'], 1)
@@ -0,0 +1,83 @@
+import time
+
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+
+from .. import metrics
+from .utils import IsolatedIndexMixin
+
+
+class SpanTests(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_nested_spans_record_exclusive_time(self):
+        with metrics.collect() as timings:
+            with metrics.span('retrieve'):
+                time.sleep(0.01)
+                with metrics.span('embed'):
+                    time.sleep(0.1)
+
+        self.assertGreaterEqual(timings.stages['embed'], 0.1)
+        self.assertGreaterEqual(timings.stages['retrieve'], 0.01)
+        # The embed time is not counted again in the enclosing span
+        self.assertLess(timings.stages['retrieve'], 0.1)
+
+    def test_timed_counts_only_the_time_spent_producing_items(self):
+        def pages():
+            for page in range(3):
+                time.sleep(0.01)
+                yield page
+
+        with metrics.collect() as timings:
+            for _ in metrics.timed('extract', pages()):
+                time.sleep(0.05)
+
+        self.assertGreaterEqual(timings.stages['extract'], 0.03)
+        self.assertLess(timings.stages['extract'], 0.15)
+        self.assertIn('rag_stage_seconds_count{stage="extract"} 1', metrics.exposition())
+
+    def test_histogram_exposition(self):
+        metrics.stage_seconds.observe('llm', 0.2)
+        metrics.stage_seconds.observe('llm', 3.0)
+        lines = metrics.exposition().splitlines()
+
+        self.assertIn('rag_stage_seconds_bucket{stage="llm",le="0.25"} 1', lines)
+        self.assertIn('rag_stage_seconds_bucket{stage="llm",le="5.0"} 2', lines)
+        self.assertIn('rag_stage_seconds_bucket{stage="llm",le="+Inf"} 2', lines)
+        self.assertIn('rag_stage_seconds_sum{stage="llm"} 3.200000', lines)
+
+
+class MetricsEndpointTests(IsolatedIndexMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.client = Client(HTTP_HOST='localhost')
+
+    def test_ingest_and_query_stages_are_exported(self):
+        self.use_stub_llm()
+        document = self.processed_document()
+        self.assertGreater(document.ingest_timings['embed'], 0)
+        self.assertGreaterEqual(document.ingest_timings['total'], document.ingest_timings['embed'])
+
+        response = self.client.post(
+            '/api/documents/ask/',
+            {'document_id': document.id, 'question': 'Where did Jane study?'},
+            content_type='application/json'
+        )
+        timing = response['Server-Timing']
+        for stage in ('embed', 'retrieve', 'llm', 'total'):
+            self.assertIn(f'{stage};dur=', timing)
+
+        body = self.client.get('/metrics').content.decode()
+        for line in (
+            'rag_documents_ingested_total{result="completed"} 1',
+            'rag_requests_total{view="ask_question",status="200"} 1',
+            'rag_stage_seconds_count{stage="llm"} 1',
+        ):
+            self.assertIn(line, body)
+
+    @override_settings(RAG_METRICS_ENABLED=False)
+    def test_endpoint_can_be_disabled(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
@@ -0,0 +1,81 @@
+import threading
+from unittest import mock
+
+from django.test import Client, TestCase
+
+from ..llm_service import LLMOverloaded
+from ..rag_engine import get_rag_engine
+from .utils import IsolatedIndexMixin
+
+QUESTIONS = ['Where did Jane study?', 'Which skills does Jane have?', 'Which city is Jane based in?']
+
+
+class QueryTests(IsolatedIndexMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.stub = self.use_stub_llm(tokens=5)
+        self.client = Client(HTTP_HOST='localhost')
+        self.document = self.processed_document()
+        self.engine = get_rag_engine()
+
+    def ask(self, **data):
+        return self.client.post('/api/documents/ask/', data, content_type='application/json')
+
+    def ask_batch(self, questions):
+        return self.client.post(
+            '/api/documents/ask/batch/',
+            {'document_id': self.document.id, 'questions': questions},
+            content_type='application/json'
+        )
+
+    def test_ask(self):
+        response = self.ask(document_id=self.document.id, question='Where did Jane study?')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['answer']['answer'], 'word0 word1 word2 word3 word4')
+        self.assertTrue(any('Porto' in text for text in response.json()['answer']['context']))
+
+    def test_ask_about_unprocessed_document(self):
+        document = self.stored_document(name='pending.txt')
+        self.assertEqual(self.ask(document_id=document.id, question='Anything?').status_code, 400)
+
+    def test_ask_batch(self):
+        with mock.patch.object(self.engine, 'embed_texts', wraps=self.engine.embed_texts) as embed:
+            response = self.ask_batch(QUESTIONS)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['succeeded'], response.json()['failed']), (3, 0))
+        self.assertEqual([result['question'] for result in response.json()['results']], QUESTIONS)
+        self.assertEqual(self.stub.stats.snapshot()['requests'], 3)
+        # One encode call for every question
+        self.assertEqual([call.args[0] for call in embed.call_args_list], [QUESTIONS])
+
+    def test_batch_llm_calls_run_concurrently(self):
+        barrier = threading.Barrier(len(QUESTIONS), timeout=5)
+
+        def generate_answer(prompt, context):
+            # Only returns once every question's call is in flight
+            barrier.wait()
+            return 'answer', 'llm'
+
+        with mock.patch.object(self.engine, 'generate_answer', side_effect=generate_answer):
+            response = self.ask_batch(QUESTIONS)
+
+        self.assertEqual(response.json()['succeeded'], 3)
+
+    def test_a_failed_question_does_not_fail_the_batch(self):
+        def generate_answer(prompt, context):
+            if 'skills' in prompt:
+                raise LLMOverloaded('Too many requests')
+            return 'answer', 'llm'
+
+        with mock.patch.object(self.engine, 'generate_answer', side_effect=generate_answer), \
+                self.assertLogs('documents.rag_engine', 'ERROR'):
+            response = self.ask_batch(QUESTIONS)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['succeeded'], response.json()['failed']), (2, 1))
+        self.assertIn('Too many requests', response.json()['results'][1]['error'])
+        self.assertEqual(response.json()['results'][0]['answer']['answer'], 'answer')
+
+    def test_empty_batch_is_rejected(self):
+        self.assertEqual(self.ask_batch([]).status_code, 400)
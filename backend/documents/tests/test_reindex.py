@@ -0,0 +1,82 @@
+import os
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase
+
+from ..models import Document, IngestionJob
+from ..rag_engine import get_rag_engine
+from .utils import IsolatedIndexMixin
+
+PAGES = [
+    'Jane Doe is a software engineer based in Lisbon.',
+    'Education: MSc in Computer Science, University of Porto.',
+    'Skills: Django, PostgreSQL, Kubernetes, information retrieval.',
+]
+
+
+def paged(pages):
+    return '\f'.join(pages) + '\n'
+
+
+class ReindexTests(IsolatedIndexMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client(HTTP_HOST='localhost')
+        self.engine = get_rag_engine()
+        self.document = self.processed_document(paged(PAGES))
+
+    def chunk_ids(self):
+        return sorted(self.document.chunks.values_list('embedding_id', flat=True))
+
+    def reprocess(self):
+        """Process the document again; return the texts embedded and the
+        log lines"""
+        with mock.patch.object(self.engine, 'embed_texts', wraps=self.engine.embed_texts) as embed_texts, \
+                self.assertLogs('documents.rag_engine', 'INFO') as logs:
+            self.engine.process_document(self.document)
+        self.document.refresh_from_db()
+        return [text for call in embed_texts.call_args_list for text in call.args[0]], logs.output
+
+    def test_reprocessing_an_unchanged_document_keeps_its_chunks(self):
+        before = self.chunk_ids()
+        embedded, logs = self.reprocess()
+        self.assertEqual(self.chunk_ids(), before)
+        self.assertEqual(embedded, [])
+        self.assertIn('0/3 pages changed', '\n'.join(logs))
+        self.assertEqual(sorted(self.engine.vector_store.list_ids(self.document.id)), before)
+
+    def test_edited_file_reembeds_only_changed_pages(self):
+        before = set(self.chunk_ids())
+        edited = [PAGES[0], 'Education: PhD in Physics, University of Coimbra.', PAGES[2]]
+        response = self.client.post(
+            f'/api/documents/{self.document.id}/reprocess/',
+            {'file': SimpleUploadedFile('resume.txt', paged(edited).encode('utf-8'))}
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(IngestionJob.objects.filter(document=self.document, status='queued').count(), 1)
+        # The queued document cannot be reprocessed again until its job runs
+        self.assertEqual(self.client.post(f'/api/documents/{self.document.id}/reprocess/').status_code, 409)
+
+        self.document.refresh_from_db()
+        embedded, logs = self.reprocess()
+        self.assertIn('1/3 pages changed', '\n'.join(logs))
+        after = set(self.chunk_ids())
+        self.assertTrue(embedded)
+        self.assertTrue(all('Coimbra' in text for text in embedded))
+        self.assertTrue(before & after)
+        self.assertNotEqual(before, after)
+        self.assertEqual(sorted(self.engine.vector_store.list_ids(self.document.id)), sorted(after))
+
+    def test_changed_pages(self):
+        self.assertEqual(self.engine.changed_pages(['a', 'b', 'c'], ['a', 'x', 'c', 'y']), [2, 4])
+        self.assertEqual(self.engine.changed_pages(['a', 'b'], ['b', 'a']), [])
+
+    def test_delete_removes_the_document_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/documents/{self.document.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.engine.vector_store.list_ids(self.document.id), [])
+        self.assertEqual(self.engine.lexical_index.list_ids(self.document.id), [])
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'vector_index', f'doc_{self.document.id}')))
+        self.assertFalse(Document.objects.exists())
@@ -0,0 +1,55 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from ..models import Document
+from ..semantic_cache import SemanticAnswerCache
+
+
+class SemanticAnswerCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.document = Document(id=1, index_version=0)
+        self.cache = SemanticAnswerCache(threshold=0.9, max_entries_per_document=20, max_total_entries=100)
+
+    def test_near_duplicate_question_with_the_same_context_hits(self):
+        self.cache.store(self.document, [1, 0, 0, 0.1], ['c1', 'c2'], 'answer')
+
+        answer, similarity = self.cache.lookup(self.document, [1, 0, 0, 0], ['c2', 'c1'])
+        self.assertEqual(answer, 'answer')
+        self.assertGreater(similarity, 0.9)
+        self.assertIsNone(self.cache.lookup(self.document, [1, 0, 0, 0], ['c3']))
+        self.assertIsNone(self.cache.lookup(self.document, [0, 1, 0, 0], ['c1', 'c2']))
+
+    def test_reindexed_document_drops_its_entries(self):
+        self.cache.store(self.document, [1, 0], ['c1'], 'answer')
+        self.document.index_version = 1
+        self.assertIsNone(self.cache.lookup(self.document, [1, 0], ['c1']))
+
+    def test_ring_keeps_the_latest_entries(self):
+        vectors = np.eye(32)
+        for i in range(25):
+            self.cache.store(self.document, vectors[i], ['c1'], f'answer {i}')
+
+        self.assertIsNone(self.cache.lookup(self.document, vectors[4], ['c1']))
+        self.assertEqual(self.cache.lookup(self.document, vectors[5], ['c1'])[0], 'answer 5')
+        self.assertEqual(self.cache.lookup(self.document, vectors[24], ['c1'])[0], 'answer 24')
+
+    def test_entries_added_after_the_ring_grows_are_all_kept(self):
+        cache = SemanticAnswerCache(threshold=0.9, max_entries_per_document=64, max_total_entries=100)
+        vectors = np.eye(40)
+        for i in range(40):
+            cache.store(self.document, vectors[i], ['c1'], f'answer {i}')
+
+        for i in range(40):
+            self.assertEqual(cache.lookup(self.document, vectors[i], ['c1'])[0], f'answer {i}')
+
+    def test_total_cap_evicts_the_least_recently_used_document(self):
+        cache = SemanticAnswerCache(threshold=0.9, max_entries_per_document=8, max_total_entries=4)
+        other = Document(id=2, index_version=0)
+        vectors = np.eye(4)
+        for i in range(3):
+            cache.store(self.document, vectors[i], ['c1'], f'first {i}')
+        for i in range(3):
+            cache.store(other, vectors[i], ['c1'], f'second {i}')
+
+        self.assertIsNone(cache.lookup(self.document, vectors[0], ['c1']))
+        self.assertEqual(cache.lookup(other, vectors[0], ['c1'])[0], 'second 0')
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from django.test import TransactionTestCase
+
+from ..management.commands.bench_streaming import STREAMING_PATH, asgi_request
+from .utils import IsolatedIndexMixin
+
+
+class StreamingAnswerTests(IsolatedIndexMixin, TransactionTestCase):
+    """POST ask/stream/ through the ASGI application against the stub LLM"""
+
+    first_token_ms = 20
+    token_ms = 30
+    tokens = 20
+
+    def setUp(self):
+        super().setUp()
+        self.stub = self.use_stub_llm(self.first_token_ms, self.token_ms, self.tokens)
+        self.document = self.processed_document()
+
+    def ask(self, abort_after_tokens=None):
+        from document_intelligence.asgi import application
+
+        payload = {'document_id': self.document.id, 'question': 'Where does Jane work?'}
+        return asyncio.run(asgi_request(application, STREAMING_PATH, payload, abort_after_tokens))
+
+    def test_first_event_arrives_before_generation_finishes(self):
+        timings = self.ask()
+
+        self.assertEqual(timings['status'], 200)
+        names = [name for name, _ in timings['events']]
+        self.assertEqual(names[0], 'sources')
+        self.assertEqual(names[-1], 'done')
+        self.assertEqual(timings['tokens'], self.tokens)
+        generation_ms = self.first_token_ms + self.token_ms * (self.tokens - 1)
+        # The sources and the first token are sent while the stub is still
+        # generating, not after the whole answer
+        self.assertLess(timings['ttfb'], timings['total'] - generation_ms / 2)
+        self.assertLess(timings['first_token'], timings['total'] - generation_ms / 2)
+
+    def test_disconnect_stops_generation(self):
+        timings = self.ask(abort_after_tokens=3)
+
+        names = [name for name, _ in timings['events']]
+        self.assertNotIn('done', names)
+        self.assertLess(timings['tokens'], self.tokens)
+        stats = self.stub.stats.snapshot()
+        for _ in range(50):
+            if stats['streams_aborted'] or stats['streams_completed']:
+                break
+            time.sleep(self.token_ms / 1000 + 0.01)
+            stats = self.stub.stats.snapshot()
+        self.assertEqual(stats['streams_aborted'], 1)
+        self.assertEqual(stats['streams_completed'], 0)
+        self.assertLess(stats['tokens_sent'], self.tokens)
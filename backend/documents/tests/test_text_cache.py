@@ -0,0 +1,78 @@
+import os
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from ..models import ChunkEmbedding
+from ..rag_engine import get_rag_engine
+from .utils import SAMPLE_TEXT, IsolatedIndexMixin
+
+
+class TextCacheTests(IsolatedIndexMixin, TransactionTestCase):
+    """rechunk and reembed process documents in worker threads, which need
+    committed data"""
+
+    def setUp(self):
+        super().setUp()
+        self.engine = get_rag_engine()
+        self.document = self.processed_document()
+
+    def run_command(self, name, *args):
+        stdout = StringIO()
+        call_command(name, *args, stdout=stdout, stderr=StringIO())
+        return stdout.getvalue()
+
+    def remove_original(self, document):
+        """Parsing the file again would now fail"""
+        os.remove(document.file_path.path)
+
+    @override_settings(RAG_CHUNK_MAX_TOKENS=8, RAG_CHUNK_OVERLAP_TOKENS=2)
+    def test_rechunk_reads_the_cached_text(self):
+        before = self.document.chunks.count()
+        self.remove_original(self.document)
+
+        with self.assertLogs('documents.rag_engine', 'INFO'):
+            output = self.run_command('rechunk')
+        self.document.refresh_from_db()
+        self.assertIn('1/1 documents', output)
+        self.assertEqual(self.document.processing_status, 'completed')
+        self.assertGreater(self.document.chunks.count(), before)
+        self.assertEqual(
+            sorted(self.engine.vector_store.list_ids(self.document.id)),
+            sorted(self.document.chunks.values_list('embedding_id', flat=True))
+        )
+
+    def test_documents_missing_from_the_cache_are_skipped(self):
+        self.engine.text_cache.remove(self.document.content_hash)
+        output = self.run_command('rechunk')
+        self.assertIn(f'Document {self.document.id}: not in the text cache, skipped', output)
+        self.assertIn('0/0 documents', output)
+
+    def test_reembed_replaces_stored_vectors(self):
+        # Without an upsert conflict target, as on MySQL; patched on the class
+        # for the connections of the command's threads
+        self.remove_original(self.document)
+        stored = ChunkEmbedding.objects.count()
+        with mock.patch.object(self.engine, 'embed_texts', wraps=self.engine.embed_texts) as embed, \
+                mock.patch.object(type(connection.features), 'supports_update_conflicts_with_target', False), \
+                self.assertLogs('documents.rag_engine', 'INFO'):
+            output = self.run_command('reembed')
+
+        self.assertIn('1/1 documents', output)
+        embedded = [text for call in embed.call_args_list for text in call.args[0]]
+        self.assertEqual(len(embedded), self.document.chunks.count())
+        self.assertEqual(ChunkEmbedding.objects.count(), stored)
+
+    def test_cached_text_is_kept_while_another_document_shares_it(self):
+        with self.assertLogs('documents.rag_engine', 'INFO'):
+            other = self.processed_document(SAMPLE_TEXT, name='copy.txt')
+        self.assertEqual(other.content_hash, self.document.content_hash)
+
+        self.engine.delete_document(other)
+        self.assertTrue(self.engine.has_cached_text(self.document))
+
+        self.engine.delete_document(self.document)
+        self.assertFalse(self.engine.has_cached_text(self.document))
@@ -0,0 +1,130 @@
+import hashlib
+import os
+from datetime import timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+
+from .. import uploads
+from ..models import Document, UploadSession
+from .utils import SAMPLE_TEXT, IsolatedIndexMixin
+
+
+class UploadTests(IsolatedIndexMixin, TestCase):
+    UPLOADS = '/api/documents/uploads/'
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client(HTTP_HOST='localhost')
+        self.content = SAMPLE_TEXT.encode('utf-8')
+
+    def start(self, file_name='resume.txt', size=None):
+        return self.client.post(
+            self.UPLOADS,
+            {'file_name': file_name, 'size': len(self.content) if size is None else size},
+            content_type='application/json'
+        )
+
+    def send(self, upload_id, offset, data):
+        return self.client.put(
+            f'{self.UPLOADS}{upload_id}/',
+            data,
+            content_type='application/octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def complete(self, upload_id, sha256=None):
+        data = {'sha256': sha256} if sha256 else {}
+        return self.client.post(f'{self.UPLOADS}{upload_id}/complete/', data, content_type='application/json')
+
+    def test_upload_resumes_from_the_received_offset(self):
+        upload_id = self.start().json()['id']
+
+        self.assertEqual(self.send(upload_id, 0, self.content[:40]).json()['offset'], 40)
+        # A part sent again after a lost response is refused with the offset to resume from
+        response = self.send(upload_id, 0, self.content[40:])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 40))
+        self.assertEqual(self.client.get(f'{self.UPLOADS}{upload_id}/').json()['offset'], 40)
+        self.assertEqual(self.send(upload_id, 40, self.content[40:]).json()['offset'], len(self.content))
+
+        response = self.complete(upload_id, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(response.status_code, 202)
+        document = Document.objects.get(id=response.json()['id'])
+        self.assertEqual(document.content_hash, hashlib.sha256(self.content).hexdigest())
+        with document.file_path.open('rb') as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertEqual(response.json()['job']['status'], 'queued')
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_incomplete_upload_cannot_be_completed(self):
+        upload_id = self.start().json()['id']
+        self.send(upload_id, 0, self.content[:40])
+
+        response = self.complete(upload_id)
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 40))
+
+    def test_checksum_mismatch_discards_the_upload(self):
+        upload_id = self.start().json()['id']
+        self.send(upload_id, 0, self.content)
+
+        response = self.complete(upload_id, 'ab' * 32)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Checksum mismatch', response.json()['error'])
+        self.assertEqual(self.client.get(f'{self.UPLOADS}{upload_id}/').status_code, 404)
+        self.assertEqual(os.listdir(os.path.join(self.root, 'media', 'uploads')), [])
+        self.assertFalse(Document.objects.exists())
+
+    def test_mislabelled_content_is_rejected_after_the_first_part(self):
+        upload_id = self.start(size=100).json()['id']
+
+        response = self.send(upload_id, 0, b'%PDF-1.4' + b'\x00' * 92)
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(UploadSession.objects.exists())
+
+    @override_settings(UPLOAD_MAX_TOTAL_BYTES=1000)
+    def test_quota_counts_stored_documents_and_live_uploads(self):
+        self.stored_document(text='x' * 300)
+
+        self.assertEqual(self.start(size=701).status_code, 413)
+        self.assertEqual(self.start(size=400).status_code, 201)
+        response = self.start(size=400)
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('300 bytes available', response.json()['error'])
+
+    @override_settings(UPLOAD_MAX_FILE_BYTES=100)
+    def test_file_size_limit_applies_to_every_entry_point(self):
+        self.assertEqual(self.start(size=101).status_code, 413)
+        big = SimpleUploadedFile('big.txt', b'x' * 101)
+        response = self.client.post('/api/documents/upload/', {'file': big})
+        self.assertEqual(response.status_code, 413)
+
+        document = self.stored_document(text='small')
+        document.processing_status = 'completed'
+        document.save()
+        big.seek(0)
+        response = self.client.post(f'/api/documents/{document.id}/reprocess/', {'file': big})
+        self.assertEqual(response.status_code, 413)
+
+    def test_aborted_upload_is_discarded(self):
+        upload_id = self.start().json()['id']
+        self.send(upload_id, 0, self.content[:40])
+
+        self.assertEqual(self.client.delete(f'{self.UPLOADS}{upload_id}/').status_code, 204)
+        self.assertEqual(self.client.get(f'{self.UPLOADS}{upload_id}/').status_code, 404)
+        self.assertEqual(os.listdir(os.path.join(self.root, 'media', 'uploads')), [])
+
+    def test_expired_sessions_are_removed(self):
+        stale = self.start().json()['id']
+        self.send(stale, 0, self.content[:40])
+        live = self.start().json()['id']
+        UploadSession.objects.filter(pk=stale).update(updated_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(uploads.remove_expired_sessions(), 1)
+        self.assertEqual(list(UploadSession.objects.values_list('pk', flat=True)), [uploads.get_session(live).pk])
+        self.assertEqual(self.send(stale, 40, self.content[40:]).status_code, 404)
+
+    def test_unsupported_file_type_is_rejected(self):
+        response = self.client.post('/api/documents/upload/', {'file': SimpleUploadedFile('a.exe', b'MZ')})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.start(file_name='a.exe').status_code, 400)
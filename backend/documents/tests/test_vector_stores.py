@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from ..vector_stores import ChromaVectorStore, NumpyVectorStore
+from .utils import FakeChromaCollection, chunk_ids
+
+
+class NumpyVectorStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.store = NumpyVectorStore(self.root)
+
+    def add(self, document_id, numbers, embeddings, store=None):
+        ids = chunk_ids(document_id, numbers)
+        (store or self.store).add(
+            ids,
+            np.asarray(embeddings, dtype=np.float32),
+            [f'text {number}' for number in numbers],
+            [{'document_id': document_id} for _ in ids]
+        )
+        return ids
+
+    def test_query_returns_nearest_chunks_first(self):
+        self.add(1, [0, 1, 2], np.eye(3))
+        self.store.commit(1)
+        self.add(2, [0], [[1, 0, 0]])
+        self.store.commit(2)
+
+        result = self.store.query([[0.9, 0.2, 0]], 2, document_id=1)
+        self.assertEqual(result['ids'][0], chunk_ids(1, [0, 1]))
+        self.assertEqual(result['documents'][0], ['text 0', 'text 1'])
+        self.assertLess(result['distances'][0][0], result['distances'][0][1])
+
+        result = self.store.query([[1, 0, 0]], 2)
+        self.assertEqual(set(result['ids'][0]), {'doc_1_chunk_0', 'doc_2_chunk_0'})
+
+    def test_rows_are_searchable_only_after_commit(self):
+        self.add(1, [0, 1], np.eye(2))
+        self.assertEqual(self.store.query([[1, 0]], 2, document_id=1)['ids'][0], [])
+
+        self.store.commit(1)
+        self.assertEqual(self.store.count(1), 2)
+        # A second store on the same directory sees the commit
+        other = NumpyVectorStore(self.root)
+        self.assertEqual(other.query([[1, 0]], 1, document_id=1)['ids'][0], chunk_ids(1, [0]))
+
+    def test_commit_merges_with_stored_rows(self):
+        self.add(1, [0, 1], np.eye(2))
+        self.store.commit(1)
+        self.add(1, [1, 2], [[0, 5], [3, 3]])
+        self.store.commit(1)
+
+        self.assertEqual(sorted(self.store.list_ids(1)), chunk_ids(1, [0, 1, 2]))
+        stored = self.store.get(chunk_ids(1, [1]), include_embeddings=True)
+        np.testing.assert_allclose(stored['embeddings'][0], [0, 5])
+
+    def test_commit_with_replace_drops_stored_rows(self):
+        self.add(1, [0, 1], np.eye(2))
+        self.store.commit(1)
+        self.add(1, [5], [[1, 1]])
+        self.store.commit(1, replace=True)
+        self.assertEqual(self.store.list_ids(1), chunk_ids(1, [5]))
+
+        self.store.commit(1, replace=True)
+        self.assertEqual(self.store.list_ids(1), [])
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'doc_1')))
+
+    def test_vectors_of_a_new_dimension_replace_stored_ones(self):
+        self.add(1, [0, 1], np.eye(3)[:2])
+        self.store.commit(1)
+        self.add(1, [2], [[0, 0, 0, 1]])
+        with self.assertLogs('documents.vector_stores', 'WARNING'):
+            self.store.commit(1)
+
+        self.assertEqual(self.store.list_ids(1), chunk_ids(1, [2]))
+        self.assertEqual(self.store.query([[1, 0, 0, 0]], 3)['ids'][0], chunk_ids(1, [2]))
+        # Queries of the old dimension skip the document instead of failing
+        self.assertEqual(self.store.query([[1, 0, 0]], 3)['ids'][0], [])
+
+    def test_delete_chunks_and_documents(self):
+        self.add(1, [0, 1, 2], np.eye(3))
+        self.store.commit(1)
+
+        self.store.delete(ids=chunk_ids(1, [0]))
+        self.assertEqual(sorted(self.store.list_ids(1)), chunk_ids(1, [1, 2]))
+        self.store.delete(document_id=1)
+        self.assertEqual(self.store.list_ids(1), [])
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'doc_1')))
+
+    def test_int8_rows_keep_the_ranking(self):
+        store = NumpyVectorStore(os.path.join(self.root, 'int8'), dtype='int8')
+        vectors = np.random.default_rng(0).normal(size=(50, 16))
+        self.add(1, range(50), vectors, store=store)
+        store.commit(1)
+
+        result = store.query([vectors[7] + 0.01], 1, document_id=1)
+        self.assertEqual(result['ids'][0], chunk_ids(1, [7]))
+
+    def test_results_match_the_chroma_backend(self):
+        collection = FakeChromaCollection()
+        chroma = ChromaVectorStore(lambda: collection)
+        vectors = np.random.default_rng(0).normal(size=(20, 8))
+        for store in (self.store, chroma):
+            self.add(1, range(10), vectors[:10], store=store)
+            self.add(2, range(10), vectors[10:], store=store)
+            store.commit(1)
+            store.commit(2)
+
+        queries = vectors[[3, 15]] + 0.1
+        for kwargs in ({}, {'document_id': 2}, {'document_ids': [1]}):
+            with self.subTest(**kwargs):
+                expected = chroma.query(queries, 5, **kwargs)
+                result = self.store.query(queries, 5, **kwargs)
+                self.assertEqual(result['ids'], expected['ids'])
+                self.assertEqual(result['documents'], expected['documents'])
+                np.testing.assert_allclose(result['distances'], expected['distances'], rtol=1e-4)
+
+
+class ChromaVectorStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.collection = FakeChromaCollection()
+        self.store = ChromaVectorStore(lambda: self.collection)
+
+    add = NumpyVectorStoreTests.add
+
+    def test_vectors_of_another_dimension_are_refused(self):
+        self.add(1, [0, 1], np.eye(3)[:2])
+        self.store.commit(1)
+        self.add(2, [0], [[0, 0, 1]])
+
+        with self.assertRaisesMessage(ValueError, 'CHROMA_COLLECTION'):
+            self.add(3, [0], [[0, 0, 0, 1]])
+        # Nothing of the other documents, committed or not, is lost
+        self.assertEqual(self.store.list_ids(1), chunk_ids(1, [0, 1]))
+        self.store.commit(2)
+        self.assertEqual(self.store.list_ids(2), chunk_ids(2, [0]))
+        self.assertEqual(self.store.list_ids(3), [])
+
+    def test_commit_with_replace_drops_stored_rows(self):
+        self.add(1, [0, 1], np.eye(2))
+        self.store.commit(1)
+        self.add(1, [5], [[1, 1]])
+        self.store.commit(1, replace=True)
+        self.assertEqual(self.store.list_ids(1), chunk_ids(1, [5]))
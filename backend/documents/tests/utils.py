@@ -0,0 +1,161 @@
+"""Fixtures shared by the documents tests"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from django.core.files.base import ContentFile
+from django.test.utils import override_settings
+
+from ..embeddings import reset_embedding_model
+from ..llm_service import reset_llm_client
+from ..models import Document
+from ..rag_engine import get_rag_engine, reset_rag_engine
+from ..stub_llm import StubLLMServer
+from ..vector_stores import ChromaVectorStore
+
+SAMPLE_TEXT = (
+    "Jane Doe is a software engineer based in Lisbon.\n\n"
+    "Experience: five years building data pipelines in Python and Go, "
+    "most recently leading the search team at a logistics company.\n\n"
+    "Education: MSc in Computer Science, University of Porto.\n\n"
+    "Skills: Django, PostgreSQL, Kubernetes, information retrieval.\n"
+)
+
+
+def chunk_ids(document_id, numbers):
+    return [f'doc_{document_id}_chunk_{number}' for number in numbers]
+
+
+class FakeChromaCollection:
+    """The subset of a chromadb collection that ``ChromaVectorStore`` uses,
+    kept in memory; ``where`` filters on ``document_id`` only"""
+
+    def __init__(self, name='documents'):
+        self.name = name
+        self.rows = {}
+
+    def _matches(self, metadata, where):
+        if not where:
+            return True
+        wanted = where['document_id']
+        if isinstance(wanted, dict):
+            return metadata.get('document_id') in wanted['$in']
+        return metadata.get('document_id') == wanted
+
+    def _select(self, ids=None, where=None):
+        chosen = self.rows if ids is None else [chunk_id for chunk_id in ids if chunk_id in self.rows]
+        return [chunk_id for chunk_id in chosen if self._matches(self.rows[chunk_id][2], where)]
+
+    def _result(self, ids, include):
+        result = {'ids': ids}
+        for position, key in enumerate(('embeddings', 'documents', 'metadatas')):
+            if key in include:
+                result[key] = [self.rows[chunk_id][position] for chunk_id in ids]
+        return result
+
+    def upsert(self, embeddings, documents, ids, metadatas):
+        for row, chunk_id in enumerate(ids):
+            document = documents[row] if documents is not None else None
+            self.rows[chunk_id] = (list(embeddings[row]), document, dict(metadatas[row]))
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=()):
+        selected = self._select(ids, where)
+        start = offset or 0
+        selected = selected[start:start + limit] if limit is not None else selected[start:]
+        return self._result(selected, include)
+
+    def query(self, query_embeddings, n_results, include=(), where=None):
+        selected = self._select(where=where)
+        matrix = np.asarray([self.rows[chunk_id][0] for chunk_id in selected], dtype=np.float32)
+        results = {'ids': [], **{key: [] for key in include}}
+        for query in np.asarray(query_embeddings, dtype=np.float32):
+            distances = ((matrix - query) ** 2).sum(axis=1) if len(selected) else np.zeros(0)
+            order = np.argsort(distances)[:n_results]
+            found = self._result([selected[row] for row in order], include)
+            for key, values in found.items():
+                results[key].append(values)
+            if 'distances' in include:
+                results['distances'].append([float(distances[row]) for row in order])
+        return results
+
+    def delete(self, ids=None, where=None):
+        for chunk_id in self._select(ids, where):
+            del self.rows[chunk_id]
+
+    def count(self):
+        return len(self.rows)
+
+
+class IsolatedIndexMixin:
+    """Runs each test with its indexes, caches and uploads in a temporary
+    directory, the fake embedding model and the NumPy vector store.
+
+    ``settings_overrides`` changes settings for a whole test class; the
+    shared engine, embedding model and LLM client are rebuilt around every
+    test so they pick the settings up.
+    """
+
+    settings_overrides = {}
+
+    def setUp(self):
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        overrides = override_settings(**{
+            'MEDIA_ROOT': os.path.join(self.root, 'media'),
+            'UPLOAD_TEMP_DIR': os.path.join(self.root, 'media', 'uploads'),
+            'RAG_EMBEDDING_MODEL': 'fake',
+            'RAG_VECTOR_STORE': 'numpy',
+            'RAG_VECTOR_INDEX_DIR': os.path.join(self.root, 'vector_index'),
+            'RAG_LEXICAL_INDEX_DIR': os.path.join(self.root, 'vector_index'),
+            'RAG_TEXT_CACHE_DIR': os.path.join(self.root, 'text_cache'),
+            'INGEST_WORKER_MODE': 'external',
+            **self.settings_overrides
+        })
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self._reset()
+        self.addCleanup(self._reset)
+
+    def _reset(self):
+        reset_rag_engine()
+        reset_embedding_model()
+        reset_llm_client()
+
+    def use_chroma(self):
+        """Switch the engine to a Chroma store over a FakeChromaCollection"""
+        collection = FakeChromaCollection()
+        get_rag_engine().vector_store = ChromaVectorStore(lambda: collection)
+        return collection
+
+    def use_stub_llm(self, first_token_ms=0, token_ms=0, tokens=5):
+        """Answer from a StubLLMServer, with the answer caches off so every
+        question reaches it"""
+        stub = StubLLMServer(first_token_ms, token_ms, tokens).start()
+        self.addCleanup(stub.stop)
+        overrides = override_settings(
+            RAG_CACHE_ENABLED=False,
+            RAG_SEMANTIC_CACHE_ENABLED=False,
+            LLM_API_BASE=stub.api_base,
+            LLM_API_KEY='stub'
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        reset_llm_client()
+        self.addCleanup(reset_llm_client)
+        return stub
+
+    def stored_document(self, text=SAMPLE_TEXT, name='resume.txt'):
+        """A saved, unprocessed document holding ``text``"""
+        content = text.encode('utf-8')
+        document = Document(title=name, file_type='txt', file_size=len(content))
+        document.file_path.save(name, ContentFile(content), save=False)
+        document.save()
+        return document
+
+    def processed_document(self, text=SAMPLE_TEXT, name='resume.txt'):
+        document = self.stored_document(text, name)
+        get_rag_engine().process_document(document)
+        document.refresh_from_db()
+        return document
@@ -0,0 +1,204 @@
+"""Compressed cache of extracted page text.
+
+PDF and DOCX parsing is the most expensive CPU stage of ingestion, and it
+only depends on the file. The raw text of every page is therefore stored
+once, keyed by the SHA-256 of the file, its type, ``EXTRACTOR_VERSION`` and
+the options that change paging::
+
+    <root>/<hash[:2]>/<key>.jsonl.zst (or .gz)   one {"page", "text"} per line
+    <root>/<hash[:2]>/<key>.json                 page count; written last
+
+Pages are compressed with zstandard when it is installed and gzip otherwise;
+either can be read back. An entry is recorded while a document is extracted
+(streamed to a temporary file and committed when the last page is written)
+and replayed by ``CachedPages`` with the ``PageExtractor`` interface, so
+re-chunking and re-embedding never reopen the original file.
+"""
+import gzip
+import io
+import json
+import os
+import uuid
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from .extraction import EXTRACTOR_VERSION
+
+CODECS = ('zst', 'gz')
+
+
+class CachedPages:
+    """Replays cached pages; same interface as ``PageExtractor``"""
+
+    def __init__(self, cache, path, page_count):
+        self.cache = cache
+        self.path = path
+        self.page_count = page_count
+        self.pages_done = 0
+        self.chars_extracted = 0
+        self.from_cache = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def pages(self):
+        with self.cache._reader(self.path) as lines:
+            for line in lines:
+                page = json.loads(line)
+                self.pages_done = page['page']
+                self.chars_extracted += len(page['text'].strip())
+                yield page['page'], page['text']
+
+
+class RecordingPages:
+    """Wraps a ``PageExtractor`` and records its pages into the cache.
+
+    The entry is committed only if every page was read; an extraction that
+    fails or is abandoned half way leaves nothing behind.
+    """
+
+    def __init__(self, cache, key, extractor):
+        self.cache = cache
+        self.key = key
+        self.extractor = extractor
+        self.from_cache = False
+        self._tmp_path = None
+        self._writer = None
+        self._complete = False
+
+    @property
+    def page_count(self):
+        return self.extractor.page_count
+
+    @property
+    def pages_done(self):
+        return self.extractor.pages_done
+
+    @property
+    def chars_extracted(self):
+        return self.extractor.chars_extracted
+
+    def __enter__(self):
+        self.extractor.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.extractor.__exit__(exc_type, exc, tb)
+        finally:
+            self._finish(commit=exc_type is None and self._complete)
+
+    def pages(self):
+        path = self.cache._data_path(self.key, self.cache.codec)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        self._writer = self.cache._writer(self._tmp_path)
+        for page_number, text in self.extractor.pages():
+            self._writer.write(json.dumps({'page': page_number, 'text': text}) + '\n')
+            yield page_number, text
+        self._complete = True
+
+    def _finish(self, commit):
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        if commit:
+            os.replace(self._tmp_path, self.cache._data_path(self.key, self.cache.codec))
+            self.cache._write_meta(self.key, {
+                'page_count': self.extractor.page_count,
+                'codec': self.cache.codec,
+                'extractor_version': EXTRACTOR_VERSION,
+            })
+        else:
+            try:
+                os.remove(self._tmp_path)
+            except FileNotFoundError:
+                pass
+
+
+class TextCache:
+    def __init__(self, root, codec='auto', level=3):
+        if codec == 'auto':
+            codec = 'zst' if zstandard is not None else 'gz'
+        if codec == 'zst' and zstandard is None:
+            raise ValueError("RAG_TEXT_CACHE_CODEC=zst needs the zstandard package")
+        self.root = root
+        self.codec = codec
+        self.level = level
+
+    def key(self, content_hash, file_type, text_page_chars=None):
+        key = f"{content_hash}-{file_type.lower()}-v{EXTRACTOR_VERSION}"
+        if file_type.lower() == 'txt' and text_page_chars:
+            key += f"-p{text_page_chars}"
+        return key
+
+    def _dir(self, key):
+        return os.path.join(self.root, key[:2])
+
+    def _data_path(self, key, codec):
+        return os.path.join(self._dir(key), f"{key}.jsonl.{codec}")
+
+    def _meta_path(self, key):
+        return os.path.join(self._dir(key), f"{key}.json")
+
+    def _write_meta(self, key, meta):
+        path = self._meta_path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        os.replace(tmp_path, path)
+
+    def _writer(self, path):
+        if self.codec == 'zst':
+            raw = open(path, 'wb')
+            stream = zstandard.ZstdCompressor(level=self.level).stream_writer(raw, closefd=True)
+            return io.TextIOWrapper(stream, encoding='utf-8')
+        return gzip.open(path, 'wt', encoding='utf-8', compresslevel=min(max(self.level, 1), 9))
+
+    def _reader(self, path):
+        if path.endswith('.zst'):
+            if zstandard is None:
+                raise ValueError(f"{path} is zstd-compressed but zstandard is not installed")
+            raw = open(path, 'rb')
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+            return io.TextIOWrapper(stream, encoding='utf-8')
+        return gzip.open(path, 'rt', encoding='utf-8')
+
+    def get(self, key):
+        """``CachedPages`` for a committed entry, or None"""
+        try:
+            with open(self._meta_path(key), encoding='utf-8') as file:
+                meta = json.load(file)
+        except FileNotFoundError:
+            return None
+        path = self._data_path(key, meta.get('codec', 'gz'))
+        if not os.path.exists(path):
+            return None
+        return CachedPages(self, path, meta.get('page_count'))
+
+    def open(self, key, extractor):
+        """Cached pages for ``key`` if present, else ``extractor`` recording
+        its pages into the cache"""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        return RecordingPages(self, key, extractor)
+
+    def remove(self, content_hash):
+        """Drop every entry of a file"""
+        directory = os.path.join(self.root, content_hash[:2])
+        if not content_hash or not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name.startswith(content_hash + '-'):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
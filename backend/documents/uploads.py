@@ -0,0 +1,314 @@
+"""Resumable, streamed uploads.
+
+A large file is sent as a sequence of parts instead of one multipart
+request, so a dropped connection costs one part rather than the whole file:
+
+1. ``start_upload`` checks the name, the declared size and the quotas and
+   creates an ``UploadSession`` with an empty ``<id>.part`` file in
+   ``UPLOAD_TEMP_DIR``;
+2. ``append_part`` streams one part from the request body into the file in
+   ``BLOCK_SIZE`` blocks at the offset the session has reached; a client
+   that lost track asks for the session and resumes from ``received``;
+3. ``complete_upload`` checks the upload is whole and returns its SHA-256;
+   ``move_into_storage`` then renames the file into media storage.
+
+Memory use does not depend on the file size. The SHA-256 is updated as
+parts arrive; the running hash lives in the process that received the last
+part, and another process (or a restart) catches up by re-reading what is
+on disk. The real file type is sniffed as soon as ``SNIFF_BYTES`` have
+arrived, so a mislabelled file is rejected after its first part.
+"""
+import hashlib
+import logging
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Document, UploadSession
+from .validation import SNIFF_BYTES, content_type_error, file_size_error, file_type_error, file_type_of
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 1 << 20
+# Running hashes kept per process, most recently used last
+_MAX_HASHERS = 64
+
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """An upload request that cannot be accepted; ``status`` is the HTTP status.
+
+    ``discard`` means the upload itself is unacceptable and is deleted.
+    """
+
+    def __init__(self, message, status=400, discard=False, **details):
+        super().__init__(message)
+        self.status = status
+        self.discard = discard
+        self.details = details
+
+
+def part_path(session):
+    return os.path.join(settings.UPLOAD_TEMP_DIR, f"{session.id}.part")
+
+
+def live_sessions():
+    """Sessions that have not expired"""
+    cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL_SECONDS)
+    return UploadSession.objects.filter(updated_at__gte=cutoff)
+
+
+def used_bytes():
+    """Bytes counted against UPLOAD_MAX_TOTAL_BYTES: stored documents plus
+    the declared size of every live upload"""
+    stored = Document.objects.aggregate(total=Sum('file_size'))['total'] or 0
+    reserved = live_sessions().aggregate(total=Sum('size'))['total'] or 0
+    return stored + reserved
+
+
+def quota_error(size, replaces=0):
+    """Error message if a file of ``size`` bytes would exceed a quota, else None.
+
+    ``replaces`` is the size of a stored file the new one replaces, which
+    is freed. The total is checked without a lock, so concurrent uploads can
+    overshoot it by at most their own sizes.
+    """
+    size_error = file_size_error(size)
+    if size_error:
+        return size_error
+    if settings.UPLOAD_MAX_TOTAL_BYTES:
+        available = settings.UPLOAD_MAX_TOTAL_BYTES - used_bytes() + replaces
+        if size > available:
+            return f'Storage quota exceeded: {max(available, 0)} bytes available, {size} requested'
+    return None
+
+
+def remove_expired_sessions():
+    """Delete expired sessions and their part files; returns how many"""
+    cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL_SECONDS)
+    expired = list(UploadSession.objects.filter(updated_at__lt=cutoff))
+    for session in expired:
+        _discard(session)
+    return len(expired)
+
+
+def start_upload(file_name, size):
+    """Create an upload session for a file of ``size`` bytes"""
+    type_error = file_type_error(file_name)
+    if type_error:
+        raise UploadError(type_error)
+    if size <= 0:
+        raise UploadError('size must be a positive number of bytes')
+    remove_expired_sessions()
+    error = quota_error(size)
+    if error:
+        raise UploadError(error, status=413)
+
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    session = UploadSession.objects.create(file_name=file_name, file_type=file_type_of(file_name), size=size)
+    open(part_path(session), 'wb').close()
+    return session
+
+
+def get_session(session_id):
+    try:
+        return live_sessions().get(id=session_id)
+    except UploadSession.DoesNotExist:
+        raise UploadError('Upload not found or expired', status=404)
+
+
+def append_part(session_id, offset, stream, length):
+    """Write ``length`` bytes read from ``stream`` at ``offset``.
+
+    ``offset`` must equal the bytes received so far, otherwise nothing is
+    written and the error carries the offset to resume from. A part is all
+    or nothing: if the stream ends early the file is cut back and the part
+    can be sent again.
+    """
+    with _discarding_rejected(session_id), transaction.atomic():
+        # Serializes parts of one upload; the row stays locked while the part streams in
+        try:
+            session = live_sessions().select_for_update().get(id=session_id)
+        except UploadSession.DoesNotExist:
+            raise UploadError('Upload not found or expired', status=404)
+
+        if offset != session.received:
+            raise UploadError(
+                f'Part starts at byte {offset} but {session.received} bytes have been received',
+                status=409,
+                offset=session.received
+            )
+        if length <= 0:
+            raise UploadError('Empty part', offset=session.received)
+        if session.received + length > session.size:
+            raise UploadError(
+                f'Part ends at byte {session.received + length}, past the declared size {session.size}',
+                status=413,
+                offset=session.received
+            )
+
+        path = part_path(session)
+        hasher = _hasher_at(session, path).copy()
+        written = 0
+        with open(path, 'r+b') as file:
+            file.truncate(session.received)
+            file.seek(session.received)
+            while written < length:
+                block = stream.read(min(BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                file.write(block)
+                hasher.update(block)
+                written += len(block)
+            if written < length:
+                file.truncate(session.received)
+                raise UploadError(
+                    f'Part ended after {written} of {length} bytes',
+                    offset=session.received
+                )
+            file.flush()
+            os.fsync(file.fileno())
+
+        session.received += written
+        _remember_hasher(session, hasher)
+        if not session.detected_type and (session.received >= SNIFF_BYTES or session.received == session.size):
+            _check_content(session, path)
+        session.save()
+    return session
+
+
+def _check_content(session, path):
+    with open(path, 'rb') as file:
+        head = file.read(SNIFF_BYTES)
+    error = content_type_error(session.file_type, head, complete=session.received == session.size)
+    if error:
+        raise UploadError(error, status=415, discard=True)
+    session.detected_type = session.file_type
+
+
+def complete_upload(session_id, sha256=None):
+    """Finish an upload; returns ``(session, path, content_hash)``.
+
+    ``sha256``, when the client sends it, must match what was received.
+    The session row is deleted; the caller owns the part file from here on
+    (see ``move_into_storage``).
+    """
+    with _discarding_rejected(session_id), transaction.atomic():
+        try:
+            session = live_sessions().select_for_update().get(id=session_id)
+        except UploadSession.DoesNotExist:
+            raise UploadError('Upload not found or expired', status=404)
+        if session.received != session.size:
+            raise UploadError(
+                f'Upload is incomplete: {session.received} of {session.size} bytes received',
+                status=409,
+                offset=session.received
+            )
+
+        path = part_path(session)
+        if not session.detected_type:
+            _check_content(session, path)
+        if session.file_type == 'docx' and not _is_docx(path):
+            raise UploadError('File is named .docx but is not a Word document', status=415, discard=True)
+
+        content_hash = _hasher_at(session, path).hexdigest()
+        if sha256 and sha256.lower() != content_hash:
+            raise UploadError(f'Checksum mismatch: received bytes hash to {content_hash}', discard=True)
+
+        _forget_hasher(session)
+        session.delete()
+    return session, path, content_hash
+
+
+def _is_docx(path):
+    # Reads only the archive's central directory
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return 'word/document.xml' in archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+
+
+def move_into_storage(path, file_name, upload_to='documents/'):
+    """Rename a completed part file into media storage; returns its name.
+
+    A rename, not a copy: ``UPLOAD_TEMP_DIR`` must be on the same
+    filesystem as ``MEDIA_ROOT`` (it is inside it by default).
+    """
+    name = default_storage.get_available_name(upload_to + os.path.basename(file_name))
+    target = default_storage.path(name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+    return name
+
+
+def abort_upload(session_id):
+    session = get_session(session_id)
+    _discard(session)
+
+
+def _discard(session):
+    _forget_hasher(session)
+    UploadSession.objects.filter(id=session.id).delete()
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def _discarding_rejected(session_id):
+    # Outside the transaction: the rejection rolls it back
+    try:
+        yield
+    except UploadError as e:
+        if e.discard:
+            _discard(UploadSession(id=session_id))
+        raise
+
+
+def _hasher_at(session, path):
+    """SHA-256 of the first ``session.received`` bytes, from this process's
+    running hash when it is at that offset, else by re-reading the file"""
+    with _hashers_lock:
+        cached = _hashers.get(session.id)
+        if cached is not None and cached[0] == session.received:
+            _hashers.move_to_end(session.id)
+            return cached[1]
+
+    hasher = hashlib.sha256()
+    remaining = session.received
+    with open(path, 'rb') as file:
+        while remaining:
+            block = file.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                raise UploadError('Upload data is missing on the server', status=410)
+            hasher.update(block)
+            remaining -= len(block)
+    if session.received:
+        logger.info("Upload %s: rebuilt hash of %d bytes", session.id, session.received)
+    return hasher
+
+
+def _remember_hasher(session, hasher):
+    with _hashers_lock:
+        _hashers[session.id] = (session.received, hasher)
+        _hashers.move_to_end(session.id)
+        while len(_hashers) > _MAX_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def _forget_hasher(session):
+    with _hashers_lock:
+        _hashers.pop(session.id, None)
@@ -4,5 +4,14 @@ from . import views
 urlpatterns = [
     path('documents/', views.get_documents, name='get_documents'),
     path('documents/upload/', views.upload_document, name='upload_document'),
+    path('documents/uploads/', views.start_upload, name='start_upload'),
+    path('documents/uploads/<uuid:upload_id>/', views.upload_session, name='upload_session'),
+    path('documents/uploads/<uuid:upload_id>/complete/', views.complete_upload, name='complete_upload'),
+    path('documents/<int:document_id>/', views.delete_document, name='delete_document'),
+    path('documents/<int:document_id>/reprocess/', views.reprocess_document, name='reprocess_document'),
+    path('documents/<int:document_id>/status/', views.document_status, name='document_status'),
+    path('documents/stats/', views.rag_stats, name='rag_stats'),
     path('documents/ask/', views.ask_question, name='ask_question'),
+    path('documents/ask/batch/', views.ask_batch, name='ask_batch'),
+    path('documents/ask/stream/', views.ask_stream, name='ask_stream'),
 ]
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""Checks shared by every way a file enters the system"""
+import codecs
+
+from django.conf import settings
+
+ALLOWED_FILE_TYPES = ['txt', 'pdf', 'docx', 'doc']
+
+# Leading bytes examined to tell the real file type
+SNIFF_BYTES = 8192
+
+_MAGIC = (
+    (b'%PDF-', 'pdf'),
+    (b'PK\x03\x04', 'docx'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'doc'),
+)
+
+
+def file_type_of(file_name):
+    return file_name.split('.')[-1].lower()
+
+
+def file_type_error(file_name):
+    """Error message if the file type is not supported, else None"""
+    file_type = file_type_of(file_name)
+    if file_type not in ALLOWED_FILE_TYPES:
+        return f'File type {file_type} not supported. Allowed types: {ALLOWED_FILE_TYPES}'
+    return None
+
+
+def file_size_error(size):
+    """Error message if a file is larger than UPLOAD_MAX_FILE_BYTES, else None"""
+    if settings.UPLOAD_MAX_FILE_BYTES and size > settings.UPLOAD_MAX_FILE_BYTES:
+        return f'File is {size} bytes; the limit is {settings.UPLOAD_MAX_FILE_BYTES} bytes'
+    return None
+
+
+def sniff_file_type(head, complete=False):
+    """The file type the leading bytes look like, or None.
+
+    DOCX is any ZIP archive here (the archive's contents are only known at
+    the end). Text must be UTF-8 without NUL bytes, which is what the text
+    extractor reads; unless ``complete``, ``head`` may end inside a
+    multi-byte character.
+    """
+    for magic, file_type in _MAGIC:
+        if head.startswith(magic):
+            return file_type
+    if b'\x00' in head:
+        return None
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=complete)
+    except UnicodeDecodeError:
+        return None
+    return 'txt'
+
+
+def content_type_error(file_type, head, complete=False):
+    """Error message if the leading bytes do not match ``file_type``, else None"""
+    sniffed = sniff_file_type(head, complete)
+    if sniffed != file_type:
+        found = f'{sniffed} content' if sniffed else 'unrecognised content'
+        return f'File is named .{file_type} but contains {found}'
+    return None
+
+
+def file_content_error(file, file_type, size):
+    """``content_type_error`` for an open binary file of ``size`` bytes,
+    which is rewound afterwards"""
+    head = file.read(SNIFF_BYTES)
+    file.seek(0)
+    return content_type_error(file_type, head, complete=size <= SNIFF_BYTES)
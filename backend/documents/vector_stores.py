@@ -0,0 +1,585 @@
+"""Vector store backends used by RAGEngine.
+
+Both backends take and return data in the shape of the Chroma API -
+``query`` returns ``{'ids': [[...]], 'documents': [[...]], 'metadatas':
+[[...]], 'distances': [[...]]}`` with one inner list per query embedding -
+so the engine does not care which one is configured.
+
+* ``ChromaVectorStore`` wraps one global collection (``CHROMA_COLLECTION``).
+* ``NumpyVectorStore`` keeps one embedding matrix per document in a
+  memory-mapped ``.npy`` file (float32, float16 or int8) and answers queries with
+  an exact, vectorized dot product and ``argpartition`` top-k. For
+  per-document questions over a few hundred or thousand chunks this avoids
+  the metadata filter and the client round-trip altogether.
+
+Distances are squared L2, the Chroma default, in both backends.
+
+Vectors of different dimensions (after switching the embedding model) never
+share an index: a document's old vectors are dropped when vectors of another
+dimension are committed for it. A Chroma collection has one fixed dimension
+and holds every document, so vectors of another dimension are refused; a new
+embedding model needs its own collection.
+"""
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_DOC_ID = re.compile(r'^doc_(\d+)_')
+# Rows converted to float32 at a time when scoring a float16 or int8 matrix
+_SCORE_BLOCK_ROWS = 65536
+
+
+def quantize_rows(matrix):
+    """Symmetric per-row int8 quantization: returns (int8 rows, float32 scales)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    return np.rint(matrix / scales[:, None]).astype(np.int8), scales
+
+
+def document_id_from_chunk_id(chunk_id):
+    match = _DOC_ID.match(chunk_id)
+    return int(match.group(1)) if match else None
+
+
+def _empty_result(num_queries, include_embeddings=False):
+    result = {
+        'ids': [[] for _ in range(num_queries)],
+        'documents': [[] for _ in range(num_queries)],
+        'metadatas': [[] for _ in range(num_queries)],
+        'distances': [[] for _ in range(num_queries)],
+    }
+    if include_embeddings:
+        result['embeddings'] = [[] for _ in range(num_queries)]
+    return result
+
+
+class VectorStore:
+    """Interface shared by the vector store backends"""
+
+    name = None
+
+    def add(self, ids, embeddings, documents, metadatas):
+        """Add chunks; chunks whose id is already stored are replaced"""
+        raise NotImplementedError
+
+    def commit(self, document_id, replace=False):
+        """Make everything added for a document durable and queryable.
+
+        With ``replace`` what was added since the last commit becomes the
+        document's whole index and vectors stored before are dropped;
+        otherwise it is merged in by chunk id.
+        """
+
+    def rollback(self, document_id):
+        """Undo everything added for a document since its last commit"""
+
+    def query(self, query_embeddings, n_results, document_id=None, include_embeddings=False,
+              document_ids=None):
+        """Nearest chunks to each query embedding, restricted to one document
+        (``document_id``) or several (``document_ids``) when given"""
+        raise NotImplementedError
+
+    def get(self, ids, include_embeddings=False):
+        raise NotImplementedError
+
+    def delete(self, ids=None, document_id=None):
+        raise NotImplementedError
+
+    def count(self, document_id=None):
+        raise NotImplementedError
+
+    def list_document_ids(self):
+        """Ids of all documents that have vectors"""
+        raise NotImplementedError
+
+    def list_ids(self, document_id):
+        """Chunk ids stored for one document"""
+        raise NotImplementedError
+
+
+class ChromaVectorStore(VectorStore):
+    name = 'chroma'
+
+    def __init__(self, get_collection):
+        # The collection is looked up on every call so the engine can reopen
+        # it after a fork.
+        self._get_collection = get_collection
+        self._dimension = None
+        # Per document: ids upserted since the last commit, and the rows
+        # they overwrote, so a failed ingest can be rolled back
+        self._added = {}
+        self._previous = {}
+        self._lock = threading.Lock()
+
+    @property
+    def collection(self):
+        return self._get_collection()
+
+    def _check_dimension(self, collection, dim):
+        """Refuse vectors of another dimension than the collection holds"""
+        if self._dimension == (collection, dim):
+            return collection
+        sample = collection.get(limit=1, include=['embeddings'])
+        embeddings = sample.get('embeddings')
+        if embeddings is not None and len(embeddings) and len(embeddings[0]) != dim:
+            raise ValueError(
+                f"Chroma collection '{collection.name}' holds {len(embeddings[0])}-dimensional vectors, "
+                f"got {dim}: set CHROMA_COLLECTION to a new collection for this embedding model "
+                f"and run manage.py reembed"
+            )
+        self._dimension = (collection, dim)
+        return collection
+
+    def add(self, ids, embeddings, documents, metadatas):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            collection = self._check_dimension(self.collection, embeddings.shape[1])
+            document_ids = [
+                metadata.get('document_id', document_id_from_chunk_id(chunk_id))
+                for chunk_id, metadata in zip(ids, metadatas)
+            ]
+            untracked = [
+                chunk_id for chunk_id, document_id in zip(ids, document_ids)
+                if chunk_id not in self._added.get(document_id, ())
+            ]
+            if untracked:
+                self._remember_previous(collection, untracked)
+            collection.upsert(
+                embeddings=embeddings.tolist(),
+                documents=documents,
+                ids=ids,
+                metadatas=metadatas
+            )
+            for chunk_id, document_id in zip(ids, document_ids):
+                self._added.setdefault(document_id, set()).add(chunk_id)
+
+    def _remember_previous(self, collection, ids):
+        stored = collection.get(ids=ids, include=['embeddings', 'documents', 'metadatas'])
+        for chunk_id, embedding, document, metadata in zip(
+            stored['ids'], stored['embeddings'], stored['documents'], stored['metadatas']
+        ):
+            document_id = metadata.get('document_id', document_id_from_chunk_id(chunk_id))
+            self._previous.setdefault(document_id, {})[chunk_id] = (list(embedding), document, metadata)
+
+    def commit(self, document_id, replace=False):
+        # Upserts are already durable; replacing drops what was not added since
+        with self._lock:
+            added = self._added.pop(document_id, set())
+            self._previous.pop(document_id, None)
+        if replace:
+            stale = [chunk_id for chunk_id in self.list_ids(document_id) if chunk_id not in added]
+            if stale:
+                self.collection.delete(ids=stale)
+
+    def rollback(self, document_id):
+        """Delete the chunks added since the last commit and restore the
+        ones they overwrote"""
+        with self._lock:
+            added = self._added.pop(document_id, set())
+            previous = self._previous.pop(document_id, {})
+        created = [chunk_id for chunk_id in added if chunk_id not in previous]
+        if created:
+            self.collection.delete(ids=created)
+        if previous:
+            ids = list(previous)
+            documents = [previous[chunk_id][1] for chunk_id in ids]
+            self.collection.upsert(
+                ids=ids,
+                embeddings=[previous[chunk_id][0] for chunk_id in ids],
+                documents=None if all(document is None for document in documents) else documents,
+                metadatas=[previous[chunk_id][2] for chunk_id in ids]
+            )
+
+    def query(self, query_embeddings, n_results, document_id=None, include_embeddings=False,
+              document_ids=None):
+        include = ['documents', 'metadatas', 'distances']
+        if include_embeddings:
+            include.append('embeddings')
+        kwargs = {}
+        if document_id is not None:
+            kwargs['where'] = {"document_id": document_id}
+        elif document_ids is not None:
+            kwargs['where'] = {"document_id": {"$in": list(document_ids)}}
+        return self.collection.query(
+            query_embeddings=np.asarray(query_embeddings, dtype=np.float32).tolist(),
+            n_results=n_results,
+            include=include,
+            **kwargs
+        )
+
+    def get(self, ids, include_embeddings=False):
+        include = ['documents', 'metadatas']
+        if include_embeddings:
+            include.append('embeddings')
+        return self.collection.get(ids=list(ids), include=include)
+
+    def delete(self, ids=None, document_id=None):
+        if ids is not None:
+            self.collection.delete(ids=list(ids))
+        elif document_id is not None:
+            with self._lock:
+                self._added.pop(document_id, None)
+            self.collection.delete(where={"document_id": document_id})
+
+    def count(self, document_id=None):
+        if document_id is None:
+            return self.collection.count()
+        return len(self.list_ids(document_id))
+
+    def list_document_ids(self, page_size=10000):
+        document_ids = set()
+        offset = 0
+        while True:
+            page = self.collection.get(include=['metadatas'], limit=page_size, offset=offset)
+            document_ids.update(
+                metadata.get('document_id') for metadata in page['metadatas'] if metadata
+            )
+            if len(page['ids']) < page_size:
+                break
+            offset += page_size
+        document_ids.discard(None)
+        return sorted(document_ids)
+
+    def list_ids(self, document_id):
+        return self.collection.get(where={"document_id": document_id}, include=[])['ids']
+
+
+class _DocumentIndex:
+    """Loaded (memory-mapped) vectors and payload of one document"""
+
+    def __init__(self, matrix, sq_norms, ids, documents, metadatas, version, scales=None):
+        self.matrix = matrix
+        self.sq_norms = sq_norms
+        # Per-row scales of an int8 matrix, None for float matrices
+        self.scales = scales
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.version = version
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(ids)}
+
+    def vectors(self, rows):
+        """float32 copies of the given rows"""
+        vectors = np.asarray(self.matrix[rows], dtype=np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows, None] if np.ndim(rows) else self.scales[rows]
+        return vectors
+
+
+class NumpyVectorStore(VectorStore):
+    """Exact in-process vector search over per-document .npy matrices.
+
+    Layout under ``root``::
+
+        doc_<id>/embeddings.npy   (n, dim) float32, float16 or int8
+        doc_<id>/scales.npy       (n,) float32 row scales, int8 only
+        doc_<id>/sq_norms.npy     (n,) float32 squared row norms
+        doc_<id>/chunks.json      ids, documents and metadatas
+
+    int8 rows are quantized symmetrically per row (``quantize_rows``), a
+    quarter of the float32 size; float16 is half. Either way scoring
+    converts blocks back to float32, so only memory and disk shrink.
+
+    ``add`` buffers rows in memory; ``commit`` merges them with what is on
+    disk (or, with ``replace``, drops what is on disk) and atomically
+    replaces the files. Loaded indexes are cached and
+    reloaded when another process commits a newer version.
+    """
+
+    name = 'numpy'
+
+    def __init__(self, root, dtype='float32'):
+        self.root = root
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float16, np.int8):
+            raise ValueError(f"Unsupported vector dtype {dtype}")
+        self._pending = {}
+        self._loaded = {}
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, document_id):
+        return os.path.join(self.root, f'doc_{document_id}')
+
+    def _version(self, document_id):
+        try:
+            stat = os.stat(os.path.join(self._dir(document_id), 'chunks.json'))
+            # chunks.json is always replaced, never rewritten in place, so a
+            # new inode means a new version even on coarse-mtime filesystems
+            return (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def _load(self, document_id):
+        version = self._version(document_id)
+        with self._lock:
+            cached = self._loaded.get(document_id)
+            if cached is not None and cached.version == version:
+                return cached
+            if version is None:
+                self._loaded.pop(document_id, None)
+                return None
+
+            directory = self._dir(document_id)
+            for _ in range(3):
+                with open(os.path.join(directory, 'chunks.json'), encoding='utf-8') as file:
+                    payload = json.load(file)
+                matrix = np.load(os.path.join(directory, 'embeddings.npy'), mmap_mode='r')
+                sq_norms = np.load(os.path.join(directory, 'sq_norms.npy'))
+                scales = None
+                if matrix.dtype == np.int8:
+                    scales = np.load(os.path.join(directory, 'scales.npy'))
+                # A concurrent commit may have replaced the arrays between reads
+                if (matrix.shape[0] == len(payload['ids']) == sq_norms.shape[0]
+                        and (scales is None or scales.shape[0] == matrix.shape[0])):
+                    break
+                version = self._version(document_id)
+            else:
+                raise RuntimeError(f"Vector index for document {document_id} is inconsistent")
+
+            index = _DocumentIndex(
+                matrix,
+                sq_norms,
+                payload['ids'],
+                payload['documents'],
+                payload['metadatas'],
+                version,
+                scales=scales
+            )
+            self._loaded[document_id] = index
+            return index
+
+    def _document_ids(self):
+        ids = []
+        for name in os.listdir(self.root):
+            if name.startswith('doc_') and name[4:].isdigit():
+                ids.append(int(name[4:]))
+        return ids
+
+    def add(self, ids, embeddings, documents, metadatas):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            for row, chunk_id in enumerate(ids):
+                document_id = metadatas[row].get('document_id', document_id_from_chunk_id(chunk_id))
+                pending = self._pending.setdefault(
+                    document_id, {'ids': [], 'embeddings': [], 'documents': [], 'metadatas': []}
+                )
+                pending['ids'].append(chunk_id)
+                pending['embeddings'].append(embeddings[row])
+                pending['documents'].append(documents[row] if documents is not None else None)
+                pending['metadatas'].append(metadatas[row])
+
+    def commit(self, document_id, replace=False):
+        with self._lock:
+            pending = self._pending.pop(document_id, None)
+            if not pending or not pending['ids']:
+                if replace:
+                    self._remove(document_id)
+                return
+            existing = None if replace else self._load(document_id)
+            new_matrix = np.vstack(pending['embeddings'])
+            if existing is not None and existing.matrix.shape[1] != new_matrix.shape[1]:
+                logger.warning(
+                    "Document %s: dropping %d stored %d-dimensional vectors for %d-dimensional ones",
+                    document_id, len(existing.ids), existing.matrix.shape[1], new_matrix.shape[1]
+                )
+                existing = None
+
+            if existing is not None:
+                replaced = set(pending['ids'])
+                keep = [row for row, chunk_id in enumerate(existing.ids) if chunk_id not in replaced]
+                matrix = np.concatenate([existing.vectors(keep), new_matrix])
+                ids = [existing.ids[row] for row in keep] + pending['ids']
+                documents = [existing.documents[row] for row in keep] + pending['documents']
+                metadatas = [existing.metadatas[row] for row in keep] + pending['metadatas']
+            else:
+                matrix, ids = new_matrix, pending['ids']
+                documents, metadatas = pending['documents'], pending['metadatas']
+
+            self._write(document_id, matrix, ids, documents, metadatas)
+
+    def rollback(self, document_id):
+        with self._lock:
+            self._pending.pop(document_id, None)
+
+    def _write(self, document_id, matrix, ids, documents, metadatas):
+        """Store float32 ``matrix`` in the configured dtype"""
+        directory = self._dir(document_id)
+        os.makedirs(directory, exist_ok=True)
+        arrays = []
+        if self.dtype == np.int8:
+            stored, scales = quantize_rows(matrix)
+            arrays.append(('scales.npy', scales))
+            # Norms of the rows as stored, so distances stay consistent
+            restored = stored.astype(np.float32) * scales[:, None]
+        else:
+            stored = np.asarray(matrix).astype(self.dtype)
+            restored = stored.astype(np.float32)
+        sq_norms = np.einsum('ij,ij->i', restored, restored)
+        arrays += [('embeddings.npy', stored), ('sq_norms.npy', sq_norms)]
+
+        # Arrays first, chunks.json last: it is what readers version on
+        for name, array in arrays:
+            tmp_path = os.path.join(directory, f'.{name}.tmp')
+            with open(tmp_path, 'wb') as file:
+                np.save(file, array)
+            os.replace(tmp_path, os.path.join(directory, name))
+
+        tmp_path = os.path.join(directory, '.chunks.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'ids': ids, 'documents': documents, 'metadatas': metadatas}, file)
+        os.replace(tmp_path, os.path.join(directory, 'chunks.json'))
+        self._loaded.pop(document_id, None)
+
+    def _remove(self, document_id):
+        directory = self._dir(document_id)
+        for name in ('chunks.json', 'embeddings.npy', 'sq_norms.npy', 'scales.npy'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+        self._loaded.pop(document_id, None)
+
+    @staticmethod
+    def _scores(matrix, queries, scales=None):
+        """Dot products of every row with every query, shape (rows, queries)"""
+        if matrix.dtype == np.float32:
+            return np.asarray(matrix) @ queries.T
+        scores = np.empty((matrix.shape[0], queries.shape[0]), dtype=np.float32)
+        for start in range(0, matrix.shape[0], _SCORE_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + _SCORE_BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + block.shape[0]] = block @ queries.T
+        if scales is not None:
+            # Scaling the (rows, queries) scores is cheaper than the rows
+            scores *= scales[:, None]
+        return scores
+
+    def _search(self, index, queries, n_results):
+        """Return (rows, distances) arrays of shape (queries, k) for one index"""
+        k = min(n_results, len(index.ids))
+        distances = index.sq_norms[:, None] + np.einsum('ij,ij->i', queries, queries)[None, :]
+        distances -= 2.0 * self._scores(index.matrix, queries, index.scales)
+
+        if k < distances.shape[0]:
+            top = np.argpartition(distances, k - 1, axis=0)[:k]
+        else:
+            top = np.broadcast_to(np.arange(distances.shape[0])[:, None], distances.shape)
+        top_distances = np.take_along_axis(distances, top, axis=0)
+        order = np.argsort(top_distances, axis=0)
+        return np.take_along_axis(top, order, axis=0).T, np.take_along_axis(top_distances, order, axis=0).T
+
+    def query(self, query_embeddings, n_results, document_id=None, include_embeddings=False,
+              document_ids=None):
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if document_id is not None:
+            document_ids = [document_id]
+        elif document_ids is None:
+            document_ids = self._document_ids()
+
+        candidates = [[] for _ in range(queries.shape[0])]
+        for doc_id in document_ids:
+            index = self._load(doc_id)
+            # Documents not re-embedded yet after a model change are skipped
+            if index is None or not index.ids or index.matrix.shape[1] != queries.shape[1]:
+                continue
+            rows, distances = self._search(index, queries, n_results)
+            for query_row in range(queries.shape[0]):
+                for row, distance in zip(rows[query_row], distances[query_row]):
+                    candidates[query_row].append((float(distance), index, int(row)))
+
+        result = _empty_result(queries.shape[0], include_embeddings)
+        for query_row, hits in enumerate(candidates):
+            for distance, index, row in sorted(hits, key=lambda hit: hit[0])[:n_results]:
+                result['ids'][query_row].append(index.ids[row])
+                result['documents'][query_row].append(index.documents[row])
+                result['metadatas'][query_row].append(index.metadatas[row])
+                result['distances'][query_row].append(distance)
+                if include_embeddings:
+                    result['embeddings'][query_row].append(index.vectors(row))
+        return result
+
+    def get(self, ids, include_embeddings=False):
+        result = {'ids': [], 'documents': [], 'metadatas': []}
+        if include_embeddings:
+            result['embeddings'] = []
+        for chunk_id in ids:
+            index = self._load(document_id_from_chunk_id(chunk_id))
+            row = index.rows.get(chunk_id) if index is not None else None
+            if row is not None:
+                result['ids'].append(chunk_id)
+                result['documents'].append(index.documents[row])
+                result['metadatas'].append(index.metadatas[row])
+                if include_embeddings:
+                    result['embeddings'].append(index.vectors(row))
+        return result
+
+    def delete(self, ids=None, document_id=None):
+        with self._lock:
+            if ids is None:
+                if document_id is not None:
+                    self._pending.pop(document_id, None)
+                    self._remove(document_id)
+                return
+
+            by_document = {}
+            for chunk_id in ids:
+                by_document.setdefault(document_id_from_chunk_id(chunk_id), set()).add(chunk_id)
+
+            for doc_id, doc_ids in by_document.items():
+                pending = self._pending.get(doc_id)
+                if pending:
+                    keep = [row for row, chunk_id in enumerate(pending['ids']) if chunk_id not in doc_ids]
+                    for key in pending:
+                        pending[key] = [pending[key][row] for row in keep]
+
+                index = self._load(doc_id)
+                if index is None:
+                    continue
+                keep = [row for row, chunk_id in enumerate(index.ids) if chunk_id not in doc_ids]
+                if len(keep) == len(index.ids):
+                    continue
+                if not keep:
+                    self._remove(doc_id)
+                    continue
+                self._write(
+                    doc_id,
+                    index.vectors(keep),
+                    [index.ids[row] for row in keep],
+                    [index.documents[row] for row in keep],
+                    [index.metadatas[row] for row in keep]
+                )
+
+    def count(self, document_id=None):
+        document_ids = [document_id] if document_id is not None else self._document_ids()
+        total = 0
+        for doc_id in document_ids:
+            index = self._load(doc_id)
+            if index is not None:
+                total += len(index.ids)
+        return total
+
+    def list_document_ids(self):
+        return sorted(doc_id for doc_id in self._document_ids() if self._version(doc_id) is not None)
+
+    def list_ids(self, document_id):
+        index = self._load(document_id)
+        return list(index.ids) if index is not None else []
+
+
+def create_vector_store(backend, get_collection=None, root=None, dtype='float32'):
+    if backend == 'chroma':
+        return ChromaVectorStore(get_collection)
+    if backend == 'numpy':
+        return NumpyVectorStore(root, dtype=dtype)
+    raise ValueError(f"Unknown vector store backend {backend}")
@@ -3,13 +3,24 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from asgiref.sync import sync_to_async
 from .models import Document, DocumentChunk
-from .serializers import DocumentSerializer, QuestionSerializer
-from .rag_engine import RAGEngine
+from .serializers import (
+    BatchQuestionSerializer, DocumentSerializer, IngestionJobSerializer, QuestionSerializer,
+    UploadCompleteSerializer, UploadSessionSerializer, UploadStartSerializer
+)
+from .rag_engine import get_rag_engine
+from .jobs import enqueue_document, latest_job, start_local_worker
+from .caching import cache_stats
+from .streaming import SCOPE_KEY, client_disconnected, sse_event
+from .llm_service import LLMOverloaded, get_llm_client
+from .validation import file_content_error, file_type_error, file_type_of
+from . import dedup, metrics, uploads
+import json
 import os
 
-rag_engine = RAGEngine()
-
 @api_view(['GET'])
 def get_documents(request):
     """Retrieve all documents"""
@@ -27,37 +38,30 @@ def upload_document(request):
         
         # Get file info
         file_name = file.name
-        file_type = file_name.split('.')[-1].lower()
+        file_type = file_type_of(file_name)
         file_size = file.size
         
-        # Validate file type
-        allowed_types = ['txt', 'pdf', 'docx', 'doc']
-        if file_type not in allowed_types:
-            return Response(
-                {'error': f'File type {file_type} not supported. Allowed types: {allowed_types}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # Validate file type, size quotas and content
+        rejection = _file_rejection(file)
+        if rejection is not None:
+            return rejection
         
+        # Link identical files to the document that already holds their content
+        content_hash = dedup.hash_uploaded_file(file)
+        duplicate = _deduplicated_response(content_hash)
+        if duplicate is not None:
+            return duplicate
+
         # Save document
         document = Document.objects.create(
             title=file_name,
             file_path=file,
             file_type=file_type,
             file_size=file_size,
+            content_hash=content_hash,
             processing_status='pending'
         )
-        
-        # Process document asynchronously (in production, use Celery)
-        try:
-            rag_engine.process_document(document)
-        except Exception as e:
-            return Response(
-                {'error': f'Processing failed: {str(e)}'}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-        
-        serializer = DocumentSerializer(document)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return _accepted_response(document)
         
     except Exception as e:
         return Response(
@@ -65,11 +69,274 @@ def upload_document(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+def _file_rejection(file, replaces=0):
+    """Error response if an uploaded file has an unsupported type, breaks a
+    size quota or does not contain what its extension says, else None.
+    ``replaces`` is the size of the stored file it replaces."""
+    type_error = file_type_error(file.name)
+    if type_error:
+        return Response({'error': type_error}, status=status.HTTP_400_BAD_REQUEST)
+    size_error = uploads.quota_error(file.size, replaces=replaces)
+    if size_error:
+        return Response({'error': size_error}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    sniff_error = file_content_error(file, file_type_of(file.name), file.size)
+    if sniff_error:
+        return Response({'error': sniff_error}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    return None
+
+def _deduplicated_response(content_hash):
+    """200 with the document that already holds this content, or None"""
+    existing = (
+        Document.objects
+        .filter(content_hash=content_hash)
+        .exclude(processing_status='failed')
+        .order_by('created_at')
+        .first()
+    )
+    dedup.stats.record_upload(existing is not None)
+    if existing is None:
+        return None
+    data = DocumentSerializer(existing).data
+    data['deduplicated'] = True
+    job = latest_job(existing)
+    data['job'] = IngestionJobSerializer(job).data if job else None
+    return Response(data, status=status.HTTP_200_OK)
+
+def _accepted_response(document):
+    """Hand processing to the background ingestion worker; 202 with the job"""
+    job = enqueue_document(document)
+    start_local_worker(get_rag_engine())
+
+    data = DocumentSerializer(document).data
+    data['job'] = IngestionJobSerializer(job).data
+    return Response(data, status=status.HTTP_202_ACCEPTED)
+
+def _upload_error(error):
+    return Response({'error': str(error), **error.details}, status=error.status)
+
+@api_view(['POST'])
+def start_upload(request):
+    """Start a resumable upload of a file of the given size"""
+    serializer = UploadStartSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        session = uploads.start_upload(serializer.validated_data['file_name'], serializer.validated_data['size'])
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+@api_view(['GET', 'PUT', 'DELETE'])
+def upload_session(request, upload_id):
+    """Resumable upload: GET the offset to resume from, PUT the next part
+    (raw body, starting at the Upload-Offset header), DELETE to abort"""
+    try:
+        if request.method == 'GET':
+            session = uploads.get_session(upload_id)
+        elif request.method == 'DELETE':
+            uploads.abort_upload(upload_id)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        else:
+            try:
+                offset = int(request.headers['Upload-Offset'])
+            except (KeyError, ValueError):
+                return Response(
+                    {'error': 'Upload-Offset header with the byte offset of the part is required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                length = int(request.META['CONTENT_LENGTH'])
+            except (KeyError, ValueError):
+                return Response({'error': 'Content-Length is required'}, status=status.HTTP_411_LENGTH_REQUIRED)
+            # The raw body, read in blocks; request.data would buffer the part
+            session = uploads.append_part(upload_id, offset, request.stream, length)
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return Response(UploadSessionSerializer(session).data)
+
+@api_view(['POST'])
+def complete_upload(request, upload_id):
+    """Finish a resumable upload and process the document, or link it to an
+    identical document"""
+    serializer = UploadCompleteSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        session, path, content_hash = uploads.complete_upload(upload_id, serializer.validated_data.get('sha256'))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+
+    try:
+        duplicate = _deduplicated_response(content_hash)
+        if duplicate is not None:
+            os.remove(path)
+            return duplicate
+
+        document = Document.objects.create(
+            title=session.file_name,
+            file_path=uploads.move_into_storage(path, session.file_name),
+            file_type=session.file_type,
+            file_size=session.size,
+            content_hash=content_hash,
+            processing_status='pending'
+        )
+        return _accepted_response(document)
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['DELETE'])
+def delete_document(request, document_id):
+    """Delete a document with its chunks, vectors and file"""
+    try:
+        document = Document.objects.get(id=document_id)
+    except Document.DoesNotExist:
+        return Response(
+            {'error': 'Document not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    if document.processing_status == 'processing':
+        return Response(
+            {'error': 'Document is being processed, try again when it is done'},
+            status=status.HTTP_409_CONFLICT
+        )
+
+    try:
+        get_rag_engine().delete_document(document)
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+@api_view(['POST'])
+def reprocess_document(request, document_id):
+    """Re-index a document, optionally from an edited file.
+
+    Only pages and chunks that changed are re-embedded; unchanged chunks keep
+    their embedding ids.
+    """
+    try:
+        document = Document.objects.get(id=document_id)
+    except Document.DoesNotExist:
+        return Response(
+            {'error': 'Document not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    if document.processing_status in ('pending', 'processing'):
+        return Response(
+            {'error': 'Document is already queued for processing'},
+            status=status.HTTP_409_CONFLICT
+        )
+
+    file = request.FILES.get('file')
+    if file:
+        rejection = _file_rejection(file, replaces=document.file_size or 0)
+        if rejection is not None:
+            return rejection
+
+    try:
+        if file:
+            old_file = document.file_path
+            document.content_hash = dedup.hash_uploaded_file(file)
+            document.file_type = file_type_of(file.name)
+            document.file_size = file.size
+            document.file_path = file
+            document.save()
+            if old_file and old_file.name and old_file.name != document.file_path.name:
+                old_file.storage.delete(old_file.name)
+
+        job = enqueue_document(document)
+        start_local_worker(get_rag_engine())
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    data = DocumentSerializer(document).data
+    data['job'] = IngestionJobSerializer(job).data
+    return Response(data, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+def document_status(request, document_id):
+    """Report processing status and ingestion progress for a document"""
+    try:
+        document = Document.objects.get(id=document_id)
+    except Document.DoesNotExist:
+        return Response(
+            {'error': 'Document not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    job = latest_job(document)
+    return Response({
+        'document_id': document.id,
+        'processing_status': document.processing_status,
+        'pages_count': document.pages_count,
+        'chunks_count': document.chunks.count(),
+        'job': IngestionJobSerializer(job).data if job else None
+    })
+
+@api_view(['GET'])
+def rag_stats(request):
+    """Report cache and deduplication hit rates and LLM admission state for this process"""
+    return Response({
+        'cache': cache_stats(),
+        'dedup': dedup.stats.snapshot(),
+        'llm': get_llm_client().stats()
+    })
+
+def prometheus_metrics(request):
+    """Stage timings and counters of this process in the Prometheus text format"""
+    if not settings.RAG_METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(metrics.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _overloaded(error):
+    """503 telling the client when to retry"""
+    return Response(
+        {'error': str(error)},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(error.retry_after)}
+    )
+
+def _ask_corpus(data):
+    """Answer a question across a list of documents, or all of them"""
+    question = data['question']
+    engine = get_rag_engine()
+    document_ids = engine.corpus_document_ids(data['document_ids'])
+    if not document_ids:
+        return Response(
+            {'error': 'No processed documents found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    try:
+        result = engine.query_corpus(question, document_ids, data['num_chunks'])
+    except LLMOverloaded as e:
+        return _overloaded(e)
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    return Response({
+        'question': question,
+        'answer': result
+    })
+
 @api_view(['POST'])
 def ask_question(request):
-    """Ask question about document"""
+    """Ask question about one document, several (document_ids) or all of them"""
     serializer = QuestionSerializer(data=request.data)
     if serializer.is_valid():
+        if 'document_ids' in serializer.validated_data:
+            return _ask_corpus(serializer.validated_data)
+
         document_id = serializer.validated_data['document_id']
         question = serializer.validated_data['question']
         num_chunks = serializer.validated_data['num_chunks']
@@ -82,7 +349,7 @@ def ask_question(request):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            result = rag_engine.query_documents(document_id, question, num_chunks)
+            result = get_rag_engine().query_documents(document_id, question, num_chunks)
             return Response({
                 'question': question,
                 'answer': result,
@@ -94,10 +361,155 @@ def ask_question(request):
                 {'error': 'Document not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        except LLMOverloaded as e:
+            return _overloaded(e)
         except Exception as e:
             return Response(
                 {'error': str(e)}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['POST'])
+def ask_batch(request):
+    """Ask several questions about one document in a single request"""
+    serializer = BatchQuestionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    document_id = serializer.validated_data['document_id']
+    questions = serializer.validated_data['questions']
+    num_chunks = serializer.validated_data['num_chunks']
+
+    try:
+        document = Document.objects.get(id=document_id)
+        if document.processing_status != 'completed':
+            return Response(
+                {'error': 'Document is still processing'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = get_rag_engine().query_documents_batch(document_id, questions, num_chunks)
+        failed = sum(1 for result in results if result['error'])
+        return Response({
+            'document_title': document.title,
+            'results': results,
+            'succeeded': len(results) - failed,
+            'failed': failed
+        })
+
+    except Document.DoesNotExist:
+        return Response(
+            {'error': 'Document not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+async def _answer_events(request, engine, document, plan):
+    """SSE events for a streamed answer: sources first, then tokens"""
+    if plan is None:
+        yield sse_event('sources', {
+            'document_title': document.title if document is not None else None,
+            'sources': [],
+            'context': []
+        })
+        yield sse_event('token', {'text': "No relevant information found in the document."})
+        yield sse_event('done', {'cache': {'hit': False, 'layer': None}, 'fallback': False})
+        return
+
+    yield sse_event('sources', dict(
+        engine.describe_sources(document, plan),
+        context=plan['chunk_texts'],
+        retrieval=plan['retrieval']
+    ))
+
+    pieces = []
+    disconnected = getattr(request, 'scope', {}).get(SCOPE_KEY)
+    try:
+        async for text in engine.stream_answer(plan, disconnected):
+            if client_disconnected(request):
+                return
+            pieces.append(text)
+            yield sse_event('token', {'text': text})
+    except LLMOverloaded as e:
+        yield sse_event('error', {'error': str(e), 'status': 503})
+        return
+    except Exception as e:
+        yield sse_event('error', {'error': str(e)})
+        return
+
+    if client_disconnected(request):
+        return
+    await sync_to_async(engine.finish_stream)(document, plan, ''.join(pieces))
+    yield sse_event('done', {
+        'cache': plan['cache'],
+        'fallback': plan['source'] == 'fallback',
+        'usage': engine.usage(plan)
+    })
+
+
+async def ask_stream(request):
+    """Ask question about document(s), streaming the answer as Server-Sent Events.
+
+    Must be served through the ASGI application to actually stream; under
+    WSGI Django buffers the whole response.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    serializer = QuestionSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    question = serializer.validated_data['question']
+    num_chunks = serializer.validated_data['num_chunks']
+    engine = await sync_to_async(get_rag_engine)()
+
+    if 'document_ids' in serializer.validated_data:
+        document = None
+        document_ids = await sync_to_async(engine.corpus_document_ids)(serializer.validated_data['document_ids'])
+        if not document_ids:
+            return JsonResponse({'error': 'No processed documents found'}, status=404)
+        prepare = sync_to_async(engine.prepare_corpus_answer)(question, document_ids, num_chunks)
+    else:
+        try:
+            document = await Document.objects.aget(id=serializer.validated_data['document_id'])
+        except Document.DoesNotExist:
+            return JsonResponse({'error': 'Document not found'}, status=404)
+        if document.processing_status != 'completed':
+            return JsonResponse({'error': 'Document is still processing'}, status=400)
+        prepare = sync_to_async(engine.prepare_answer)(document, question, num_chunks)
+
+    try:
+        plan = await prepare
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+    # Shed load before committing to a 200 stream; a request that loses a
+    # race for the last queue slot gets an error event instead
+    if plan is not None and plan['answer'] is None and engine.llm.admission.saturated():
+        response = JsonResponse({'error': 'LLM overloaded, retry later'}, status=503)
+        response['Retry-After'] = '1'
+        return response
+
+    response = StreamingHttpResponse(
+        _answer_events(request, engine, document, plan),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# Django 4.2's csrf_exempt decorator would hide that the view is async
+ask_stream.csrf_exempt = True
\ No newline at end of file